@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class AdmissionController:
+    """Admits, queues or rejects new users based on the load the server is actually under.
+
+    Live load is tracked per resource (connected sessions, in-flight LLM calls, in-flight
+    TTS jobs) plus event-loop lag, each against a configurable budget. A user is admitted
+    only while every resource is under budget; otherwise they wait in a bounded FIFO queue
+    and are admitted as soon as capacity frees up.
+    """
+
+    def __init__(self, logger, max_sessions: int = 220, max_inflight_llm: int = 64,
+                 max_inflight_tts: int = 64, max_loop_lag: float = 0.25, max_queue: int = 50,
+                 lag_interval: float = 0.5):
+        self.logger = logger
+        self.budgets = {
+            "sessions": max_sessions,
+            "llm": max_inflight_llm,
+            "tts": max_inflight_tts,
+        }
+        self.max_loop_lag = max_loop_lag
+        self.max_queue = max_queue
+        self.lag_interval = lag_interval
+        self.inflight: Dict[str, int] = {"llm": 0, "tts": 0}
+        self.sessions = set()
+        self.waiting: "OrderedDict[str, tuple]" = OrderedDict()
+        self.loop_lag = 0.0
+        # Smoothed seconds between session releases, used to estimate queue waits.
+        self.release_interval: Optional[float] = None
+        self.last_release: Optional[float] = None
+        self._lag_task = None
+
+    def ensure_started(self):
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.get_running_loop().create_task(self._watch_loop_lag())
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(0.0, loop.time() - start - self.lag_interval)
+            self._admit_waiting()
+
+    def usage(self) -> Dict[str, int]:
+        return {"sessions": len(self.sessions), **self.inflight}
+
+    def has_capacity(self) -> bool:
+        usage = self.usage()
+        if any(usage[name] >= budget for name, budget in self.budgets.items()):
+            return False
+        return self.loop_lag < self.max_loop_lag
+
+    def estimated_wait(self, position: int) -> float:
+        interval = self.release_interval if self.release_interval is not None else 30.0
+        return round(position * interval, 1)
+
+    def request(self, user_id: str, sid: str) -> Dict:
+        """Decide on a new user: ``admitted``, ``queued`` (with position and wait) or ``rejected``."""
+        self.ensure_started()
+        if user_id in self.sessions:
+            return {"status": "admitted"}
+        if user_id in self.waiting:
+            position = list(self.waiting).index(user_id) + 1
+            return {"status": "queued", "position": position, "estimated_wait": self.estimated_wait(position)}
+        if not self.waiting and self.has_capacity():
+            self.sessions.add(user_id)
+            return {"status": "admitted"}
+        if len(self.waiting) >= self.max_queue:
+            self.logger.warning(f"🚫 Rejected {user_id}: admission queue full ({self.max_queue})")
+            return {"status": "rejected", "estimated_wait": self.estimated_wait(len(self.waiting) + 1)}
+
+        self.waiting[user_id] = (sid, asyncio.get_running_loop().create_future())
+        position = len(self.waiting)
+        self.logger.info(f"⏳ Queued {user_id} at position {position}")
+        return {"status": "queued", "position": position, "estimated_wait": self.estimated_wait(position)}
+
+    async def wait_for_turn(self, user_id: str) -> bool:
+        """Block until a queued user is admitted; False if they left the queue first."""
+        entry = self.waiting.get(user_id)
+        if entry is None:
+            return user_id in self.sessions
+        return await entry[1]
+
+    def release(self, user_id: str):
+        if user_id in self.sessions:
+            self.sessions.discard(user_id)
+            now = time.monotonic()
+            if self.last_release is not None:
+                interval = now - self.last_release
+                self.release_interval = interval if self.release_interval is None else 0.8 * self.release_interval + 0.2 * interval
+            self.last_release = now
+        self.withdraw(user_id)
+        self._admit_waiting()
+
+    def withdraw(self, user_id: str):
+        entry = self.waiting.pop(user_id, None)
+        if entry and not entry[1].done():
+            entry[1].set_result(False)
+
+    def withdraw_sid(self, sid: str):
+        for user_id, (waiting_sid, _) in list(self.waiting.items()):
+            if waiting_sid == sid:
+                self.withdraw(user_id)
+
+    @contextmanager
+    def track(self, resource: str):
+        self.inflight[resource] += 1
+        try:
+            yield
+        finally:
+            self.inflight[resource] -= 1
+            self._admit_waiting()
+
+    def _admit_waiting(self):
+        while self.waiting and self.has_capacity():
+            user_id, (_, future) = self.waiting.popitem(last=False)
+            if future.done():
+                continue
+            self.sessions.add(user_id)
+            future.set_result(True)
+            self.logger.info(f"✅ Admitted queued user {user_id}")
+
+    def snapshot(self) -> Dict:
+        usage = self.usage()
+        return {
+            "resources": {
+                name: {"in_use": usage[name], "budget": budget}
+                for name, budget in self.budgets.items()
+            },
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "max_loop_lag_ms": round(self.max_loop_lag * 1000, 1),
+            "queued": len(self.waiting),
+            "max_queue": self.max_queue,
+            "estimated_wait": self.estimated_wait(len(self.waiting)) if self.waiting else 0.0,
+        }
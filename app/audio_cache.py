@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from .metrics import metrics
+
+cache_requests = metrics.counter(
+    "inai_tts_cache_requests_total", "TTS cache lookups by result", ("result",))
+cache_evictions = metrics.counter(
+    "inai_tts_cache_evictions_total", "TTS cache entries evicted", ("tier",))
+cache_bytes = metrics.gauge(
+    "inai_tts_cache_bytes", "Bytes held by each TTS cache tier", ("tier",))
+
+
+class AudioCache:
+    """Content-addressed cache for synthesized audio with an LRU memory tier and a disk tier.
+
+    Entries are keyed by a hash of (cleaned text, voice, output format). Both tiers are
+    bounded in bytes and evict least recently used entries first. ``get_or_create``
+    de-duplicates concurrent misses, so identical requests synthesize only once; the
+    synthesis is cancelled when the last caller waiting for it is, so it never
+    outlives the TTS slots its callers held.
+    With both tiers sized to zero the cache is disabled and every call synthesizes.
+    """
+
+    def __init__(self, logger, max_memory_bytes: int = 32 * 2**20, max_disk_bytes: int = 256 * 2**20,
+                 disk_dir: Optional[str] = "Data/tts_cache"):
+        self.logger = logger
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes if disk_dir else 0
+        self.disk_dir = disk_dir
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        self.disk: "OrderedDict[str, int]" = OrderedDict()
+        self.disk_bytes = 0
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[asyncio.Task, int] = {}
+        self.enabled = self.max_memory_bytes > 0 or self.max_disk_bytes > 0
+        if self.max_disk_bytes > 0:
+            self._load_disk_index()
+
+    @staticmethod
+    def key(text: str, voice: str, output_format: str) -> str:
+        return hashlib.sha256(f"{output_format}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.mp3")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file mtimes, so it survives restarts."""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".mp3"):
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, name))
+            entries.append((stat.st_mtime, name[:-len(".mp3")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+        self._evict_disk()
+        cache_bytes.set(self.disk_bytes, "disk")
+        self.logger.info(f"🗄️ TTS disk cache: {len(self.disk)} entries, {self.disk_bytes // 1024} KiB")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self.memory.get(key)
+        if audio is not None:
+            self.memory.move_to_end(key)
+            cache_requests.inc("memory_hit")
+            return audio
+        if key not in self.disk:
+            return None
+        try:
+            audio = await asyncio.to_thread(self._read_disk, key)
+        except OSError as e:
+            self.logger.warning(f"TTS cache entry {key[:12]} unreadable, dropping it: {e}")
+            self._drop_disk(key)
+            return None
+        self.disk.move_to_end(key)
+        self._store_memory(key, audio)
+        cache_requests.inc("disk_hit")
+        return audio
+
+    async def put(self, key: str, audio: bytes):
+        self._store_memory(key, audio)
+        if self.max_disk_bytes <= 0 or len(audio) > self.max_disk_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._write_disk, key, audio)
+        except OSError as e:
+            self.logger.warning(f"TTS cache write failed for {key[:12]}: {e}")
+            return
+        if key in self.disk:
+            self.disk_bytes -= self.disk.pop(key)
+        self.disk[key] = len(audio)
+        self.disk_bytes += len(audio)
+        self._evict_disk()
+        cache_bytes.set(self.disk_bytes, "disk")
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Cached audio for ``key``, calling ``create`` on a miss. Empty results are not cached."""
+        if not self.enabled:
+            return await create()
+        audio = await self.get(key)
+        if audio is not None:
+            return audio
+        while True:
+            task = self.inflight.get(key)
+            if task is None:
+                cache_requests.inc("miss")
+                task = self.inflight[key] = asyncio.ensure_future(self._create(key, create))
+            else:
+                cache_requests.inc("coalesced")
+            # Shielded so one caller being cancelled does not cancel the others' result.
+            self.waiters[task] = self.waiters.get(task, 0) + 1
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if task.cancelled() and not asyncio.current_task().cancelling():
+                    # The synthesis itself was cancelled (the TTS scheduler cancels the task
+                    # holding a slot), not this caller: start over rather than fail.
+                    continue
+                if self.waiters[task] == 1:
+                    # Unlist it first, so a caller arriving now starts a fresh synthesis
+                    # instead of joining one that is being cancelled.
+                    if self.inflight.get(key) is task:
+                        del self.inflight[key]
+                    task.cancel()
+                raise
+            finally:
+                self.waiters[task] -= 1
+                if not self.waiters[task]:
+                    del self.waiters[task]
+
+    async def _create(self, key: str, create: Callable[[], Awaitable[bytes]]) -> bytes:
+        try:
+            audio = await create()
+            if audio:
+                await self.put(key, audio)
+            return audio
+        finally:
+            if self.inflight.get(key) is asyncio.current_task():
+                del self.inflight[key]
+
+    def _store_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            cache_evictions.inc("memory")
+        cache_bytes.set(self.memory_bytes, "memory")
+
+    def _evict_disk(self):
+        while self.disk_bytes > self.max_disk_bytes and self.disk:
+            key = next(iter(self.disk))
+            self._drop_disk(key)
+            cache_evictions.inc("disk")
+
+    def _drop_disk(self, key: str):
+        self.disk_bytes -= self.disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _read_disk(self, key: str) -> bytes:
+        path = self._path(key)
+        with open(path, "rb") as f:
+            audio = f.read()
+        os.utime(path)
+        return audio
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+
+class RecentAudioStore:
+    """Each user's most recent reply audio, kept for ``ttl`` seconds within a byte budget.
+
+    Entries are raw audio bytes. Expired entries are dropped lazily, and when the
+    budget is exceeded the least recently stored users are evicted first.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 2**20, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.total_bytes = 0
+
+    def __setitem__(self, user_id: str, audio: bytes):
+        self.pop(user_id)
+        self.purge_expired()
+        if not audio or len(audio) > self.max_bytes:
+            return
+        self.entries[user_id] = (bytes(audio), time.monotonic() + self.ttl)
+        self.total_bytes += len(audio)
+        while self.total_bytes > self.max_bytes:
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            cache_evictions.inc("recent_audio")
+        cache_bytes.set(self.total_bytes, "recent_audio")
+
+    def __getitem__(self, user_id: str) -> bytes:
+        audio = self.get(user_id)
+        if audio is None:
+            raise KeyError(user_id)
+        return audio
+
+    def __contains__(self, user_id: str) -> bool:
+        return self.get(user_id) is not None
+
+    def __len__(self) -> int:
+        self.purge_expired()
+        return len(self.entries)
+
+    def get(self, user_id: str, default=None) -> Optional[bytes]:
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return default
+        if entry[1] <= time.monotonic():
+            self.pop(user_id)
+            return default
+        return entry[0]
+
+    def pop(self, user_id: str, default=None) -> Optional[bytes]:
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return default
+        self.total_bytes -= len(entry[0])
+        cache_bytes.set(self.total_bytes, "recent_audio")
+        return entry[0]
+
+    def purge_expired(self):
+        # All entries share one TTL, so insertion order is expiry order.
+        now = time.monotonic()
+        while self.entries:
+            user_id, (_, expires_at) = next(iter(self.entries.items()))
+            if expires_at > now:
+                break
+            self.pop(user_id)
+
+    def snapshot(self) -> Dict:
+        self.purge_expired()
+        return {
+            "users": len(self.entries),
+            "kib": round(self.total_bytes / 1024, 1),
+            "max_kib": round(self.max_bytes / 1024, 1),
+            "ttl": self.ttl,
+        }
@@ -1,25 +1,59 @@
-from openai import OpenAI
-import re
+from openai import OpenAI, AsyncOpenAI
+from .state import InMemoryStateBackend, SharedDict
+from .streaming import ACTION, ActionFilter
 
 class ChatManager:
-    def __init__(self, config, modes, logger):
+    # Only the last 10 messages are sent to the model, so nothing older is kept.
+    max_history = 10
+
+    def __init__(self, config, modes, logger, state=None):
         self.config = config
         self.modes = modes
         self.logger = logger
-        self.chat_histories = {}
+        self.chat_histories = SharedDict(state or InMemoryStateBackend(), "chat_histories")
+        self.model = "llama3-70b-8192"
 
         self.client = OpenAI(
             base_url="https://api.groq.com/openai/v1",
             api_key=config.groq_api_key
         )
+        self.async_client = AsyncOpenAI(
+            base_url="https://api.groq.com/openai/v1",
+            api_key=config.groq_api_key
+        )
+
+    @staticmethod
+    def clean_reply(reply: str) -> str:
+        # Drop *action* asides the model likes to add; they should not be shown or spoken.
+        return ACTION.sub("", reply).strip()
+
+    def _append_history(self, user_id: str, mode: str, role: str, content: str):
+        def append(histories):
+            history = histories.get(mode, []) + [{"role": role, "content": content}]
+            histories[mode] = history[-self.max_history:]
+            return histories
+
+        return self.chat_histories.modify(user_id, append, {})[mode]
+
+    def _drop_user_turn(self, user_id: str, mode: str, message: str):
+        """Take back the user turn of a request that got no reply, so history keeps alternating."""
+        def drop(histories):
+            history = histories.get(mode, [])
+            if history and history[-1] == {"role": "user", "content": message}:
+                histories[mode] = history[:-1]
+            return histories
+
+        self.chat_histories.modify(user_id, drop, {})
+
+    def _build_messages(self, user_id: str, mode: str, message: str):
+        history = self._append_history(user_id, mode, "user", message)
+        return [{"role": "system", "content": self.modes.modes[mode]}, *history]
 
     async def chat_with_groq(self, user_id: str, mode: str, message: str) -> str:
         try:
-            history = self.chat_histories.setdefault(user_id, {}).setdefault(mode, [])
-            history.append({"role": "user", "content": message})
-            messages = [{"role": "system", "content": self.modes.modes[mode]}, *history[-10:]]
+            messages = self._build_messages(user_id, mode, message)
             completion = self.client.chat.completions.create(
-                model="llama3-70b-8192",
+                model=self.model,
                 messages=messages,
                 temperature=0.7
             )
@@ -29,12 +63,62 @@ class ChatManager:
                 reply = "I'm sorry, I couldn't think of a good answer."
 
 
-            reply = re.sub(r"(?<!\*)\*[^*\n]+\*(?!\*)", "", reply).strip()
+            reply = self.clean_reply(reply)
 
-            history.append({"role": "assistant", "content": reply})
+            self._append_history(user_id, mode, "assistant", reply)
 
             return reply
 
         except Exception as e:
             self.logger.error(f"Groq error for user {user_id}: {e}")
+            self._drop_user_turn(user_id, mode, message)
             return "⚠️ I had trouble to understanding. Can you ask again?"
+
+    async def stream_chat_with_groq(self, user_id: str, mode: str, message: str):
+        """Yield the reply as text deltas while Groq is still generating it.
+
+        *action* asides are filtered out of the deltas. The cleaned full reply is
+        appended to the chat history once the stream ends; if it fails or is
+        abandoned, the user turn is taken back out. A failure before the first delta
+        yields an apology instead; one after it is re-raised.
+        """
+        parts = []
+        actions = ActionFilter()
+        answered = False
+        try:
+            messages = self._build_messages(user_id, mode, message)
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    text = actions.feed(delta)
+                    if text:
+                        yield text
+            text = actions.flush()
+            if text:
+                yield text
+
+            if not parts:
+                yield "I'm sorry, I couldn't think of a good answer."
+                return
+
+            self._append_history(user_id, mode, "assistant", self.clean_reply("".join(parts)))
+            answered = True
+
+        except Exception as e:
+            self.logger.error(f"Groq stream error for user {user_id}: {e}")
+            if parts:
+                # Part of the reply is already out; the caller must not treat it as complete.
+                raise
+            yield "⚠️ I had trouble to understanding. Can you ask again?"
+        finally:
+            if not answered:
+                self._drop_user_turn(user_id, mode, message)
@@ -1,4 +1,5 @@
 import os
+import threading
 from dotenv import load_dotenv
 from typing import List
 
@@ -8,6 +9,9 @@ class Config:
         self.env_path = env_path or os.path.join(os.getcwd(), ".env")
         load_dotenv(self.env_path, override=True)
         self.env_vars = os.environ
+        self._env_mtime = self._read_env_mtime()
+        self._watcher = None
+        self._watcher_stop = threading.Event()
 
         self.api_keys: List[str] = self._load_api_keys()
         if not self.api_keys:
@@ -25,6 +29,37 @@ class Config:
         self.mode = self.get("ASSISTANT_MODE", "info")
         self.maintenance_password = self.get("TOGGLE_PASSWORD")
         self.toggle_key = self.get("TOGGLE_KEY", "off").lower()
+        self.stream_responses = self.get("STREAM_RESPONSES", "off").lower() == "on"
+        self.tts_prefetch_depth = int(self.get("TTS_PREFETCH_DEPTH", "2"))
+        self.tts_pacing_lead = float(self.get("TTS_PACING_LEAD", "0.3"))
+        self.tts_first_chunk_words = int(self.get("TTS_FIRST_CHUNK_WORDS", "8"))
+        self.tts_max_chunk_words = int(self.get("TTS_MAX_CHUNK_WORDS", "48"))
+        self.user_queue_max_depth = int(self.get("USER_QUEUE_MAX_DEPTH", "1"))
+        self.user_min_work_interval = float(self.get("USER_MIN_WORK_INTERVAL", "0.5"))
+        self.state_backend = self.get("STATE_BACKEND", "memory")
+        self.socketio_message_queue = self.get("SOCKETIO_MESSAGE_QUEUE")
+        # Shared entries of a worker not heard from for WORKER_TTL seconds are dropped.
+        self.worker_heartbeat_interval = float(self.get("WORKER_HEARTBEAT_INTERVAL", "10"))
+        self.worker_ttl = float(self.get("WORKER_TTL", "30"))
+        self.max_sessions = int(self.get("MAX_SESSIONS", "220"))
+        self.max_inflight_llm = int(self.get("MAX_INFLIGHT_LLM", "64"))
+        self.max_inflight_tts = int(self.get("MAX_INFLIGHT_TTS", "64"))
+        self.max_loop_lag = float(self.get("MAX_LOOP_LAG", "0.25"))
+        self.admission_queue_size = int(self.get("ADMISSION_QUEUE_SIZE", "50"))
+        self.tts_cache_memory_mb = float(self.get("TTS_CACHE_MEMORY_MB", "32"))
+        self.tts_cache_disk_mb = float(self.get("TTS_CACHE_DISK_MB", "256"))
+        self.tts_cache_dir = self.get("TTS_CACHE_DIR", os.path.join("Data", "tts_cache"))
+        self.audio_retention_mb = float(self.get("AUDIO_RETENTION_MB", "8"))
+        self.audio_retention_ttl = float(self.get("AUDIO_RETENTION_TTL", "300"))
+        self.tts_max_concurrency = int(self.get("TTS_MAX_CONCURRENCY", "16"))
+        self.tts_edge_concurrency = int(self.get("TTS_EDGE_CONCURRENCY", "16"))
+        self.edge_pool_size = int(self.get("EDGE_POOL_SIZE", "4"))
+        self.edge_prewarm = int(self.get("EDGE_PREWARM", "1"))
+        self.edge_idle_timeout = float(self.get("EDGE_IDLE_TIMEOUT", "30"))
+        # "audio" decodes the reply to time mouth cues; "boundaries" uses edge-tts word timings.
+        self.lipsync_mode = self.get("LIPSYNC_MODE", "audio").lower()
+        self.lipsync_workers = int(self.get("LIPSYNC_WORKERS", "2"))
+        self.lipsync_queue_size = int(self.get("LIPSYNC_QUEUE_SIZE", "32"))
 
         self.static_dir = os.path.join(os.getcwd(), "static")
         os.makedirs(self.static_dir, exist_ok=True)
@@ -48,10 +83,45 @@ class Config:
         except Exception as e:
             print(f"[Cleanup Error] {e}")
 
+    def _read_env_mtime(self):
+        try:
+            return os.stat(self.env_path).st_mtime_ns
+        except OSError:
+            return None
+
     def reload_env(self):
         load_dotenv(self.env_path, override=True)
         self.env_vars = os.environ
         self.toggle_key = self.get("TOGGLE_KEY", "off").lower()
+        self._env_mtime = self._read_env_mtime()
+
+    def refresh_if_changed(self) -> bool:
+        """Reload the cached values only if the .env file changed since the last load."""
+        if self._read_env_mtime() == self._env_mtime:
+            return False
+        self.reload_env()
+        print(f"🔄 Reloaded {self.env_path} (maintenance: {self.is_maintenance_on()})")
+        return True
+
+    def start_watcher(self, interval: float = None):
+        """Poll the .env mtime in a background thread so hot paths never touch the filesystem."""
+        if self._watcher and self._watcher.is_alive():
+            return
+        interval = interval or float(self.get("CONFIG_WATCH_INTERVAL", "2"))
+        self._watcher_stop.clear()
+
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    self.refresh_if_changed()
+                except Exception as e:
+                    print(f"[Config Watch Error] {e}")
+
+        self._watcher = threading.Thread(target=watch, name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watcher_stop.set()
 
     def is_maintenance_on(self) -> bool:
         return self.toggle_key == "on"
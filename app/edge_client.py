@@ -0,0 +1,289 @@
+import asyncio
+import json
+import ssl
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set, Tuple
+from xml.sax.saxutils import escape, unescape
+
+import aiohttp
+import certifi
+from edge_tts import communicate as edge_communicate
+from edge_tts.communicate import (
+    calc_max_mesg_size, connect_id, date_to_string, get_headers_and_data, mkssml,
+    remove_incompatible_characters, split_text_by_byte_length, ssml_headers_plus_data
+)
+from edge_tts.constants import SEC_MS_GEC_VERSION, WSS_HEADERS
+from edge_tts.data_classes import TTSConfig
+from edge_tts.drm import DRM
+from edge_tts.exceptions import NoAudioReceived, UnexpectedResponse, WebSocketError
+
+from .metrics import metrics
+
+# Formats a client may ask for at register_user. ``bitrate`` (bits/s) is constant for
+# these encodings, so it also gives the playback length of a buffer; ``container`` is
+# the pydub/ffmpeg format name used to decode it for lip sync.
+AUDIO_FORMATS: Dict[str, Dict] = {
+    "mp3": {"output_format": "audio-24khz-48kbitrate-mono-mp3", "mime": "audio/mpeg", "bitrate": 48000,
+            "container": "mp3"},
+    "mp3-low": {"output_format": "audio-16khz-32kbitrate-mono-mp3", "mime": "audio/mpeg", "bitrate": 32000,
+                "container": "mp3"},
+    "opus": {"output_format": "webm-24khz-16bit-24kbps-mono-opus", "mime": "audio/webm", "bitrate": 24000,
+             "container": "webm"},
+}
+DEFAULT_AUDIO_FORMAT = "mp3"
+# Offsets and durations in edge-tts metadata are in 100 ns ticks.
+TICKS_PER_SECOND = 10_000_000
+
+edge_connections = metrics.counter(
+    "inai_edge_connections_total", "edge-tts websocket connections by outcome", ("result",))
+edge_idle_connections = metrics.gauge(
+    "inai_edge_idle_connections", "Warm edge-tts websockets waiting for a turn")
+edge_connect_time = metrics.histogram(
+    "inai_edge_connect_seconds", "edge-tts websocket handshake time")
+
+
+def negotiate_audio_format(requested: Optional[str] = None, save_data: bool = False) -> str:
+    """The format to use for a client: its explicit choice if we support it, else a bandwidth hint."""
+    if requested in AUDIO_FORMATS:
+        return requested
+    return "opus" if save_data else DEFAULT_AUDIO_FORMAT
+
+
+def speech_config(output_format: str) -> str:
+    return (
+        f"X-Timestamp:{date_to_string()}\r\n"
+        "Content-Type:application/json; charset=utf-8\r\n"
+        "Path:speech.config\r\n\r\n"
+        '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+        '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"true"},'
+        f'"outputFormat":"{output_format}"'
+        "}}}}\r\n"
+    )
+
+
+class EdgeConnectionPool:
+    """Warm edge-tts websockets, kept per (voice, output format) and shared by all users.
+
+    A connection is configured once with ``speech.config`` and then carries one ``ssml``
+    turn at a time. ``acquire`` hands out the most recently used idle connection, dropping
+    any idle for longer than ``idle_timeout``, or opens a new one. ``release`` keeps it
+    after a clean ``turn.end`` (up to ``max_idle`` per key); ``discard`` closes it after
+    anything else. ``min_idle`` connections per key are reopened in the background as
+    they are taken. With ``max_idle=0`` every turn gets a fresh connection.
+    """
+
+    def __init__(self, logger, max_idle: int = 4, min_idle: int = 0, idle_timeout: float = 30.0,
+                 connect_timeout: int = 10, receive_timeout: int = 60):
+        self.logger = logger
+        self.max_idle = max_idle
+        self.min_idle = min(min_idle, max_idle)
+        self.idle_timeout = idle_timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=None,
+                                             sock_connect=connect_timeout, sock_read=receive_timeout)
+        self.ssl = ssl.create_default_context(cafile=certifi.where())
+        self.idle: Dict[Tuple[str, str], Deque[Tuple[aiohttp.ClientWebSocketResponse, float]]] = {}
+        self.warming: Dict[Tuple[str, str], int] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def url() -> str:
+        # Read at call time so a stand-in endpoint can be swapped in.
+        return (f"{edge_communicate.WSS_URL}&Sec-MS-GEC={DRM.generate_sec_ms_gec()}"
+                f"&Sec-MS-GEC-Version={SEC_MS_GEC_VERSION}&ConnectionId={connect_id()}")
+
+    async def connect(self, key: Tuple[str, str]) -> aiohttp.ClientWebSocketResponse:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(trust_env=True, timeout=self.timeout)
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                ws = await self.session.ws_connect(self.url(), compress=15, headers=WSS_HEADERS, ssl=self.ssl)
+                break
+            except aiohttp.ClientResponseError as e:
+                if e.status != 403 or attempt:
+                    raise
+                # Clock skew invalidated the Sec-MS-GEC token; adjust and retry once.
+                DRM.handle_client_response_error(e)
+        try:
+            await ws.send_str(speech_config(key[1]))
+        except BaseException:
+            self._close(ws)
+            raise
+        edge_connect_time.observe(time.perf_counter() - started)
+        edge_connections.inc("opened")
+        return ws
+
+    async def acquire(self, key: Tuple[str, str], fresh: bool = False) -> Tuple[aiohttp.ClientWebSocketResponse, bool]:
+        """A websocket for ``key`` and whether it is a reused one."""
+        idle = self.idle.get(key)
+        now = time.monotonic()
+        while idle and not fresh:
+            ws, idle_since = idle.pop()
+            edge_idle_connections.dec()
+            if ws.closed or now - idle_since > self.idle_timeout:
+                edge_connections.inc("expired")
+                self._close(ws)
+                continue
+            edge_connections.inc("reused")
+            self._refill(key)
+            return ws, True
+        ws = await self.connect(key)
+        self._refill(key)
+        return ws, False
+
+    def release(self, key: Tuple[str, str], ws: aiohttp.ClientWebSocketResponse):
+        if ws.closed:
+            return
+        idle = self.idle.setdefault(key, deque())
+        now = time.monotonic()
+        while idle and now - idle[0][1] > self.idle_timeout:
+            self._close(idle.popleft()[0])
+            edge_idle_connections.dec()
+            edge_connections.inc("expired")
+        if len(idle) >= self.max_idle:
+            self._close(ws)
+            return
+        idle.append((ws, now))
+        edge_idle_connections.inc()
+
+    def discard(self, ws: aiohttp.ClientWebSocketResponse):
+        self._close(ws)
+
+    def prewarm(self, voice: str, output_format: str, count: Optional[int] = None):
+        """Open connections for a voice in the background, up to ``count`` (default ``min_idle``) idle."""
+        self._refill((TTSConfig(voice, "+0%", "+0%", "+0Hz").voice, output_format), count)
+
+    def _refill(self, key: Tuple[str, str], target: Optional[int] = None):
+        target = min(self.max_idle, self.min_idle if target is None else target)
+        missing = target - len(self.idle.get(key, ())) - self.warming.get(key, 0)
+        for _ in range(missing):
+            self.warming[key] = self.warming.get(key, 0) + 1
+            self._spawn(self._warm(key))
+
+    async def _warm(self, key: Tuple[str, str]):
+        try:
+            ws = await self.connect(key)
+        except Exception as e:
+            self.logger.warning(f"edge-tts prewarm failed: {e}")
+            return
+        finally:
+            self.warming[key] -= 1
+        self.release(key, ws)
+
+    def _close(self, ws: aiohttp.ClientWebSocketResponse):
+        if not ws.closed:
+            self._spawn(ws.close())
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for idle in self.idle.values():
+            while idle:
+                ws, _ = idle.pop()
+                edge_idle_connections.dec()
+                await ws.close()
+        if self.session is not None:
+            await self.session.close()
+
+
+class EdgeTTSClient:
+    """Speaks the edge-tts websocket protocol directly so the output format can be chosen.
+
+    ``edge_tts.Communicate`` always asks for 24 kHz/48 kbit/s MP3 on a new connection. This
+    client sends the same ``speech.config``/``ssml`` messages with any output format from
+    AUDIO_FORMATS over connections from an EdgeConnectionPool, and yields the same chunks:
+    ``{"type": "audio", "data"}`` and ``{"type": "WordBoundary", "offset", "duration", "text"}``.
+    A reused connection that turns out to be dead is replaced before any audio is yielded.
+    """
+
+    def __init__(self, logger, pool: EdgeConnectionPool = None):
+        self.logger = logger
+        self.pool = pool or EdgeConnectionPool(logger, max_idle=0)
+
+    async def stream(self, text: str, voice: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> AsyncIterator[Dict]:
+        tts_config = TTSConfig(voice, "+0%", "+0%", "+0Hz")
+        key = (tts_config.voice, AUDIO_FORMATS[audio_format]["output_format"])
+        parts = split_text_by_byte_length(
+            escape(remove_incompatible_characters(text)), calc_max_mesg_size(tts_config)
+        )
+        offset = 0
+        for part in parts:
+            end = offset
+            async for chunk in self._stream_part(key, tts_config, part, offset):
+                if chunk["type"] == "WordBoundary":
+                    end = chunk["offset"] + chunk["duration"]
+                yield chunk
+            # Same padding compensation edge-tts applies between parts.
+            offset = end + 8_750_000
+
+    async def _stream_part(self, key, tts_config, part: bytes, offset: int) -> AsyncIterator[Dict]:
+        for attempt in range(2):
+            ws, reused = await self.pool.acquire(key, fresh=attempt > 0)
+            clean = yielded = False
+            try:
+                async for chunk in self.speak(ws, tts_config, part, offset):
+                    yielded = True
+                    yield chunk
+                clean = True
+                return
+            # A server that closed an idle socket cleanly shows up as a turn ending with
+            # nothing at all, so that counts as a dead connection too.
+            except (aiohttp.ClientError, OSError, WebSocketError, NoAudioReceived) as e:
+                if not reused or yielded:
+                    raise
+                edge_connections.inc("reconnected")
+                self.logger.info(f"♻️ Warm edge-tts connection was dead, reconnecting: {e}")
+            finally:
+                if clean:
+                    self.pool.release(key, ws)
+                else:
+                    self.pool.discard(ws)
+
+    async def speak(self, ws, tts_config, part: bytes, offset: int = 0) -> AsyncIterator[Dict]:
+        """Run one synthesis turn on a websocket that has already received ``speech.config``."""
+        await ws.send_str(ssml_headers_plus_data(connect_id(), date_to_string(), mkssml(tts_config, part)))
+
+        audio_received = ended = False
+        async for message in ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+                data = message.data.encode("utf-8")
+                headers, body = get_headers_and_data(data, data.find(b"\r\n\r\n"))
+                path = headers.get(b"Path")
+                if path == b"audio.metadata":
+                    for meta in json.loads(body)["Metadata"]:
+                        if meta["Type"] == "WordBoundary":
+                            yield {
+                                "type": "WordBoundary",
+                                "offset": meta["Data"]["Offset"] + offset,
+                                "duration": meta["Data"]["Duration"],
+                                "text": unescape(meta["Data"]["text"]["Text"]),
+                            }
+                elif path == b"turn.end":
+                    ended = True
+                    break
+            elif message.type == aiohttp.WSMsgType.BINARY:
+                if len(message.data) < 2:
+                    raise UnexpectedResponse("Binary message is missing the header length.")
+                header_length = int.from_bytes(message.data[:2], "big")
+                headers, body = get_headers_and_data(message.data, header_length)
+                if headers.get(b"Path") != b"audio":
+                    raise UnexpectedResponse("Binary message is not audio.")
+                if body:
+                    audio_received = True
+                    yield {"type": "audio", "data": body}
+            elif message.type == aiohttp.WSMsgType.ERROR:
+                raise WebSocketError(f"edge-tts websocket failed mid-turn: {message.data}")
+
+        # aiohttp ends the iteration quietly on a close frame, so only turn.end marks a
+        # complete turn; anything else is a cut-off reply that must not be cached.
+        if not ended:
+            raise WebSocketError(f"edge-tts websocket closed before turn.end (code {ws.close_code})")
+        if not audio_received:
+            raise NoAudioReceived("No audio was received from edge-tts.")
@@ -1,10 +1,9 @@
 import tiktoken
-from typing import Dict
+from typing import Dict, Optional, Set
 from uuid import uuid4
-from threading import Lock
 from datetime import datetime
 from .config import Config
-from collections import defaultdict
+from .state import INSTANCE_ID, SharedDict, WorkerRegistry, get_state_backend
 
 config = Config()
 
@@ -12,10 +11,39 @@ api_keys = config.api_keys
 if not api_keys:
     raise ValueError("❌ No API keys found in OPENAI_API_KEY")
 
-user_sessions: Dict[str, Dict] = {}
-key_usage_count: Dict[str, int] = {key: 0 for key in api_keys}
-lock = Lock()
-user_token_usage: defaultdict[int] = defaultdict(int)
+# Shared through STATE_BACKEND so every worker sees the same key load.
+state = get_state_backend(config.state_backend)
+user_sessions: SharedDict = SharedDict(state, "key_sessions")
+key_usage_count: SharedDict = SharedDict(state, "key_usage")
+user_token_usage: SharedDict = SharedDict(state, "token_usage")
+
+
+def reconcile_shared_state(live: Optional[Set[str]] = None):
+    """Drop what stopped or earlier workers left in STATE_BACKEND and recount key usage.
+
+    Sessions whose worker is not in ``live`` (by default the workers with a recent
+    heartbeat), or whose key is no longer in OPENAI_API_KEY, are released with their
+    token counts; usage is recounted from the sessions that remain, for configured
+    keys only.
+    """
+    if live is None:
+        registry = WorkerRegistry(state)
+        registry.beat()
+        live = registry.live()
+    with state.atomic():
+        usage = {key: 0 for key in api_keys}
+        for user_id, session in user_sessions.items():
+            if session.get("api_key") in usage and session.get("instance") in live:
+                usage[session["api_key"]] += 1
+            else:
+                del user_sessions[user_id]
+                user_token_usage.pop(user_id, None)
+        key_usage_count.clear()
+        for key, count in usage.items():
+            key_usage_count[key] = count
+
+
+reconcile_shared_state()
 
 print(f"🔐 Loaded {len(api_keys)} API keys")
 for i, key in enumerate(api_keys):
@@ -29,18 +57,19 @@ def count_tokens(text: str, model: str = "gpt-4") -> int:
     return len(encoding.encode(text))
 
 def assign_key_to_user(user_id: str, task: str = "Unknown Task") -> Dict:
-    with lock:
-        if user_id in user_sessions:
+    # One transaction, so two workers cannot both pick the same least-loaded key.
+    with state.atomic():
+        session = user_sessions.get(user_id)
+        if session:
             return {
-                "api_key": user_sessions[user_id]["api_key"],
+                "api_key": session["api_key"],
                 "message": "Already assigned"
             }
 
-        min_usage = min(key_usage_count.values())
-        candidates = [key for key, count in key_usage_count.items() if count == min_usage]
-        key = candidates[0]  
+        usage = {key: key_usage_count.get(key, 0) for key in api_keys}
+        key = min(api_keys, key=usage.get)
 
-        key_usage_count[key] += 1
+        key_usage_count[key] = usage[key] + 1
         session_id = str(uuid4())
         user_sessions[user_id] = {
             "session_id": session_id,
@@ -48,7 +77,8 @@ def assign_key_to_user(user_id: str, task: str = "Unknown Task") -> Dict:
             "start_time": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
             "task": task,
             "last_active": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
-            "sid": None
+            "sid": None,
+            "instance": INSTANCE_ID
         }
 
         return {
@@ -57,14 +87,16 @@ def assign_key_to_user(user_id: str, task: str = "Unknown Task") -> Dict:
         }
 
 def update_last_active(user_id: str, sid: str = None):
-    with lock:
-        if user_id in user_sessions:
-            user_sessions[user_id]["last_active"] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    with state.atomic():
+        session = user_sessions.get(user_id)
+        if session:
+            session["last_active"] = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
             if sid:
-                user_sessions[user_id]["sid"] = sid
+                session["sid"] = sid
+            user_sessions[user_id] = session
 
 def release_key_for_user(user_id: str) -> Dict:
-    with lock:
+    with state.atomic():
         session = user_sessions.pop(user_id, None)
         if session:
             key = session["api_key"]
@@ -74,10 +106,10 @@ def release_key_for_user(user_id: str) -> Dict:
         return {"error": "⚠️ User session not found or already released"}
 
 def get_monitor_data() -> Dict:
-    with lock:
+    with state.atomic():
         return {
             "total_keys": len(api_keys),
-            "key_usage": key_usage_count,
+            "key_usage": dict(key_usage_count),
             "user_sessions": {
                 user_id: {
                     **session,
@@ -0,0 +1,125 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langdetect import detect
+from langdetect.detector_factory import DetectorFactory
+
+from .metrics import metrics
+
+DetectorFactory.seed = 0
+
+detections = metrics.counter(
+    "inai_language_detections_total", "Language detections by how they were decided", ("method",))
+
+# Unicode blocks of the scripts we have voices for.
+SCRIPT_LANGUAGES = (
+    (0x0900, 0x097F, "hi"),  # Devanagari
+    (0x0A80, 0x0AFF, "gu"),  # Gujarati
+)
+
+# Romanized Hindi/Gujarati words that rarely occur in English; any of them makes a
+# Latin-script message ambiguous (Hinglish) and worth a closer look.
+HINGLISH_MARKERS = frozenset("""
+    hai hain nahi nahin kya kyu kyun kyon mera meri mere tera teri tere tumhara mujhe
+    mujhko aap aapka kaise kaisa kaisi karo karna kar raha rahi rahe hoon hun bhi acha
+    accha achha yaar toh kuch bahut bohot haan nai chalo kab kahan kidhar abhi phir
+    matlab samajh pata bolo bata batao kem cho shu tame majama
+""".split())
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+
+class LanguageDetector:
+    """Picks a language code for TTS voices and lip sync without calling langdetect on every turn.
+
+    Devanagari and Gujarati text is classified by script alone. Latin text is English
+    unless it contains romanized Hindi/Gujarati words; only that ambiguous case uses
+    the user's recent language or, failing that, langdetect. Text in any other script
+    goes straight to langdetect.
+    """
+
+    def __init__(self, logger=None, default: str = "en", sticky_ttl: float = 600.0, max_users: int = 10_000):
+        self.logger = logger
+        self.default = default
+        self.sticky_ttl = sticky_ttl
+        self.max_users = max_users
+        self.recent: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def script_language(text: str) -> Optional[str]:
+        """``hi``/``gu`` by dominant script, ``other`` for scripts we have no voice for, None for Latin."""
+        counts = {}
+        latin = 0
+        for char in text:
+            code = ord(char)
+            if code < 0x0250:
+                latin += char.isalpha()
+                continue
+            for start, end, lang in SCRIPT_LANGUAGES:
+                if start <= code <= end:
+                    counts[lang] = counts.get(lang, 0) + 1
+                    break
+            else:
+                if char.isalpha():
+                    counts["other"] = counts.get("other", 0) + 1
+        if not counts:
+            return None
+        lang, count = max(counts.items(), key=lambda item: item[1])
+        return lang if count >= latin else None
+
+    @staticmethod
+    def is_ambiguous(text: str) -> bool:
+        return any(word in HINGLISH_MARKERS for word in WORD_PATTERN.findall(text.lower()))
+
+    def recent_language(self, user_id: Optional[str]) -> Optional[str]:
+        entry = self.recent.get(user_id) if user_id else None
+        if not entry:
+            return None
+        lang, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.recent[user_id]
+            return None
+        return lang
+
+    def remember(self, user_id: Optional[str], lang: str):
+        if not user_id:
+            return
+        self.recent[user_id] = (lang, time.monotonic() + self.sticky_ttl)
+        self.recent.move_to_end(user_id)
+        while len(self.recent) > self.max_users:
+            self.recent.popitem(last=False)
+
+    def forget(self, user_id: str):
+        self.recent.pop(user_id, None)
+
+    def detect(self, text: str, user_id: Optional[str] = None) -> str:
+        lang = self.script_language(text)
+        if lang in ("hi", "gu"):
+            detections.inc("script")
+            self.remember(user_id, lang)
+            return lang
+
+        if lang is None:
+            if not self.is_ambiguous(text):
+                detections.inc("latin")
+                return self.default
+            lang = self.recent_language(user_id)
+            if lang:
+                detections.inc("sticky")
+                self.remember(user_id, lang)
+                return lang
+
+        detections.inc("langdetect")
+        try:
+            lang = detect(text)
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Language detection failed: {e}")
+            return self.default
+        self.remember(user_id, lang)
+        return lang
+
+
+language_detector = LanguageDetector()
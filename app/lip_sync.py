@@ -1,21 +1,20 @@
+import io
 import os
 import json
 import warnings
 from typing import List, Tuple, Dict
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from pydub import AudioSegment
-from langdetect import detect
-from langdetect.detector_factory import DetectorFactory
+from .edge_client import TICKS_PER_SECOND
+from .language import language_detector
 
 
 # os.environ["PATH"] += os.pathsep + r"D:\INAI_Backend_MD\Models\ffmpeg\bin"
 # AudioSegment.converter = r"D:\INAI_Backend_MD\Models\ffmpeg\bin\ffmpeg.exe"
 
 AudioSegment.converter = "ffmpeg"
-
-
-DetectorFactory.seed = 0
 warnings.filterwarnings("ignore")
 
 # ------------------- SHAPE KEY MAPPING -------------------
@@ -44,9 +43,7 @@ def analyze_audio_segment(audio: AudioSegment) -> Tuple[np.ndarray, int]:
     samples = np.array(audio.get_array_of_samples())
     return samples, audio.frame_rate
 
-def detect_silence(audio: AudioSegment,
-                   threshold_db: float = -40.0,
-                   min_silence_duration: float = 0.1) -> List[Tuple[float, float]]:
+def detect_silence(audio: AudioSegment, threshold_db: float = -40.0, min_silence_duration: float = 0.1) -> List[Tuple[float, float]]:
     samples, sr = analyze_audio_segment(audio)
     if len(samples) == 0:
         return []
@@ -54,24 +51,31 @@ def detect_silence(audio: AudioSegment,
     window_size = int(0.02 * sr)
     hop_size = window_size // 2
 
-    rms = []
-    for i in range(0, len(samples), hop_size):
-        window = samples[i:i+window_size]
-        if len(window) == 0:
-            continue
-        rms_val = np.sqrt(np.mean(window**2))
-        rms.append(20 * np.log10(max(rms_val, 1e-10)))
-
-    silent_windows = [i for i, val in enumerate(rms) if val < threshold_db]
-    silent_periods = []
-    for window_idx in silent_windows:
-        start_time = window_idx * hop_size / sr
-        end_time = (window_idx * hop_size + window_size) / sr
-        if silent_periods and start_time <= silent_periods[-1][1]:
-            silent_periods[-1] = (silent_periods[-1][0], end_time)
-        else:
-            silent_periods.append((start_time, end_time))
-    return [(s, e) for s, e in silent_periods if (e - s) >= min_silence_duration]
+    # RMS level of 20 ms windows every 10 ms. Full windows are strided views of the
+    # squared samples; the few windows running past the end are averaged over what is left.
+    power = samples ** 2
+    starts = np.arange(0, len(samples), hop_size)
+    full = max(0, (len(samples) - window_size) // hop_size + 1)
+    mean_power = np.empty(len(starts), dtype=np.float32)
+    if full:
+        mean_power[:full] = sliding_window_view(power, window_size)[::hop_size].mean(axis=1)
+    for k in range(full, len(starts)):
+        mean_power[k] = power[starts[k]:].mean()
+    rms = np.sqrt(mean_power)
+    rms_db = 20 * np.log10(np.maximum(rms, 1e-10))
+    rms_db[rms <= 1e-10] = -200.0
+
+    silent = np.flatnonzero(rms_db < threshold_db)
+    if len(silent) == 0:
+        return []
+    # Silent windows whose spans overlap or touch form one period.
+    breaks = np.flatnonzero(np.diff(silent) * hop_size > window_size)
+    first = silent[np.concatenate(([0], breaks + 1))]
+    last = silent[np.concatenate((breaks, [len(silent) - 1]))]
+    period_start = first * hop_size / sr
+    period_end = (last * hop_size + window_size) / sr
+    keep = (period_end - period_start) >= min_silence_duration
+    return list(zip(period_start[keep].tolist(), period_end[keep].tolist()))
 
 def text_to_phonemes(text: str, lang: str = 'en') -> List[str]:
     text = text.strip().lower()
@@ -138,38 +142,109 @@ def generate_value_mapping(phonemes: List[str],
     if duration <= 0 or not phonemes:
         return []
     silent_periods = detect_silence(audio, threshold_db=silence_threshold)
-    total_phoneme_units = len([p for p in phonemes if p != ' '])
+    is_space = np.array([p == ' ' for p in phonemes])
+    total_phoneme_units = int(np.count_nonzero(~is_space))
     if total_phoneme_units == 0:
         return []
 
+    # Spaces last 30% of a phoneme; cues are laid end to end from 0.
     base_duration = duration / total_phoneme_units
+    ends = np.cumsum(np.where(is_space, base_duration * 0.3, base_duration))
+    starts = np.concatenate(([0.0], ends[:-1]))
+
+    # Silent periods come sorted and disjoint, so the only one that can overlap a cue
+    # is the first that ends at or after the cue starts.
+    values = np.array([phoneme_to_shape.get(p, 'A') for p in phonemes])
+    if silent_periods:
+        silence_starts, silence_ends = np.array(silent_periods).T
+        candidate = np.searchsorted(silence_ends, starts, side='left')
+        in_range = candidate < len(silence_ends)
+        is_silent = in_range & (silence_starts[np.minimum(candidate, len(silence_ends) - 1)] <= ends)
+        values[is_silent] = 'X'
+    values[is_space] = 'X'
+
+    mapping = [
+        {'value': value, 'start': round(start, 3), 'end': round(end, 3)}
+        for value, start, end in zip(values.tolist(), starts.tolist(), ends.tolist())
+    ]
+    if ends[-1] < duration:
+        mapping[-1]['end'] = round(duration, 3)
+
+    return mapping
+
+def generate_mouth_cues(text: str, audio: bytes, audio_format: str = "mp3") -> List[Dict]:
+    """Mouth cues for ``text`` spoken in ``audio``, encoded TTS bytes in pydub ``audio_format``.
+
+    Works entirely in memory: nothing is read from or written to Data/.
+    """
+    text = text.strip()
+    if not text or not audio:
+        return []
+    lang = language_detector.detect(text)[:2]
+    phonemes = text_to_phonemes(text, lang)
+    return generate_value_mapping(phonemes, AudioSegment.from_file(io.BytesIO(audio), format=audio_format))
+
+def _cover_gap(mapping: List[Dict], start: float, end: float, min_gap: float):
+    """Silence ('X') from ``start`` to ``end``; gaps under ``min_gap`` stretch the previous cue instead."""
+    if end - start >= min_gap or not mapping:
+        if end > start:
+            mapping.append({'value': 'X', 'start': round(start, 3), 'end': round(end, 3)})
+    else:
+        mapping[-1]['end'] = round(end, 3)
+
+
+def _phonemes_per_word(words: List[str], lang: str) -> List[List[str]]:
+    """Phonemes of each word, converting the text in one go (eng_to_ipa is slow per call)."""
+    counts = [len(word.split()) for word in words]
+    groups = [[]]
+    for phoneme in text_to_phonemes(" ".join(" ".join(word.split()) for word in words), lang):
+        if phoneme == ' ':
+            groups.append([])
+        else:
+            groups[-1].append(phoneme)
+    if len(groups) != sum(counts):
+        return [[p for p in text_to_phonemes(word, lang) if p != ' '] for word in words]
+    per_word = []
+    for count in counts:
+        per_word.append([p for group in groups[:count] for p in group])
+        groups = groups[count:]
+    return per_word
+
+
+def cues_from_word_boundaries(boundaries: List[Dict], duration: float = None, lang: str = None,
+                              min_gap: float = 0.05) -> List[Dict]:
+    """Mouth cues from edge-tts WordBoundary events, without decoding any audio.
+
+    Each word's phonemes share its real time span (``offset``/``duration`` in 100 ns
+    ticks) evenly, and the gaps between words are silence. With ``duration`` (seconds)
+    the silence after the last word up to the end of the audio is covered too.
+    """
+    # Punctuation can come with its own boundary; it is not spoken.
+    words = [b for b in boundaries if any(ch.isalnum() for ch in b.get("text", ""))]
+    if not words:
+        return []
+    if lang is None:
+        lang = language_detector.detect(" ".join(w["text"] for w in words))[:2]
+
     mapping = []
     current_time = 0.0
-    for phoneme in phonemes:
-        if phoneme == ' ':
-            space_duration = base_duration * 0.3
+    for word, phonemes in zip(words, _phonemes_per_word([w["text"] for w in words], lang)):
+        start = word["offset"] / TICKS_PER_SECOND
+        end = (word["offset"] + word["duration"]) / TICKS_PER_SECOND
+        if not phonemes or end <= start:
+            continue
+        _cover_gap(mapping, current_time, start, min_gap)
+        step = (end - start) / len(phonemes)
+        for i, phoneme in enumerate(phonemes):
             mapping.append({
-                'value': 'X',
-                'start': round(current_time, 3),
-                'end': round(current_time + space_duration, 3)
+                'value': phoneme_to_shape.get(phoneme, 'A'),
+                'start': round(start + i * step, 3),
+                'end': round(start + (i + 1) * step, 3)
             })
-            current_time += space_duration
-            continue
-
-        phoneme_duration = base_duration
-        phoneme_end = current_time + phoneme_duration
-        is_silent = any(not (phoneme_end < s or current_time > e) for s, e in silent_periods)
-        value = 'X' if is_silent else phoneme_to_shape.get(phoneme, 'A')
-        mapping.append({
-            'value': value,
-            'start': round(current_time, 3),
-            'end': round(phoneme_end, 3)
-        })
-        current_time = phoneme_end
-
-    if mapping and current_time < duration:
-        mapping[-1]['end'] = round(duration, 3)
+        current_time = end
 
+    if duration is not None and mapping:
+        _cover_gap(mapping, current_time, duration, min_gap)
     return mapping
 
 def generate_lip_sync_json(input_audio_path: str, input_text_path: str, output_json_path: str) -> str:
@@ -181,7 +256,7 @@ def generate_lip_sync_json(input_audio_path: str, input_text_path: str, output_j
         if not text:
             raise ValueError("Text file is empty.")
 
-        lang = detect(text)[:2]
+        lang = language_detector.detect(text)[:2]
         phonemes = text_to_phonemes(text, lang)
         audio = AudioSegment.from_file(input_audio_path)
         mapping = generate_value_mapping(phonemes, audio)
@@ -0,0 +1,157 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from .lip_sync import cues_from_word_boundaries, generate_mouth_cues
+from .metrics import metrics
+
+# How cues are computed: from encoded TTS audio (text, audio, container) or from
+# edge-tts WordBoundary events (boundaries, duration).
+METHODS = {"audio": generate_mouth_cues, "boundaries": cues_from_word_boundaries}
+
+queue_depth = metrics.gauge(
+    "inai_lipsync_queue_depth", "Lip-sync jobs waiting for a worker")
+queue_wait = metrics.histogram(
+    "inai_lipsync_queue_wait_seconds", "Time lip-sync jobs waited for a worker", ("method",))
+compute_time = metrics.histogram(
+    "inai_lipsync_compute_seconds", "Time lip-sync jobs spent computing cues in a worker", ("method",))
+jobs = metrics.counter(
+    "inai_lipsync_jobs_total", "Lip-sync jobs by outcome", ("result",))
+
+
+def run_job(method: str, args: Tuple) -> Tuple[List[Dict], float]:
+    """Worker entry point: the cues and the seconds it took to compute them."""
+    started = time.perf_counter()
+    cues = METHODS[method](*args)
+    return cues, time.perf_counter() - started
+
+
+def _warm_up() -> bool:
+    """Load the language profiles and phoneme dictionary a worker needs for its first reply."""
+    return bool(cues_from_word_boundaries([{"offset": 0, "duration": 1_000_000, "text": "hello"}]))
+
+
+class LipSyncPool:
+    """Computes mouth cues in worker processes, so decoding and phonemizing never block the event loop.
+
+    At most ``workers`` jobs run at once and up to ``max_queue`` more wait for a
+    worker; beyond that ``cues`` returns None and the reply goes out without visemes.
+    A worker slot stays taken until the worker is done with the job, so a cancelled
+    job that already started still counts against ``workers`` and nothing piles up
+    in the executor. ``cancel_user`` cancels a user's jobs, not the callers awaiting
+    them: their ``cues`` returns None. With ``workers=0`` jobs run one at a time on a
+    thread of this process instead.
+    """
+
+    def __init__(self, logger, workers: int = 2, max_queue: int = 32):
+        self.logger = logger
+        self.workers = max(0, workers)
+        self.max_queue = max_queue
+        self.executor: Optional[Executor] = None
+        self.slots = asyncio.Semaphore(max(1, self.workers))
+        self.queued: Set[asyncio.Task] = set()
+        self.user_tasks: Dict[str, Set[asyncio.Task]] = {}
+
+    @property
+    def waiting(self) -> int:
+        return len(self.queued)
+
+    def _executor(self) -> Executor:
+        if self.executor is None:
+            if self.workers:
+                # Forking a process that runs an event loop and threads is not safe.
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self.executor = ThreadPoolExecutor(1, thread_name_prefix="lipsync")
+        return self.executor
+
+    def prewarm(self) -> List[Future]:
+        """Start the worker processes now, so the first replies do not pay for spawning them."""
+        if not self.workers:
+            return []
+        executor = self._executor()
+        return [executor.submit(_warm_up) for _ in range(self.workers)]
+
+    async def cues(self, user_id: str, method: str, *args) -> Optional[List[Dict]]:
+        """Mouth cues computed by ``METHODS[method](*args)``, or None if the queue is full or the job was cancelled."""
+        if self.waiting >= self.max_queue:
+            jobs.inc("rejected")
+            self.logger.warning(f"👄 Lip-sync queue full ({self.waiting} waiting), no visemes for {user_id}")
+            return None
+        task = asyncio.ensure_future(self._run(method, args))
+        self.queued.add(task)
+        queue_depth.inc()
+        self.user_tasks.setdefault(user_id, set()).add(task)
+        task.add_done_callback(lambda done: self._forget(user_id, done))
+        try:
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if task.cancelled():
+            return None
+        return task.result()
+
+    async def _run(self, method: str, args: Tuple) -> List[Dict]:
+        queued_at = time.perf_counter()
+        try:
+            try:
+                await self.slots.acquire()
+            finally:
+                self._dequeue(asyncio.current_task())
+            queue_wait.observe(time.perf_counter() - queued_at, method)
+            loop = asyncio.get_running_loop()
+            try:
+                future = self._executor().submit(run_job, method, args)
+            except BaseException:
+                self.slots.release()
+                raise
+            # Release the slot when the worker is done, not when this task is: a
+            # cancelled job keeps its worker busy until the computation finishes.
+            future.add_done_callback(lambda _: self._release(loop))
+            cues, seconds = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            jobs.inc("cancelled")
+            raise
+        except Exception:
+            jobs.inc("failed")
+            raise
+        compute_time.observe(seconds, method)
+        jobs.inc("done")
+        return cues
+
+    def cancel_user(self, user_id: str) -> int:
+        """Cancel the user's waiting and running lip-sync jobs; returns how many were cancelled."""
+        tasks = [task for task in self.user_tasks.get(user_id, ()) if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self.logger.info(f"🛑 Cancelled {len(tasks)} lip-sync jobs for {user_id}")
+        return len(tasks)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self.slots.release)
+        except RuntimeError:
+            pass  # the loop is closed; nobody is waiting for the slot
+
+    def _dequeue(self, task: asyncio.Task):
+        if task in self.queued:
+            self.queued.discard(task)
+            queue_depth.dec()
+
+    def _forget(self, user_id: str, task: asyncio.Task):
+        # A job cancelled before it started never reaches _run's dequeue.
+        self._dequeue(task)
+        tasks = self.user_tasks.get(user_id)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self.user_tasks[user_id]
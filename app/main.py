@@ -1,15 +1,16 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from datetime import datetime
+import asyncio
 import os
 import logging
 import socketio
-from .key_manager import assign_key_to_user, release_key_for_user, get_monitor_data
+from .key_manager import assign_key_to_user, release_key_for_user, get_monitor_data, reconcile_shared_state
 from .logger import Logger
 from .config import Config
 from .modes import ChatModes
@@ -18,6 +19,11 @@ from .session import UserSessionManager
 from .chat import ChatManager
 from .speech import SpeechRecognition
 from .socket import SocketHandler 
+from .state import WorkerRegistry, get_state_backend, create_client_manager
+from .admission import AdmissionController
+from .tts_scheduler import TTSScheduler
+from .lipsync_pool import LipSyncPool
+from .metrics import metrics
 from inai_project.app.history.history_manager import HistoryManager
 from inai_project.app.history import history_routes
 from inai_project.app.signup import models as signup_models
@@ -43,7 +49,8 @@ async def startup():
         aws_access_key=AWS_ACCESS_KEY,
         aws_secret_key=AWS_SECRET_KEY,
         region=REGION,
-        logger=logger
+        logger=logger,
+        state=get_state_backend(os.getenv("STATE_BACKEND"))
     )
     await app.state.history_manager.init_db()
 @app.on_event("shutdown")
@@ -57,14 +64,34 @@ class INAIApplication:
     def __init__(self, history_manager):
         self.logger = Logger()
         self.config = Config()
+        self.config.start_watcher()
+        self.state = get_state_backend(self.config.state_backend)
+        self.workers = WorkerRegistry(self.state, ttl=self.config.worker_ttl)
         self.modes = ChatModes()
         self.history = history_manager
         self.tts = TextToSpeech(self.config, self.logger)
-        self.chat_manager = ChatManager(self.config, self.modes, self.logger)
+        self.chat_manager = ChatManager(self.config, self.modes, self.logger, state=self.state)
         self.speech_recognition = SpeechRecognition(self.logger)
-        self.session_manager = UserSessionManager(self.logger)
+        self.session_manager = UserSessionManager(
+            self.logger,
+            max_queue_depth=self.config.user_queue_max_depth,
+            min_work_interval=self.config.user_min_work_interval,
+            state=self.state
+        )
+        self.admission = AdmissionController(
+            self.logger,
+            max_sessions=self.config.max_sessions,
+            max_inflight_llm=self.config.max_inflight_llm,
+            max_inflight_tts=self.config.max_inflight_tts,
+            max_loop_lag=self.config.max_loop_lag,
+            max_queue=self.config.admission_queue_size
+        )
         self.templates = Jinja2Templates(directory="templates")
-        self.sio = socketio.AsyncServer(cors_allowed_origins='*', async_mode='asgi')
+        self.sio = socketio.AsyncServer(
+            cors_allowed_origins='*',
+            async_mode='asgi',
+            client_manager=create_client_manager(self.config.socketio_message_queue)
+        )
         self.app = app
         self.app.add_middleware(
             CORSMiddleware,
@@ -83,7 +110,18 @@ class INAIApplication:
             speech_recognition=self.speech_recognition,
             history=self.history,
             modes=self.modes,
-            logger=self.logger
+            logger=self.logger,
+            admission=self.admission,
+            tts_scheduler=TTSScheduler(
+                self.logger,
+                max_concurrency=self.config.tts_max_concurrency,
+                backend_limits={"edge": self.config.tts_edge_concurrency}
+            ),
+            lipsync_pool=LipSyncPool(
+                self.logger,
+                workers=self.config.lipsync_workers,
+                max_queue=self.config.lipsync_queue_size
+            )
         )
         self.setup_routes()
         if self.config.is_socket_on():
@@ -91,6 +129,21 @@ class INAIApplication:
         else:
             self.logger.warning(":warning: Socket is OFF due to maintenance mode")
  
+    async def keep_alive(self):
+        """Heartbeat this worker and drop shared entries of workers that stopped beating."""
+        while True:
+            try:
+                await asyncio.to_thread(self.reconcile_shared_state)
+            except Exception as e:
+                self.logger.error(f"Shared state heartbeat failed: {e}")
+            await asyncio.sleep(self.config.worker_heartbeat_interval)
+
+    def reconcile_shared_state(self):
+        self.workers.beat()
+        live = self.workers.live()
+        reconcile_shared_state(live)
+        self.session_manager.reconcile_shared_sessions(live)
+
     def setup_routes(self):
         frontend_dir = os.path.join(os.getcwd(), "frontend")
         self.app.mount("/frontend", StaticFiles(directory=frontend_dir), name="frontend")
@@ -110,12 +163,15 @@ class INAIApplication:
 
         @self.app.get("/status")
         async def get_status():
-            self.config.reload_env()
             return {
                 "maintenance": self.config.is_maintenance_on(),
                 "socket": self.config.is_socket_on()
             }
  
+        @self.app.get("/metrics", response_class=PlainTextResponse)
+        async def prometheus_metrics():
+            return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
         @self.app.get("/INAI520", response_class=HTMLResponse)
         async def admin_panel(request: Request):
             error = request.query_params.get("error")
@@ -182,7 +238,9 @@ class INAIApplication:
                 "request": request,
                 "user_sessions": data["user_sessions"],
                 "key_usage": data["key_usage"],
-                "token_usage_per_user": data["token_usage_per_user"]
+                "token_usage_per_user": data["token_usage_per_user"],
+                "admission": self.admission.snapshot(),
+                "audio_retention": self.tts.last_audio_data.snapshot()
             })
    
         @self.app.post("/toggle")
@@ -0,0 +1,160 @@
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+
+class Histogram:
+    """Prometheus histogram that also keeps the most recent observations for p50/p95/p99."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS, window: int = 1024):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.window = window
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            # [per-bucket counts (+Inf last), sum, count, recent values]
+            series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0, deque(maxlen=self.window)]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+        series[3].append(value)
+
+    def quantiles(self, *label_values) -> Dict[float, float]:
+        series = self.series.get(label_values)
+        if not series or not series[3]:
+            return {}
+        recent = sorted(series[3])
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in QUANTILES}
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count, _) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+    def render_quantiles(self) -> List[str]:
+        lines = []
+        for key in self.series:
+            for q, value in self.quantiles(*key).items():
+                labels = _format_labels(self.labels, key, 'quantile="%s"' % q)
+                lines.append(f"{self.name}_quantile{labels} {value:g}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+            if isinstance(metric, Histogram) and metric.series:
+                lines.append(f"# HELP {metric.name}_quantile {metric.help} (p50/p95/p99 of the last {metric.window} observations)")
+                lines.append(f"# TYPE {metric.name}_quantile gauge")
+                lines.extend(metric.render_quantiles())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_latency = metrics.histogram(
+    "inai_stage_latency_seconds", "Latency of each voice pipeline stage", ("stage", "mode"))
+stage_total = metrics.counter(
+    "inai_stage_total", "Voice pipeline stage runs by outcome", ("stage", "mode", "outcome"))
+stage_in_flight = metrics.gauge(
+    "inai_stage_in_flight", "Voice pipeline stages currently running", ("stage", "mode"))
+
+
+@contextmanager
+def time_stage(stage: str, mode: str = "none"):
+    """Time one pipeline stage: latency histogram, outcome counter and in-flight gauge."""
+    stage_in_flight.inc(stage, mode)
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        yield
+        outcome = "ok"
+    except BaseException as e:
+        if not isinstance(e, Exception):
+            outcome = "cancelled"
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage, mode)
+        stage_total.inc(stage, mode, outcome)
+        stage_in_flight.dec(stage, mode)
+
+
+def observe_stage(stage: str, mode: str, seconds: float):
+    """Record a stage measured by hand, e.g. time to the first streamed token."""
+    stage_latency.observe(seconds, stage, mode)
+    stage_total.inc(stage, mode, "ok")
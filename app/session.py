@@ -1,15 +1,33 @@
 import asyncio
 import time
-from typing import Dict, Optional
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Set
+from .state import INSTANCE_ID, InMemoryStateBackend, SharedDict
 
 
 class UserSessionManager:
-    def __init__(self, logger):
+    def __init__(self, logger, max_queue_depth: int = 1, min_work_interval: float = 0.0, state=None):
+        # Live session objects (tasks, queues) stay in the worker that owns the socket;
+        # a serializable summary is mirrored to the shared state backend so any worker
+        # can see every connected sid.
         self.user_sessions: Dict[str, dict] = {}
+        self.shared_sessions = SharedDict(state or InMemoryStateBackend(), "voice_sessions")
+        self.sid_index: Dict[str, str] = {}
         self.active_tasks: Dict[str, set] = {}
+        self.work_queues: Dict[str, deque] = {}
+        self.workers: Dict[str, asyncio.Task] = {}
+        self.last_work_started: Dict[str, float] = {}
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.min_work_interval = min_work_interval
         self.logger = logger
 
-    def create_user_session(self, user_id: str, sid: str, endpoint: Optional[str] = None):
+    def create_user_session(self, user_id: str, sid: str, endpoint: Optional[str] = None, binary_audio: bool = False,
+                            progressive_audio: bool = False, audio_format: str = "mp3",
+                            inline_visemes: bool = False):
+        previous = self.user_sessions.get(user_id)
+        if previous and self.sid_index.get(previous['sid']) == user_id:
+            del self.sid_index[previous['sid']]
+        self.sid_index[sid] = user_id
         self.user_sessions[user_id] = {
             'sid': sid,
             'current_mode': 'friend',
@@ -18,15 +36,29 @@ class UserSessionManager:
             'is_speaking': False,
             'current_audio': None,
             'created_at': time.time(),
-            'endpoint': endpoint or "default"
+            'endpoint': endpoint or "default",
+            'binary_audio': binary_audio,
+            'progressive_audio': progressive_audio,
+            'audio_format': audio_format,
+            'inline_visemes': inline_visemes
         }
         self.active_tasks[user_id] = set()
+        self.shared_sessions[user_id] = {
+            'sid': sid,
+            'endpoint': self.user_sessions[user_id]['endpoint'],
+            'created_at': self.user_sessions[user_id]['created_at'],
+            'instance': INSTANCE_ID
+        }
         self.logger.info(f"Created session for {user_id} with endpoint: {self.user_sessions[user_id]['endpoint']}")
 
     def set_user_endpoint(self, user_id: str, endpoint: str):
         session = self.get_user_session(user_id)
         if session:
             session["endpoint"] = endpoint
+            shared = self.shared_sessions.get(user_id)
+            if shared:
+                shared["endpoint"] = endpoint
+                self.shared_sessions[user_id] = shared
             self.logger.info(f"Updated endpoint for {user_id} to {endpoint}")
 
     def get_user_endpoint(self, user_id: str) -> Optional[str]:
@@ -36,13 +68,23 @@ class UserSessionManager:
     def get_user_session(self, user_id: str):
         return self.user_sessions.get(user_id)
 
+    def get_user_by_sid(self, sid: str) -> Optional[str]:
+        return self.sid_index.get(sid)
+
     def cleanup_user_session(self, user_id: str):
         if user_id in self.user_sessions:
+            self._drop_work_queue(user_id)
             if user_id in self.active_tasks:
                 for task in self.active_tasks[user_id]:
                     if not task.done():
                         task.cancel()
                 del self.active_tasks[user_id]
+            sid = self.user_sessions[user_id]['sid']
+            if self.sid_index.get(sid) == user_id:
+                del self.sid_index[sid]
+            shared = self.shared_sessions.get(user_id)
+            if shared and shared.get('sid') == sid:
+                del self.shared_sessions[user_id]
             del self.user_sessions[user_id]
             self.logger.info(f"Cleaned up session for user: {user_id}")
 
@@ -64,6 +106,67 @@ class UserSessionManager:
                     task.cancel()
                     self.logger.info(f"Cancelled task for user {user_id}: {task.get_name() if hasattr(task, 'get_name') else task}")
             self.active_tasks[user_id].clear()
+        if user_id in self.work_queues:
+            self.work_queues[user_id].clear()
+
+    def submit_work(self, user_id: str, job: Callable[[], Awaitable]) -> Dict:
+        """Queue a job for the user's worker, which runs one job at a time.
+
+        Latest wins: the running job is cancelled because the user has moved on,
+        and only the newest ``max_queue_depth`` jobs are kept waiting. Jobs also
+        start at least ``min_work_interval`` seconds apart, so a chatty client
+        cannot multiply outbound LLM/TTS calls. The returned status is meant to
+        be forwarded to the client as a backpressure signal.
+        """
+        queue = self.work_queues.setdefault(user_id, deque())
+        busy = user_id in self.workers
+        for task in list(self.active_tasks.get(user_id, ())):
+            if not task.done():
+                task.cancel()
+
+        queue.append(job)
+        dropped = 0
+        while len(queue) > self.max_queue_depth:
+            queue.popleft()
+            dropped += 1
+        if dropped:
+            self.logger.info(f"Coalesced {dropped} queued job(s) for user {user_id}")
+
+        if not busy:
+            self.workers[user_id] = asyncio.create_task(self._drain_work(user_id))
+
+        retry_after = self.last_work_started.get(user_id, 0.0) + self.min_work_interval - time.monotonic()
+        return {
+            "pending": len(queue) if busy or retry_after > 0 else 0,
+            "dropped": dropped,
+            "max_depth": self.max_queue_depth,
+            "retry_after": round(max(0.0, retry_after), 3)
+        }
+
+    async def _drain_work(self, user_id: str):
+        queue = self.work_queues[user_id]
+        try:
+            while queue:
+                wait = self.last_work_started.get(user_id, 0.0) + self.min_work_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                job = queue.popleft()
+                self.last_work_started[user_id] = time.monotonic()
+                task = asyncio.create_task(job())
+                self.add_task(user_id, task)
+                # wait() instead of await so a cancelled job does not stop the worker
+                await asyncio.wait([task])
+        finally:
+            if self.workers.get(user_id) is asyncio.current_task():
+                del self.workers[user_id]
+
+    def _drop_work_queue(self, user_id: str):
+        self.work_queues.pop(user_id, None)
+        self.last_work_started.pop(user_id, None)
+        worker = self.workers.pop(user_id, None)
+        if worker and not worker.done():
+            worker.cancel()
 
     def stop_current_tts(self, user_id: str):
         if user_id in self.user_sessions:
@@ -72,10 +175,23 @@ class UserSessionManager:
             self.logger.info(f"Stopped TTS for user: {user_id}")
 
 
+    def reconcile_shared_sessions(self, live: Set[str]) -> int:
+        """Drop shared sessions owned by workers not in ``live``; returns how many were dropped."""
+        with self.shared_sessions.atomic():
+            stale = [user_id for user_id, shared in self.shared_sessions.items()
+                     if shared.get('instance') not in live]
+            for user_id in stale:
+                del self.shared_sessions[user_id]
+        if stale:
+            self.logger.info(f"🧹 Dropped {len(stale)} voice sessions left by stopped workers")
+        return len(stale)
+
     def get_all_sids(self):
+        # Includes sids owned by other workers; the Socket.IO client manager routes
+        # emits and disconnects for those to the right process.
         return [
             session["sid"]
-            for session in self.user_sessions.values()
+            for _, session in self.shared_sessions.items()
             if "sid" in session
         ]
         
@@ -83,8 +199,16 @@ class UserSessionManager:
         # Cancel all running tasks
         for user_id in list(self.active_tasks.keys()):
             self.cancel_user_tasks(user_id)
+        for user_id in list(self.workers.keys()):
+            self._drop_work_queue(user_id)
+        self.work_queues.clear()
     
-        # Clear all sessions
+        # Clear this worker's sessions; other workers keep their own shared entries
+        with self.shared_sessions.atomic():
+            for user_id, shared in self.shared_sessions.items():
+                if shared.get('instance') == INSTANCE_ID or shared.get('sid') in self.sid_index:
+                    del self.shared_sessions[user_id]
         self.user_sessions.clear()
+        self.sid_index.clear()
         self.active_tasks.clear()
         self.logger.info("✅ Cleared all user sessions and active tasks.")
\ No newline at end of file
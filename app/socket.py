@@ -1,12 +1,22 @@
 import asyncio
 import base64
+import json
 import random
+import time
+import uuid
 from .key_manager import assign_key_to_user, release_key_for_user, update_last_active , count_tokens , user_token_usage
-from .lip_sync import generate_lip_sync_json
+from .lipsync_pool import LipSyncPool
+from .speech_text import SpeechTextFilter
+from .streaming import SentenceStream
+from .admission import AdmissionController
+from .edge_client import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, negotiate_audio_format
+from .tts_scheduler import TTSScheduler, INTERRUPT, FIRST_CHUNK, LATER_CHUNK
+from .metrics import time_stage, observe_stage
 import os
 
 class SocketHandler:
-    def __init__(self, sio, session_manager, config, tts, chat_manager, speech_recognition, history, modes, logger):
+    def __init__(self, sio, session_manager, config, tts, chat_manager, speech_recognition, history, modes, logger, admission=None,
+                 tts_scheduler=None, lipsync_pool=None):
         self.sio = sio
         self.session_manager = session_manager
         self.config = config
@@ -16,6 +26,9 @@ class SocketHandler:
         self.history = history
         self.modes = modes
         self.logger = logger
+        self.admission = admission or AdmissionController(logger)
+        self.tts_scheduler = tts_scheduler or TTSScheduler(logger)
+        self.lipsync = lipsync_pool or LipSyncPool(logger)
 
     def setup_socket_events(self):
         @self.sio.event
@@ -25,12 +38,12 @@ class SocketHandler:
 
         @self.sio.event
         async def disconnect(sid):
-            user_to_cleanup = None
-            for user_id, session in self.session_manager.user_sessions.items():
-                if session['sid'] == sid:
-                    user_to_cleanup = user_id
-                    break
+            user_to_cleanup = self.session_manager.get_user_by_sid(sid)
+            self.admission.withdraw_sid(sid)
             if user_to_cleanup:
+                self.admission.release(user_to_cleanup)
+                self.tts_scheduler.cancel_user(user_to_cleanup)
+                self.lipsync.cancel_user(user_to_cleanup)
                 release_key_for_user(user_to_cleanup)
                 self.session_manager.cleanup_user_session(user_to_cleanup)
                 self.logger.info(f"🔌 Disconnected: {user_to_cleanup}")
@@ -38,14 +51,46 @@ class SocketHandler:
         @self.sio.event
         async def register_user(sid, data):
             user_id = str(data.get("user_id", "default_user")).replace(" ", "_").lower()
-            self.session_manager.create_user_session(user_id, sid)
+            binary_audio = bool(data.get("binary_audio", False))
+            progressive_audio = bool(data.get("progressive_audio", False))
+            audio_format = negotiate_audio_format(data.get("audio_format"), bool(data.get("save_data", False)))
+            inline_visemes = bool(data.get("inline_visemes", False))
+
+            decision = self.admission.request(user_id, sid)
+            if decision["status"] == "queued":
+                await self.sio.emit("admission", decision, room=sid)
+                if not await self.admission.wait_for_turn(user_id):
+                    return
+                await self.sio.emit("admission", {"status": "admitted"}, room=sid)
+            elif decision["status"] == "rejected":
+                await self.sio.emit("admission", decision, room=sid)
+                await self.sio.emit("response", {
+                    "text": f"🚫 INAI is at capacity. Try again in about {int(decision['estimated_wait'])} seconds.",
+                    "audio": ""
+                }, room=sid)
+                await self.sio.disconnect(sid)
+                return
+
+            self.session_manager.create_user_session(
+                user_id, sid, binary_audio=binary_audio, progressive_audio=progressive_audio,
+                audio_format=audio_format, inline_visemes=inline_visemes
+            )
             key_data = assign_key_to_user(user_id, task="chat")
             if "api_key" in key_data:
                 update_last_active(user_id, sid)
                 self.logger.info(f"✅ User {user_id} registered with SID {sid}")
+                return {
+                    "binary_audio": binary_audio,
+                    "progressive_audio": progressive_audio,
+                    "audio_format": audio_format,
+                    "audio_mime": AUDIO_FORMATS[audio_format]["mime"],
+                    "inline_visemes": inline_visemes
+                }
             else:
+                self.admission.release(user_id)
+                self.session_manager.cleanup_user_session(user_id)
                 await self.sio.emit("response", {
-                    "text": "🚫 INAI is full (220 users max). Try again later.",
+                    "text": "🚫 INAI could not assign an API key. Try again later.",
                     "audio": ""
                 }, room=sid)
                 await self.sio.disconnect(sid)
@@ -62,7 +107,7 @@ class SocketHandler:
         async def stop_response(sid, data):
             user_id = str(data.get("user_id", "default_user")).replace(" ", "_").lower()
             self.logger.info(f"Stop response requested by user: {user_id}")
-            self.session_manager.cancel_user_tasks(user_id)
+            self.cancel_user_work(user_id)
 
     async def disconnect_all_users(self):
         for sid in list(self.session_manager.get_all_sids()):
@@ -77,7 +122,6 @@ class SocketHandler:
         self.session_manager.clear_all_sessions()
 
     async def handle_user_message(self, sid, data):
-        self.config.reload_env()
         if self.config.is_maintenance_on():
             await self.sio.emit("response", {
                 "text": "🚧 INAI is under maintenance. Please try again later.",
@@ -89,20 +133,12 @@ class SocketHandler:
         user_id = str(data.get("user_id", "default_user")).replace(" ", "_").lower()
         mode = data.get("mode", "friend")
         query = data.get("text", "").strip()
+        stream = bool(data.get("stream", self.config.stream_responses))
 
-        audio_path = os.path.join("Data", f"{user_id}.wav")
-        text_path = os.path.join("Data", f"{user_id}.txt")
-        json_path = os.path.join("Data", f"{user_id}.json")
-        json_url = f"/viseme/{user_id}.json"
-        audio_url = f"/audio/{user_id}.wav"
-
-        if user_id not in self.session_manager.user_sessions:
-            self.session_manager.create_user_session(user_id, sid)
-
-        session = self.session_manager.get_user_session(user_id)
-        if not session:
+        if not await self.require_registration(sid, user_id):
             return
 
+        session = self.session_manager.get_user_session(user_id)
         session['current_mode'] = mode
 
         if not query:
@@ -123,42 +159,40 @@ class SocketHandler:
             if phrase in query_lower and target_mode != mode:
                 session['current_mode'] = target_mode
                 await self.sio.emit("mode_change", {"mode": target_mode}, room=sid)
-                self.session_manager.cancel_user_tasks(user_id)
+                self.cancel_user_work(user_id)
                 return 
 
         if mode != "info" and any(word in query_lower for word in ["stop", "wait", "ruko", "arre", "sun"]):
-            self.session_manager.cancel_user_tasks(user_id)
+            self.cancel_user_work(user_id)
             self.session_manager.stop_current_tts(user_id)
             reply = random.choice(self.modes.interrupt_responses[mode])
-            audio = await self.tts.generate_tts(reply, user_id, mode)
-            await self.sio.emit("response", {"text": reply, "audio": audio}, room=sid)
+            audio = await self.synthesize(reply, user_id, mode, priority=INTERRUPT)
+            await self.sio.emit("response", {"text": reply, "audio": self.audio_payload(user_id, audio)}, room=sid)
             return
 
-        self.session_manager.cancel_user_tasks(user_id)
-        
-        conversation_id = await self.history.get_or_create_conversation(user_id, mode)
-        await self.history.save_message(conversation_id, "user", query)
-
         async def process_response():
             try:
-                response = await self.chat_manager.chat_with_groq(user_id, mode, query)
+                with time_stage("history_get", self.metric_mode(mode)):
+                    conversation_id = await self.history.get_or_create_conversation(user_id, mode)
+                with time_stage("history_save", self.metric_mode(mode)):
+                    await self.history.save_message(conversation_id, "user", query)
+
+                if stream:
+                    await self.handle_streaming_response(user_id, mode, query, conversation_id, sid)
+                    return
+
+                with self.admission.track("llm"), time_stage("llm", self.metric_mode(mode)):
+                    response = await self.chat_manager.chat_with_groq(user_id, mode, query)
                 if isinstance(response, tuple):
                     response, _ = response
                 elif isinstance(response, dict):
                     response = response.get("response", "")
                 else:
                     response = str(response)      
-                question_tokens = count_tokens(query)
-                answer_tokens = count_tokens(response)
-                total_tokens = question_tokens + answer_tokens 
-                if user_id not in user_token_usage:
-                    user_token_usage[user_id] = 0
-                user_token_usage[user_id] += total_tokens
-                self.logger.info(f"[Token] {user_id} used {total_tokens} tokens (Q: {question_tokens}, A: {answer_tokens})")  
-
-                await self.history.save_message(conversation_id, "assistant", response)
-                with open(text_path, "w", encoding="utf-8") as f:
-                    f.write(response)
+                self.record_token_usage(user_id, query, response)
+
+                with time_stage("history_save", self.metric_mode(mode)):
+                    await self.history.save_message(conversation_id, "assistant", response)
 
                 if mode == "info":
                     await self.sio.emit("response", {
@@ -167,15 +201,28 @@ class SocketHandler:
                         "visemes": ""
                     }, room=sid)
                     await self.handle_streaming_tts_for_info(user_id, response, sid)
+                elif (self.session_manager.get_user_session(user_id) or {}).get("progressive_audio"):
+                    stream_id = uuid.uuid4().hex[:12]
+                    await self.sio.emit("response", {
+                        "text": response,
+                        "audio": "",
+                        "visemes": "",
+                        "audio_stream": stream_id
+                    }, room=sid)
+                    frames, audio = await self.stream_audio_frames(user_id, response, mode, stream_id, sid)
+                    end = {"stream_id": stream_id, "frames": frames, "visemes": ""}
+                    if audio is None:
+                        end["error"] = True
+                    else:
+                        end["visemes"] = await self.generate_visemes(user_id, response, audio, mode)
+                    await self.sio.emit("audio_end", end, room=sid)
                 else:
-                    audio = await self.tts.generate_tts(response, user_id, mode)
-                    with open(audio_path, "wb") as f:
-                        f.write(base64.b64decode(audio))
-                    generate_lip_sync_json(audio_path, text_path, json_path)
+                    audio = await self.synthesize(response, user_id, mode)
+                    visemes = await self.generate_visemes(user_id, response, audio, mode)
                     await self.sio.emit("response", {
                         "text": response,
-                        "audio": audio,
-                        "visemes": json_url
+                        "audio": self.audio_payload(user_id, audio),
+                        "visemes": visemes
                     }, room=sid)
 
             except asyncio.CancelledError:
@@ -188,34 +235,241 @@ class SocketHandler:
                     "visemes": ""
                 }, room=sid)
 
-        task = asyncio.create_task(process_response())
-        self.session_manager.add_task(user_id, task)
+        status = self.session_manager.submit_work(user_id, process_response)
+        if status["pending"] or status["dropped"]:
+            await self.sio.emit("queue_status", status, room=sid)
+
+    async def require_registration(self, sid, user_id):
+        # Sessions are only created by register_user, which goes through admission control.
+        if self.session_manager.get_user_by_sid(sid) == user_id:
+            return True
+        self.logger.warning(f"🚫 Ignored a message from unregistered user {user_id} on {sid}")
+        await self.sio.emit("response", {"text": "🚫 Please register before sending messages.", "audio": ""}, room=sid)
+        return False
+
+    def cancel_user_work(self, user_id):
+        self.session_manager.cancel_user_tasks(user_id)
+        self.tts_scheduler.cancel_user(user_id)
+        self.lipsync.cancel_user(user_id)
+
+    def metric_mode(self, mode):
+        # The mode comes from the client; only known modes become metric labels.
+        return mode if isinstance(mode, str) and mode in self.modes.modes else "unknown"
+
+    async def synthesize(self, text, user_id, mode, priority=FIRST_CHUNK):
+        # The scheduler slot is taken only on a cache miss, so cached replies never queue.
+        with self.admission.track("tts"), time_stage("tts", self.metric_mode(mode)):
+            return await self.tts.generate_tts(text, user_id, mode, self.audio_format(user_id),
+                                               slot=lambda: self.tts_scheduler.slot(user_id, priority))
+
+    async def synthesize_chunk(self, text, chunk_id, user_id=None):
+        priority = FIRST_CHUNK if chunk_id == 0 else LATER_CHUNK
+        with self.admission.track("tts"), time_stage("tts", "info"):
+            return await self.tts.generate_tts_chunk(text, chunk_id, user_id, self.audio_format(user_id),
+                                                     slot=lambda: self.tts_scheduler.slot(user_id, priority))
+
+    async def stream_audio_frames(self, user_id, text, mode, stream_id, sid):
+        """Emit ``audio_frame`` events as edge-tts yields audio; returns (frame count, full audio).
+
+        Frames carry the ``stream_id`` announced in the ``response`` event and a ``seq``
+        number starting at 0; the caller closes the stream with ``audio_end``. If
+        synthesis fails partway the audio is None and ``audio_end`` carries ``error``.
+        """
+        seq = 0
+        audio = bytearray()
+        started = time.perf_counter()
+        slot = lambda: self.tts_scheduler.slot(user_id, FIRST_CHUNK)  # noqa: E731
+        with self.admission.track("tts"), time_stage("tts", self.metric_mode(mode)):
+            try:
+                async for frame in self.tts.stream_tts(text, user_id, mode, self.audio_format(user_id), slot=slot):
+                    if seq == 0:
+                        observe_stage("tts_first_frame", self.metric_mode(mode), time.perf_counter() - started)
+                    audio += frame
+                    await self.sio.emit("audio_frame", {
+                        "stream_id": stream_id,
+                        "seq": seq,
+                        "audio": self.audio_payload(user_id, frame)
+                    }, room=sid)
+                    seq += 1
+            except Exception as e:
+                self.logger.error(f"Audio stream {stream_id} for {user_id} cut off after {seq} frames: {e}")
+                return seq, None
+        return seq, bytes(audio)
+
+    def audio_format(self, user_id) -> str:
+        """The audio format negotiated at register_user (MP3 for unknown users)."""
+        session = self.session_manager.get_user_session(user_id) if user_id else None
+        return (session or {}).get("audio_format", DEFAULT_AUDIO_FORMAT)
+
+    def audio_payload(self, user_id, audio: bytes):
+        """Raw bytes for clients that negotiated binary_audio, base64 text for everyone else."""
+        if not audio:
+            return ""
+        session = self.session_manager.get_user_session(user_id)
+        if session and session.get("binary_audio"):
+            return audio
+        return base64.b64encode(audio).decode("utf-8")
+
+    def record_token_usage(self, user_id, query, response):
+        question_tokens = count_tokens(query)
+        answer_tokens = count_tokens(response)
+        total_tokens = question_tokens + answer_tokens
+        user_token_usage.increment(user_id, total_tokens)
+        self.logger.info(f"[Token] {user_id} used {total_tokens} tokens (Q: {question_tokens}, A: {answer_tokens})")
+
+    async def generate_visemes(self, user_id, text, audio, mode="friend", name=None):
+        """Mouth cues for voiced ``text``, computed in memory on the lip-sync pool.
+
+        With LIPSYNC_MODE=boundaries they come from the edge-tts word timings recorded
+        during synthesis; otherwise, or when those are unknown, from decoding the TTS
+        bytes. Clients that negotiated ``inline_visemes`` get ``{"mouthCues": [...]}``
+        in the event itself; others get the ``/viseme/{name}.json`` URL of the same JSON.
+        Empty when the pool's queue is full.
+        """
+        if not audio:
+            return ""
+        audio_format = self.audio_format(user_id)
+        boundaries = None
+        if self.config.lipsync_mode == "boundaries":
+            boundaries = self.tts.word_boundaries_for(text, audio_format)
+        with time_stage("lipsync", self.metric_mode(mode)):
+            if boundaries:
+                cues = await self.lipsync.cues(user_id, "boundaries", boundaries,
+                                               self.tts.estimate_duration(audio, audio_format))
+            else:
+                cues = await self.lipsync.cues(user_id, "audio", text, audio, AUDIO_FORMATS[audio_format]["container"])
+        if cues is None:
+            return ""
+        session = self.session_manager.get_user_session(user_id) or {}
+        if session.get("inline_visemes"):
+            return {"mouthCues": cues}
+        name = name or user_id
+        await asyncio.to_thread(self._write_visemes, os.path.join("Data", f"{name}.json"), cues)
+        return f"/viseme/{name}.json"
+
+    @staticmethod
+    def _write_visemes(path, cues):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"mouthCues": cues}, f)
+
+    async def handle_streaming_response(self, user_id, mode, query, conversation_id, sid):
+        """Stream the Groq reply to the client and voice it sentence by sentence.
+
+        Text deltas, with *action* asides already removed, go out as ``response_delta``
+        while a separate task synthesizes each completed sentence, so the first audio is
+        ready after the first sentence instead of after the whole reply. ``response_end``
+        carries the final cleaned reply, which replaces the deltas, or an error message
+        with ``error`` set if the reply broke off; a broken-off reply is not saved.
+        Markdown is filtered on the way to TTS, so code blocks and tables are announced
+        rather than read out.
+        """
+        sentences = asyncio.Queue()
+        speaker = asyncio.create_task(self.speak_sentences(user_id, mode, sentences, sid))
+        speech = SpeechTextFilter()
+        splitter = SentenceStream()
+        parts = []
+        try:
+            await self.sio.emit("streaming_status", {"can_stop": True}, room=sid)
+            started = time.perf_counter()
+            try:
+                with self.admission.track("llm"), time_stage("llm", self.metric_mode(mode)):
+                    async for delta in self.chat_manager.stream_chat_with_groq(user_id, mode, query):
+                        if not parts:
+                            observe_stage("llm_first_token", self.metric_mode(mode), time.perf_counter() - started)
+                        parts.append(delta)
+                        await self.sio.emit("response_delta", {"text": delta}, room=sid)
+                        for sentence in splitter.feed(speech.feed(delta)):
+                            sentences.put_nowait(sentence)
+            except Exception as e:
+                # The reply broke off: tell the client, and neither save nor bill the fragment.
+                self.logger.error(f"Reply stream for {user_id} broke off after {len(parts)} deltas: {e}")
+                await self.sio.emit("response_end", {"text": "⚠ I faced an error. Try again.", "error": True}, room=sid)
+                await self.sio.emit("streaming_status", {"can_stop": False}, room=sid)
+                return
+            for sentence in splitter.feed(speech.flush()) + splitter.flush():
+                sentences.put_nowait(sentence)
+            sentences.put_nowait(None)
+
+            response = self.chat_manager.clean_reply("".join(parts))
+            self.record_token_usage(user_id, query, response)
+            await self.sio.emit("response_end", {"text": response}, room=sid)
+            await self.history.save_message(conversation_id, "assistant", response)
+
+            await speaker
+            await self.sio.emit("streaming_status", {"can_stop": False}, room=sid)
+        finally:
+            if not speaker.done():
+                speaker.cancel()
+
+    async def speak_sentences(self, user_id, mode, sentences, sid):
+        chunk_id = 0
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                break
+            sentence = self.chat_manager.clean_reply(sentence)
+            if not sentence:
+                continue
+            if mode == "info":
+                audio = await self.synthesize_chunk(sentence, chunk_id, user_id)
+                visemes = ""
+            else:
+                priority = FIRST_CHUNK if chunk_id == 0 else LATER_CHUNK
+                audio = await self.synthesize(sentence, user_id, mode, priority=priority)
+                visemes = await self.generate_visemes(user_id, sentence, audio, mode, name=f"{user_id}_{chunk_id}")
+            if audio:
+                await self.sio.emit("streaming_audio", {
+                    "text": sentence,
+                    "audio": self.audio_payload(user_id, audio),
+                    "visemes": visemes,
+                    "chunk_id": chunk_id,
+                    "is_final": False
+                }, room=sid)
+            chunk_id += 1
 
     async def handle_streaming_tts_for_info(self, user_id, response, sid):
+        """Voice an info-mode answer chunk by chunk.
+
+        Up to ``tts_prefetch_depth`` chunks ahead of the one being played are synthesized
+        concurrently; chunks are still emitted in order, each one timed to go out shortly
+        before the previous chunk's audio finishes playing.
+        """
+        chunks = self.tts.split_into_sentence_chunks(response)
+        depth = max(0, self.config.tts_prefetch_depth)
+        loop = asyncio.get_running_loop()
+        pending = {}
+        next_emit_at = 0.0
         try:
-            chunks = self.tts.split_into_sentence_chunks(response, max_sentences_per_chunk=2)
             await self.sio.emit("streaming_status", {"can_stop": True}, room=sid)
             for i, chunk in enumerate(chunks):
-                if asyncio.current_task().cancelled():
-                    break
+                for j in range(i, min(i + depth + 1, len(chunks))):
+                    if j not in pending:
+                        pending[j] = asyncio.create_task(self.synthesize_chunk(chunks[j], j, user_id))
                 session = self.session_manager.get_user_session(user_id)
                 if not session:
                     break
-                audio_data = await self.tts.generate_tts_chunk(chunk, i)
-                if audio_data:
-                    await self.sio.emit("streaming_audio", {
-                        "text": chunk,
-                        "audio": audio_data,
-                        "chunk_id": i,
-                        "is_final": i == len(chunks) - 1
-                    }, room=sid)
-                    await asyncio.sleep(1.5)
+                audio_data = await pending.pop(i)
+                if not audio_data:
+                    continue
+                delay = next_emit_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.sio.emit("streaming_audio", {
+                    "text": chunk,
+                    "audio": self.audio_payload(user_id, audio_data),
+                    "chunk_id": i,
+                    "is_final": i == len(chunks) - 1
+                }, room=sid)
+                duration = self.tts.estimate_duration(audio_data, self.audio_format(user_id))
+                next_emit_at = loop.time() + max(0.0, duration - self.config.tts_pacing_lead)
             await self.sio.emit("streaming_status", {"can_stop": False}, room=sid)
         except Exception as e:
             self.logger.error(f"Streaming error for {user_id}: {e}")
+        finally:
+            for task in pending.values():
+                task.cancel()
 
     async def handle_user_audio(self, sid, data):
-        self.config.reload_env()
         if self.config.is_maintenance_on():
             await self.sio.emit("response", {
                 "text": "🚧 INAI is under maintenance.",
@@ -226,17 +480,18 @@ class SocketHandler:
 
         user_id = str(data.get("user_id", "default_user")).replace(" ", "_").lower()
         mode = data.get("mode", "friend")
-        audio_base64 = data.get("audio", "")
+        audio = data.get("audio", "")
 
-        if not audio_base64:
+        if not audio:
             await self.sio.emit("response", {"text": "Audio was empty.", "audio": ""}, room=sid)
             return
 
-        if user_id not in self.session_manager.user_sessions:
-            self.session_manager.create_user_session(user_id, sid)
+        if not await self.require_registration(sid, user_id):
+            return
 
         self.session_manager.stop_current_tts(user_id)
-        query = await self.speech_recognition.process_audio(audio_base64)
+        with time_stage("stt", self.metric_mode(mode)):
+            query = await self.speech_recognition.process_audio(audio)
 
         if "error" in query.lower():
             await self.sio.emit("response", {"text": query, "audio": ""}, room=sid)
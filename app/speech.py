@@ -16,9 +16,10 @@ class SpeechRecognition:
             "love": ["love mode", "switch to love mode", "start love mode"],
         }
 
-    async def process_audio(self, audio_base64: str) -> str:
+    async def process_audio(self, audio) -> str:
         try:
-            audio_bytes = base64.b64decode(audio_base64)
+            # Binary-protocol clients send raw bytes, older clients a base64 string.
+            audio_bytes = audio if isinstance(audio, (bytes, bytearray)) else base64.b64decode(audio)
             raw_path = f"Data/raw_{uuid.uuid4()}.webm"
             wav_path = f"Data/input_{uuid.uuid4()}.wav"
 
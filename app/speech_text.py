@@ -0,0 +1,177 @@
+import re
+from typing import Optional
+
+CODE_PLACEHOLDER = "The code is on your screen."
+TABLE_PLACEHOLDER = "The table is on your screen."
+LINK_PLACEHOLDER = "the link on screen"
+
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+# Quote, heading and list markers at the start of a line; group 1 is set for headings
+# and list items, which get a full stop if they lack one.
+LINE_MARKERS = re.compile(r"^(?:\s*>)*\s*(#{1,6}\s+|(?:[-*+]|\d+[.)])\s+)?")
+# Markers can only be told apart from text ("1." vs "1.5") once the first word is complete.
+FIRST_WORD = re.compile(r"^(?:\s*>)*\s*[^\s>]\S*\s")
+LINK = re.compile(r"!?\[([^\]\n]*)\]\([^)\s]*(?:\s+\"[^\"\n]*\")?\)")
+INLINE_CODE = re.compile(r"`([^`\n]+)`")
+AUTOLINK = re.compile(r"<((?:https?://|www\.)[^>\s]+)>")
+TAG = re.compile(r"</?[a-zA-Z][^>\n]*>")
+URL = re.compile(r"\b(?:https?://|www\.)[^\s<>()\[\]]+[^\s<>()\[\].,;:!?'\"]")
+STOPS = ".!?।॥…:;,"
+
+
+def _inline(text: str, link_placeholder: str) -> str:
+    text = LINK.sub(r"\1", text)
+    text = INLINE_CODE.sub(r"\1", text)
+    text = AUTOLINK.sub(r"\1", text)
+    text = TAG.sub("", text)
+    return URL.sub(link_placeholder, text)
+
+
+def _open_construct(text: str) -> Optional[int]:
+    """Index where a link, inline code span or tag starts but does not finish within ``text``."""
+    i = 0
+    while i < len(text):
+        char = text[i]
+        pattern = {"[": LINK, "!": LINK, "`": INLINE_CODE, "<": TAG}.get(char)
+        if pattern is None or (char == "!" and not text.startswith("![", i)) \
+                or (char == "<" and not re.match(r"</?[a-zA-Z]", text[i:i + 3])):
+            i += 1
+            continue
+        match = pattern.match(text, i) or (AUTOLINK.match(text, i) if char == "<" else None)
+        if match is None:
+            return i
+        i = match.end()
+    return None
+
+
+class SpeechTextFilter:
+    """Turns markdown into text worth speaking, incrementally, for TTS input.
+
+    Fenced code blocks and tables are replaced by a short spoken placeholder, links by
+    their label and bare URLs by ``link_placeholder``; heading, list and quote markers,
+    horizontal rules and HTML tags are dropped, and headings and list items get a full
+    stop so they are voiced (and chunked) as sentences. Prose is passed through as soon
+    as a line is known not to open a code block or table, word by word, so streamed
+    replies are not held back until the end of each line.
+    """
+
+    def __init__(self, code_placeholder: str = CODE_PLACEHOLDER, table_placeholder: str = TABLE_PLACEHOLDER,
+                 link_placeholder: str = LINK_PLACEHOLDER):
+        self.code_placeholder = code_placeholder
+        self.table_placeholder = table_placeholder
+        self.link_placeholder = link_placeholder
+        self.line = ""
+        self.fence: Optional[str] = None
+        self.in_table = False
+        self.line_started = False
+        self.needs_stop = False
+        self.tail = ""
+
+    def feed(self, delta: str) -> str:
+        self.line += delta
+        out = []
+        while "\n" in self.line:
+            line, self.line = self.line.split("\n", 1)
+            out.append(self._complete_line(line))
+        out.append(self._partial_line())
+        return "".join(out)
+
+    def flush(self) -> str:
+        line, self.line = self.line, ""
+        text = self._complete_line(line, newline=False) if line or self.line_started else ""
+        self.fence = None
+        self.in_table = False
+        return text
+
+    def _kind(self, line: str, complete: bool) -> Optional[str]:
+        stripped = line.lstrip()
+        if not stripped:
+            return "blank" if complete else None
+        if FENCE.match(line):
+            return "fence"
+        if stripped[0] in "`~" and len(stripped) < 3 and not complete:
+            return None
+        if stripped.startswith("|"):
+            return "table"
+        if RULE.match(line):
+            return "rule" if complete else None
+        if not complete and set(stripped) <= set("-*_ "):
+            return None
+        return "prose"
+
+    def _complete_line(self, line: str, newline: bool = True) -> str:
+        end = "\n" if newline else ""
+        if self.fence is not None:
+            if line.strip().startswith(self.fence):
+                self.fence = None
+            return ""
+        if self.line_started:
+            return self._finish_prose(line) + end
+
+        kind = self._kind(line, complete=True)
+        if kind != "table" and self.in_table:
+            self.in_table = False
+        if kind == "fence":
+            self.fence = FENCE.match(line).group(1)
+            return f"{self.code_placeholder}\n"
+        if kind == "table":
+            if self.in_table:
+                return ""
+            self.in_table = True
+            return f"{self.table_placeholder}\n"
+        if kind in ("rule", "blank"):
+            return end
+        markers = LINE_MARKERS.match(line)
+        self._start_line(markers)
+        return self._finish_prose(line[markers.end():]) + end
+
+    def _partial_line(self) -> str:
+        if self.fence is not None:
+            return ""
+        if not self.line_started:
+            kind = self._kind(self.line, complete=False)
+            if kind != "prose" or not FIRST_WORD.match(self.line):
+                return ""
+            markers = LINE_MARKERS.match(self.line)
+            if markers.end() == len(self.line):
+                return ""
+            self.in_table = False
+            self.line = self.line[markers.end():]
+            self._start_line(markers)
+        stripped = self.line.rstrip()
+        cut = max(stripped.rfind(" "), stripped.rfind("\t"))
+        if cut <= 0:
+            return ""
+        candidate = self.line[:cut]
+        open_at = _open_construct(candidate)
+        if open_at is not None:
+            candidate = candidate[:open_at]
+        if not candidate.strip():
+            return ""
+        self.line = self.line[len(candidate):]
+        return self._emit(_inline(candidate, self.link_placeholder))
+
+    def _emit(self, text: str) -> str:
+        if text.strip():
+            self.tail = text.rstrip()[-1]
+        return text
+
+    def _start_line(self, markers):
+        self.line_started = True
+        self.needs_stop = markers.group(1) is not None
+
+    def _finish_prose(self, rest: str) -> str:
+        text = self._emit(_inline(rest, self.link_placeholder)).rstrip()
+        if self.needs_stop and self.tail and self.tail not in STOPS:
+            text += "."
+        self.line_started = False
+        self.needs_stop = False
+        self.tail = ""
+        return text
+
+
+def extract_speech_text(text: str, **placeholders) -> str:
+    """The parts of a markdown reply worth speaking; see SpeechTextFilter."""
+    speech = SpeechTextFilter(**placeholders)
+    return speech.feed(text) + speech.flush()
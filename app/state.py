@@ -0,0 +1,390 @@
+import asyncio
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+
+class StateBackend:
+    """Namespaced key/value store for the JSON-serializable state workers must share.
+
+    Treat values as copies: after changing what you read, write it back with ``set``,
+    inside ``atomic`` (or with ``update``) when other workers may change it too.
+    """
+
+    @contextmanager
+    def atomic(self):
+        """Make the reads and writes in the ``with`` block one step for every thread and worker."""
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, fn, default=None):
+        """Atomically replace the value with ``fn(current value or default)``; returns the new value."""
+        with self.atomic():
+            value = fn(self.get(namespace, key, default))
+            self.set(namespace, key, value)
+        return value
+
+    def get(self, namespace: str, key: str, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any):
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str):
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        raise NotImplementedError
+
+    def clear(self, namespace: str):
+        raise NotImplementedError
+
+
+class InMemoryStateBackend(StateBackend):
+    """Process-local default; behaves like the plain dicts it replaces."""
+
+    def __init__(self):
+        self.data: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def atomic(self):
+        with self.lock:
+            yield
+
+    def get(self, namespace, key, default=None):
+        with self.lock:
+            return self.data.get(namespace, {}).get(key, default)
+
+    def set(self, namespace, key, value):
+        with self.lock:
+            self.data.setdefault(namespace, {})[key] = value
+
+    def delete(self, namespace, key):
+        with self.lock:
+            self.data.get(namespace, {}).pop(key, None)
+
+    def items(self, namespace):
+        with self.lock:
+            return list(self.data.get(namespace, {}).items())
+
+    def clear(self, namespace):
+        with self.lock:
+            self.data.pop(namespace, None)
+
+
+class SQLiteStateBackend(StateBackend):
+    """State in a local SQLite file (WAL mode), shared by every worker on the node.
+
+    Calls block on the file, and the event loop with them while another worker holds
+    the write lock (up to the 5 s busy timeout); it is meant for development only.
+    Use RedisStateBackend for multi-worker production deployments.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+
+    @contextmanager
+    def atomic(self):
+        # BEGIN IMMEDIATE takes the database write lock, so other workers wait for COMMIT;
+        # the RLock keeps this worker's threads out and lets atomic blocks nest.
+        with self.lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def get(self, namespace, key, default=None):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                (namespace, key, json.dumps(value))
+            )
+
+    def delete(self, namespace, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM state WHERE namespace = ? ORDER BY rowid", (namespace,)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def clear(self, namespace):
+        with self.lock:
+            self.conn.execute("DELETE FROM state WHERE namespace = ?", (namespace,))
+
+
+class RedisStateBackend(StateBackend):
+    """State in Redis, shared by workers on any number of hosts; use it in production.
+
+    Each namespace is a hash of JSON values. ``atomic`` holds one Redis lock for the
+    block, so blocks in different workers never interleave; the lock expires after
+    ``lock_timeout`` seconds in case its worker dies. Unlike SQLite, writes made before
+    an error inside the block are not undone. Needs the optional ``redis`` package.
+    """
+
+    def __init__(self, url: str, prefix: str = "inai:state", lock_timeout: float = 10.0, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.lock = threading.RLock()
+        self.depth = 0
+        # Critical sections are a few round trips, so poll for the lock often.
+        self.shared_lock = client.lock(f"{prefix}:lock", timeout=lock_timeout, sleep=0.005,
+                                       blocking_timeout=lock_timeout)
+
+    def _key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}"
+
+    @contextmanager
+    def atomic(self):
+        # The RLock keeps this worker's threads out and lets atomic blocks nest; only
+        # the outermost block takes the Redis lock.
+        with self.lock:
+            if not self.depth and not self.shared_lock.acquire():
+                raise TimeoutError("❌ Timed out waiting for the shared state lock")
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if not self.depth:
+                    self.shared_lock.release()
+
+    def get(self, namespace, key, default=None):
+        value = self.client.hget(self._key(namespace), key)
+        return json.loads(value) if value is not None else default
+
+    def set(self, namespace, key, value):
+        self.client.hset(self._key(namespace), key, json.dumps(value))
+
+    def delete(self, namespace, key):
+        self.client.hdel(self._key(namespace), key)
+
+    def items(self, namespace):
+        return [(key.decode("utf-8"), json.loads(value))
+                for key, value in self.client.hgetall(self._key(namespace)).items()]
+
+    def clear(self, namespace):
+        self.client.delete(self._key(namespace))
+
+
+class SharedDict(MutableMapping):
+    """Dict view of one backend namespace, so existing dict code keeps working."""
+
+    _missing = object()
+
+    def __init__(self, backend: StateBackend, namespace: str):
+        self.backend = backend
+        self.namespace = namespace
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.namespace, key, self._missing)
+        if value is self._missing:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(self.namespace, key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.backend.delete(self.namespace, key)
+
+    def __contains__(self, key):
+        return self.backend.get(self.namespace, key, self._missing) is not self._missing
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([key for key, _ in self.backend.items(self.namespace)])
+
+    def __len__(self):
+        return len(self.backend.items(self.namespace))
+
+    def items(self):
+        return self.backend.items(self.namespace)
+
+    def clear(self):
+        self.backend.clear(self.namespace)
+
+    def atomic(self):
+        return self.backend.atomic()
+
+    def modify(self, key, fn, default=None):
+        """Atomically set ``self[key] = fn(self.get(key, default))``; returns the new value."""
+        return self.backend.update(self.namespace, key, fn, default)
+
+    def increment(self, key, amount=1):
+        return self.modify(key, lambda value: value + amount, 0)
+
+
+# This worker in shared state. Unlike a pid it is never reused, not even by a
+# restarted container where the server is always pid 1.
+INSTANCE_ID = uuid.uuid4().hex
+
+
+class WorkerRegistry:
+    """Heartbeats of the workers sharing a backend, to tell their entries from stale ones.
+
+    Each worker calls ``beat`` more often than every ``ttl`` seconds; ``live`` returns
+    the workers heard from within ``ttl`` and forgets the rest, so entries tagged with
+    a worker that crashed or was restarted can be dropped once it stops beating.
+    """
+
+    def __init__(self, backend: StateBackend, instance_id: str = INSTANCE_ID, ttl: float = 30.0):
+        self.workers = SharedDict(backend, "workers")
+        self.instance_id = instance_id
+        self.ttl = ttl
+
+    def beat(self):
+        self.workers[self.instance_id] = time.time()
+
+    def live(self) -> Set[str]:
+        now = time.time()
+        live = set()
+        with self.workers.atomic():
+            for instance_id, seen in self.workers.items():
+                if now - seen <= self.ttl:
+                    live.add(instance_id)
+                else:
+                    del self.workers[instance_id]
+        return live
+
+    def leave(self):
+        self.workers.pop(self.instance_id, None)
+
+
+def _sqlite_path(url: str) -> str:
+    return url[len("sqlite:///"):]
+
+
+_backends: Dict[str, StateBackend] = {}
+
+
+def get_state_backend(url: Optional[str] = None) -> StateBackend:
+    """Return the backend for ``url`` ("memory", "redis://..." or "sqlite:///path"), one instance per URL."""
+    url = url or "memory"
+    if url not in _backends:
+        if url == "memory":
+            _backends[url] = InMemoryStateBackend()
+        elif url.startswith(("redis://", "rediss://")):
+            _backends[url] = RedisStateBackend(url)
+        elif url.startswith("sqlite:///"):
+            _backends[url] = SQLiteStateBackend(_sqlite_path(url))
+        else:
+            raise ValueError(f"❌ Unsupported STATE_BACKEND: {url}")
+    return _backends[url]
+
+
+class SQLiteClientManager(AsyncPubSubManager):
+    """Socket.IO client manager that relays emits between workers through a SQLite file.
+
+    A single-node stand-in for ``socketio.AsyncRedisManager``, meant for development:
+    every worker appends the messages it publishes to a table (audio payloads
+    included) and polls it for messages from the others. Use Redis for multi-worker
+    production deployments. Database calls run on a worker thread, never on the
+    event loop.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, url: str, channel: str = "socketio", write_only: bool = False,
+                 logger=None, poll_interval: float = 0.05, retention: float = 60.0):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(_sqlite_path(url), check_same_thread=False, isolation_level=None, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS socketio_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload BLOB NOT NULL
+            )
+        """)
+
+    def _execute(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _insert(self, data):
+        self._execute(
+            "INSERT INTO socketio_messages (channel, created_at, payload) VALUES (?, ?, ?)",
+            (self.channel, time.time(), pickle.dumps(data))
+        )
+
+    async def _publish(self, data):
+        await asyncio.to_thread(self._insert, data)
+
+    async def _listen(self):
+        rows = await asyncio.to_thread(self._execute, "SELECT COALESCE(MAX(id), 0) FROM socketio_messages")
+        last_id = rows[0][0]
+        last_prune = time.time()
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                "SELECT id, payload FROM socketio_messages WHERE channel = ? AND id > ? ORDER BY id",
+                (self.channel, last_id)
+            )
+            for message_id, payload in rows:
+                last_id = message_id
+                yield payload
+            if time.time() - last_prune > self.retention:
+                last_prune = time.time()
+                await asyncio.to_thread(
+                    self._execute,
+                    "DELETE FROM socketio_messages WHERE created_at < ?", (last_prune - self.retention,)
+                )
+            await asyncio.sleep(self.poll_interval)
+
+
+def create_client_manager(url: Optional[str] = None, logger=None):
+    """Socket.IO client manager for ``url``; None keeps the default single-process manager."""
+    if not url or url == "memory":
+        return None
+    if url.startswith(("redis://", "rediss://")):
+        # Needs the optional ``redis`` package.
+        return socketio.AsyncRedisManager(url, logger=logger)
+    if url.startswith("sqlite:///"):
+        # Development only: polls a local file and stores every emit, audio included.
+        return SQLiteClientManager(url, logger=logger)
+    raise ValueError(f"❌ Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
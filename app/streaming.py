@@ -0,0 +1,142 @@
+import re
+from typing import List
+
+# Sentence terminators: Latin, ellipsis, Devanagari danda/double danda (Hindi and, by
+# convention, Gujarati) and full-width CJK, optionally followed by up to two closing
+# quotes/brackets that stay with the sentence. Latin ones only end a sentence before
+# whitespace (so "3.5" stays intact); the others also end one directly before text.
+_LATIN_END = "[.!?…]"
+_OTHER_END = "[।॥。！？]"
+_CLOSE = "[\"'”’)\\]]"
+SENTENCE_END = re.compile(
+    f"(?<={_LATIN_END})\\s+|(?<={_LATIN_END}{_CLOSE})\\s+|(?<={_LATIN_END}{_CLOSE}{{2}})\\s+"
+    f"|(?<={_OTHER_END})(?![।॥\"'”’)\\]])\\s*"
+    f"|(?<={_OTHER_END}{_CLOSE})(?!{_CLOSE})\\s*"
+)
+# Clause breaks that make a natural place for a short first chunk.
+CLAUSE_END = re.compile(r"(?<=[,;:–—،、，])\s+")
+# *action* asides the model likes to add (single stars, not **bold**).
+ACTION = re.compile(r"(?<!\*)\*[^*\n]+\*(?!\*)")
+# An aside that may still be open at the end of the streamed text so far.
+_OPEN_ACTION = re.compile(r"(?<!\*)\*[^*\n]*\**\Z")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+
+
+def _word_chunks(sentence: str, max_words: int) -> List[str]:
+    """Split an overlong sentence at clause breaks, falling back to every ``max_words`` words."""
+    pieces = []
+    for clause in CLAUSE_END.split(sentence):
+        words = clause.split()
+        for start in range(0, len(words), max_words):
+            pieces.append(words[start:start + max_words])
+    chunks, current = [], []
+    for words in pieces:
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = []
+        current += words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def _first_chunk(sentence: str, first_words: int) -> List[str]:
+    """The opening of a reply: its first clause when that is short, else its first ``first_words`` words."""
+    words = sentence.split()
+    if len(words) <= first_words:
+        return [sentence]
+    for match in CLAUSE_END.finditer(sentence):
+        clause_words = len(sentence[:match.start()].split())
+        if clause_words > first_words + first_words // 2:
+            break
+        if clause_words >= 3:
+            return [sentence[:match.start()], sentence[match.end():]]
+    return [" ".join(words[:first_words]), " ".join(words[first_words:])]
+
+
+def adaptive_chunks(text: str, first_words: int = 8, max_words: int = 48, growth: float = 2.0) -> List[str]:
+    """Split a reply into TTS chunks that start tiny and grow.
+
+    The first chunk is the first clause or about ``first_words`` words, so its audio is
+    ready quickly. Later chunks take whole sentences until they reach a word budget
+    that starts at ``growth * first_words`` and grows by ``growth`` per chunk up to
+    ``max_words``, so long replies need fewer requests. Only a sentence longer than
+    ``max_words`` is broken up, at clause breaks where possible.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return []
+    head = _first_chunk(sentences[0], first_words)
+    chunks = head[:1]
+    pending = head[1:] + sentences[1:]
+
+    budget = min(max_words, int(first_words * growth))
+    current: List[str] = []
+    current_words = 0
+    for sentence in pending:
+        words = len(sentence.split())
+        if current and (current_words + words > max_words or words > max_words):
+            chunks.append(" ".join(current))
+            current, current_words = [], 0
+            budget = min(max_words, int(budget * growth))
+        if words > max_words:
+            chunks += _word_chunks(sentence, max_words)
+            continue
+        current.append(sentence)
+        current_words += words
+        # A chunk closes once it reaches its budget, so chunk sizes keep growing.
+        if current_words >= budget:
+            chunks.append(" ".join(current))
+            current, current_words = [], 0
+            budget = min(max_words, int(budget * growth))
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class SentenceStream:
+    """Collects streamed text deltas and hands out sentences as soon as they are complete."""
+
+    boundary = re.compile(f"{SENTENCE_END.pattern}|\\n+")
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        self.buffer += delta
+        parts = self.boundary.split(self.buffer)
+        # The last part has no terminator + whitespace after it yet, so it may still grow.
+        self.buffer = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self) -> List[str]:
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+
+class ActionFilter:
+    """Drops *action* asides from streamed text deltas.
+
+    Text from a star that may open an aside is held back until the aside closes
+    or the line ends, so an aside split across deltas never reaches the client.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        start = 0
+        for match in ACTION.finditer(self.buffer):
+            start = match.end()
+        pending = _OPEN_ACTION.search(self.buffer, start)
+        cut = pending.start() if pending else len(self.buffer)
+        text, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return ACTION.sub("", text)
+
+    def flush(self) -> str:
+        text, self.buffer = self.buffer, ""
+        return ACTION.sub("", text)
@@ -1,48 +1,90 @@
-import os
 import re
-import uuid
-import base64
-import edge_tts
-from langdetect import detect
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional
+from .audio_cache import AudioCache, RecentAudioStore
+from .edge_client import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, EdgeConnectionPool, EdgeTTSClient
+from .language import LanguageDetector, language_detector
+from .speech_text import extract_speech_text
+from .streaming import adaptive_chunks
 
+# Replies whose WordBoundary events are kept for lip sync (a few KiB each).
+MAX_WORD_BOUNDARY_ENTRIES = 512
 
-class TextToSpeech:
-    def __init__(self, config, logger):
-        self.config = config
-        self.logger = logger
-        self.last_audio_data = {}
-
-    def split_into_sentence_chunks(self, text, max_sentences_per_chunk=2):
-
-        text = re.sub(r"\((.*?)\)", r"\1", text) 
-        text = re.sub(r"(.?)", r"\1", text).strip()
-
-        if not text:
-            return []
-
-        sentence_pattern = r'(?<=[.!?])\s+'
-        sentences = re.split(sentence_pattern, text.strip())
-        sentences = [s.strip() for s in sentences if s.strip()]
+# A TTS scheduler slot, e.g. ``lambda: scheduler.slot(user_id, priority)``. It is held
+# only around the edge-tts call itself, so cache hits never wait for one.
+Slot = Optional[Callable[[], AsyncContextManager]]
 
-        if not sentences:
-            return [text]
 
-        chunks = []
-        current_chunk = []
-
-        for sentence in sentences:
-            current_chunk.append(sentence)
-            if len(current_chunk) >= max_sentences_per_chunk:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
+class TextToSpeech:
 
-        return chunks
+    def __init__(self, config, logger, cache: AudioCache = None, language: LanguageDetector = None,
+                 client: EdgeTTSClient = None):
+        self.config = config
+        self.logger = logger
+        self.client = client or EdgeTTSClient(logger, EdgeConnectionPool(
+            logger,
+            max_idle=config.edge_pool_size,
+            min_idle=config.edge_prewarm,
+            idle_timeout=config.edge_idle_timeout
+        ))
+        self.language = language or language_detector
+        self.last_audio_data = RecentAudioStore(
+            max_bytes=int(config.audio_retention_mb * 2**20),
+            ttl=config.audio_retention_ttl
+        )
+        self.cache = cache or AudioCache(
+            logger,
+            max_memory_bytes=int(config.tts_cache_memory_mb * 2**20),
+            max_disk_bytes=int(config.tts_cache_disk_mb * 2**20),
+            disk_dir=config.tts_cache_dir
+        )
+        self.word_boundaries: "OrderedDict[str, List[Dict]]" = OrderedDict()
+
+    def prewarm(self):
+        """Open warm edge-tts connections for the assistant voice; call from the event loop."""
+        self.client.pool.prewarm(self.config.assistant_voice, AUDIO_FORMATS[DEFAULT_AUDIO_FORMAT]["output_format"])
+
+    async def close(self):
+        await self.client.pool.close()
+
+    def estimate_duration(self, audio: bytes, audio_format: str = DEFAULT_AUDIO_FORMAT) -> float:
+        """Playback length in seconds of audio produced by edge-tts (constant bitrate)."""
+        return len(audio) * 8 / AUDIO_FORMATS[audio_format]["bitrate"]
+
+    def _cache_key(self, clean_text: str, voice: str, audio_format: str) -> str:
+        return self.cache.key(clean_text, voice, AUDIO_FORMATS[audio_format]["output_format"])
+
+    def _remember_boundaries(self, key: str, boundaries: List[Dict]):
+        self.word_boundaries[key] = boundaries
+        self.word_boundaries.move_to_end(key)
+        while len(self.word_boundaries) > MAX_WORD_BOUNDARY_ENTRIES:
+            self.word_boundaries.popitem(last=False)
+
+    def word_boundaries_for(self, text: str, audio_format: str = DEFAULT_AUDIO_FORMAT) -> Optional[List[Dict]]:
+        """WordBoundary events from the last time ``text`` was synthesized in the assistant voice.
+
+        None when they are no longer known, e.g. for audio served from the disk cache
+        after a restart.
+        """
+        key = self._cache_key(self._clean_text(text), self.config.assistant_voice, audio_format)
+        boundaries = self.word_boundaries.get(key)
+        if boundaries is not None:
+            self.word_boundaries.move_to_end(key)
+        return boundaries
+
+    def split_into_sentence_chunks(self, text, first_chunk_words=None, max_chunk_words=None):
+        """Chunks for info-mode TTS: a short first one for fast playback, then growing ones."""
+        text = re.sub(r"\((.*?)\)", r"\1", extract_speech_text(text)).strip()
+        return adaptive_chunks(
+            text,
+            first_words=first_chunk_words or self.config.tts_first_chunk_words,
+            max_words=max_chunk_words or self.config.tts_max_chunk_words
+        )
     
 
     def _clean_text(self, text: str) -> str:
+        text = extract_speech_text(text)
         text = re.sub(r"\((.*?)\)", "", text)
         text = re.sub(r"[*#@%^&_=+\[\]{}<>|~`]", "", text)
         text = re.sub(r"\s{2,}", " ", text)
@@ -61,78 +103,114 @@ class TextToSpeech:
     
 
 
-    def _detect_language(self, text: str) -> str:
+    def _detect_language(self, text: str, user_id: str = None) -> str:
+        return self.language.detect(text, user_id)
+
+    async def _synthesize(self, clean_text: str, voice: str, audio_format: str = DEFAULT_AUDIO_FORMAT,
+                          slot: Slot = None) -> bytes:
+        """Collect the edge-tts audio stream in memory; nothing is written to disk."""
+        audio = bytearray()
+        boundaries = []
+        async with slot() if slot else nullcontext():
+            async for chunk in self.client.stream(clean_text, voice, audio_format):
+                if chunk["type"] == "audio":
+                    audio += chunk["data"]
+                elif chunk["type"] == "WordBoundary":
+                    boundaries.append(chunk)
+
+        if not audio:
+            self.logger.warning(f"Generated TTS audio is empty for '{clean_text[:50]}'")
+        else:
+            self._remember_boundaries(self._cache_key(clean_text, voice, audio_format), boundaries)
+        return bytes(audio)
+
+    async def stream_tts(self, text: str, user_id: str, mode: str = "friend",
+                         audio_format: str = DEFAULT_AUDIO_FORMAT, slot: Slot = None) -> AsyncIterator[bytes]:
+        """Yield audio as edge-tts produces it, so playback can start before synthesis ends.
+
+        A synthesis error is logged and re-raised, so callers can tell a cut-off
+        stream from a complete one; partial audio is never cached.
+        """
         try:
-            return detect(text)
+            if mode == "info":
+                return
+
+            clean_text = self._clean_text(text)
+            if not clean_text:
+                return
+
+            voice = self.config.assistant_voice
+            key = self._cache_key(clean_text, voice, audio_format)
+            cached = await self.cache.get(key) if self.cache.enabled else None
+            if cached:
+                self.last_audio_data[user_id] = cached
+                yield cached
+                return
+
+            audio = bytearray()
+            boundaries = []
+            async with slot() if slot else nullcontext():
+                async for chunk in self.client.stream(clean_text, voice, audio_format):
+                    if chunk["type"] == "audio":
+                        audio += chunk["data"]
+                        yield chunk["data"]
+                    elif chunk["type"] == "WordBoundary":
+                        boundaries.append(chunk)
+
+            if audio:
+                audio = bytes(audio)
+                self._remember_boundaries(key, boundaries)
+                await self.cache.put(key, audio)
+                self.last_audio_data[user_id] = audio
+
         except Exception as e:
-            self.logger.warning(f"Language detection failed: {e}")
-            return "en"
+            self.logger.error(f"TTS stream error for text '{text[:50]}...': {e}")
+            raise
 
-    async def generate_tts_chunk(self, text: str, chunk_id: int) -> str:
+    async def generate_tts_chunk(self, text: str, chunk_id: int, user_id: str = None,
+                                 audio_format: str = DEFAULT_AUDIO_FORMAT, slot: Slot = None) -> bytes:
         try:
             clean_text = self._clean_text(text)
 
             if not clean_text:
-                return ''
+                return b''
             
             voice = self.config.assistant_voice
             if self.config.mode == "info":
-                lang = self._detect_language(clean_text)
+                lang = self._detect_language(clean_text, user_id)
                 voice = self.config.voice_map.get(lang, self.config.assistant_voice)
 
-            output_file = f"Data/speech_chunk_{chunk_id}_{uuid.uuid4()}.mp3"
-            communicate = edge_tts.Communicate(clean_text, voice=voice)
-            await communicate.save(output_file)
-
-            if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
-                self.logger.warning(f"Generated TTS file is empty or missing: {output_file}")
-                return ''
-
-            with open(output_file, "rb") as f:
-                audio_data = base64.b64encode(f.read()).decode("utf-8")
-
-            try:
-                os.remove(output_file)
-                self.logger.info(f"Deleted temporary TTS file: {output_file}")
-            except Exception as e:
-                self.logger.error(f"Failed to delete temporary TTS file {output_file}: {e}")
-
-            return audio_data
+            return await self.cache.get_or_create(
+                self._cache_key(clean_text, voice, audio_format),
+                lambda: self._synthesize(clean_text, voice, audio_format, slot)
+            )
 
         except Exception as e:
             self.logger.error(f"TTS chunk error for text '{text[:50]}...': {e}")
-            return ''
+            return b''
 
-    async def generate_tts(self, text: str, user_id: str, mode: str = "friend") -> str:
+    async def generate_tts(self, text: str, user_id: str, mode: str = "friend",
+                           audio_format: str = DEFAULT_AUDIO_FORMAT, slot: Slot = None) -> bytes:
         try:
             if mode == "info":
-                return ""
+                return b""
 
             clean_text = self._clean_text(text)
 
             if not clean_text:
-                return ''
-
-            output_file = f"Data/speech_{uuid.uuid4()}.mp3"
-            communicate = edge_tts.Communicate(clean_text, voice=self.config.assistant_voice)
-            await communicate.save(output_file)
+                return b''
 
-            if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
-                self.logger.warning(f"Generated TTS file is empty or missing: {output_file}")
-                return ''
-
-            with open(output_file, "rb") as f:
-                audio_data = base64.b64encode(f.read()).decode("utf-8")
-
-            try:
-                os.remove(output_file)
-                self.logger.info(f"Deleted temporary TTS file: {output_file}")
-            except Exception as e:
-                self.logger.error(f"Failed to delete temporary TTS file {output_file}: {e}")
+            voice = self.config.assistant_voice
+            audio_data = await self.cache.get_or_create(
+                self._cache_key(clean_text, voice, audio_format),
+                lambda: self._synthesize(clean_text, voice, audio_format, slot)
+            )
+            if not audio_data:
+                return b''
 
             self.last_audio_data[user_id] = audio_data
             return audio_data
 
         except Exception as e:
             self.logger.error(f"TTS error for text '{text[:50]}...': {e}")
-            return ''
\ No newline at end of file
+            return b''
\ No newline at end of file
@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Set
+
+from .metrics import metrics
+
+INTERRUPT = 0
+FIRST_CHUNK = 1
+LATER_CHUNK = 2
+PRIORITY_NAMES = {INTERRUPT: "interrupt", FIRST_CHUNK: "first_chunk", LATER_CHUNK: "later_chunk"}
+
+queue_depth = metrics.gauge(
+    "inai_tts_queue_depth", "TTS jobs waiting for a slot", ("priority",))
+running_jobs = metrics.gauge(
+    "inai_tts_running", "TTS jobs holding a slot", ("backend",))
+queue_wait = metrics.histogram(
+    "inai_tts_queue_wait_seconds", "Time TTS jobs waited for a slot", ("priority",))
+cancelled_jobs = metrics.counter(
+    "inai_tts_cancelled_total", "TTS jobs cancelled by user", ("state",))
+
+
+class _Job:
+    __slots__ = ("user_id", "priority", "backend", "task", "granted", "queued_at", "started")
+
+    def __init__(self, user_id, priority, backend, task, granted):
+        self.user_id = user_id
+        self.priority = priority
+        self.backend = backend
+        self.task = task
+        self.granted = granted
+        self.queued_at = time.monotonic()
+        self.started = False
+
+
+class TTSScheduler:
+    """Hands out a bounded number of TTS slots, most urgent jobs first.
+
+    Jobs wait in one FIFO per priority class (interrupt/confirmation replies, then
+    the first chunk of an answer, then later chunks) and start only while both the
+    global cap and their backend's cap have room. ``cancel_user`` cancels every
+    queued or running job of a user.
+    """
+
+    def __init__(self, logger, max_concurrency: int = 16, backend_limits: Optional[Dict[str, int]] = None):
+        self.logger = logger
+        self.max_concurrency = max_concurrency
+        self.backend_limits = backend_limits or {}
+        self.queues: Dict[int, Deque[_Job]] = {priority: deque() for priority in PRIORITY_NAMES}
+        self.running = 0
+        self.backend_running: Dict[str, int] = {}
+        self.user_jobs: Dict[str, Set[_Job]] = {}
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: int = LATER_CHUNK, backend: str = "edge"):
+        """Wait for a TTS slot and hold it for the body of the ``async with``."""
+        job = _Job(user_id, priority, backend, asyncio.current_task(), asyncio.get_running_loop().create_future())
+        self.queues[priority].append(job)
+        self.user_jobs.setdefault(user_id, set()).add(job)
+        queue_depth.inc(PRIORITY_NAMES[priority])
+        self._dispatch()
+        try:
+            await job.granted
+        except asyncio.CancelledError:
+            if job.started:
+                self._release(job)
+            else:
+                self._dequeue(job)
+            self._forget(job)
+            raise
+        queue_wait.observe(time.monotonic() - job.queued_at, PRIORITY_NAMES[priority])
+        try:
+            yield
+        finally:
+            self._release(job)
+            self._forget(job)
+
+    def cancel_user(self, user_id: str) -> int:
+        """Cancel the user's queued and running TTS jobs; returns how many were cancelled."""
+        jobs = list(self.user_jobs.get(user_id, ()))
+        for job in jobs:
+            cancelled_jobs.inc("running" if job.started else "queued")
+            if job.task is not None:
+                job.task.cancel()
+            elif not job.granted.done():
+                job.granted.cancel()
+        if jobs:
+            self.logger.info(f"🛑 Cancelled {len(jobs)} TTS jobs for {user_id}")
+        return len(jobs)
+
+    def depth(self) -> Dict[str, int]:
+        return {PRIORITY_NAMES[priority]: len(queue) for priority, queue in self.queues.items()}
+
+    def _has_room(self, backend: str) -> bool:
+        limit = self.backend_limits.get(backend)
+        return limit is None or self.backend_running.get(backend, 0) < limit
+
+    def _dispatch(self):
+        while self.running < self.max_concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            job.started = True
+            self.running += 1
+            self.backend_running[job.backend] = self.backend_running.get(job.backend, 0) + 1
+            running_jobs.inc(job.backend)
+            job.granted.set_result(True)
+
+    def _next_job(self) -> Optional[_Job]:
+        for priority, queue in self.queues.items():
+            for job in queue:
+                if job.granted.done():
+                    continue
+                if self._has_room(job.backend):
+                    queue.remove(job)
+                    queue_depth.dec(PRIORITY_NAMES[priority])
+                    return job
+        return None
+
+    def _dequeue(self, job: _Job):
+        try:
+            self.queues[job.priority].remove(job)
+            queue_depth.dec(PRIORITY_NAMES[job.priority])
+        except ValueError:
+            pass
+
+    def _release(self, job: _Job):
+        if not job.started:
+            return
+        job.started = False
+        self.running -= 1
+        self.backend_running[job.backend] -= 1
+        running_jobs.dec(job.backend)
+        self._dispatch()
+
+    def _forget(self, job: _Job):
+        jobs = self.user_jobs.get(job.user_id)
+        if jobs is not None:
+            jobs.discard(job)
+            if not jobs:
+                del self.user_jobs[job.user_id]
@@ -0,0 +1,121 @@
+"""Bytes per second of speech for each reply audio format in app.edge_client.AUDIO_FORMATS.
+
+Synthesizes the same sentences in every format through EdgeTTSClient and divides the
+audio size by the spoken length, taken from the end of the last WordBoundary event so
+it does not depend on the format's own framing. Run from the repo root:
+
+    python -m benchmarks.bench_audio_formats            # real edge-tts service
+    python -m benchmarks.bench_audio_formats --local    # local stand-in, no network
+
+Against the stand-in the figures are just each format's nominal bitrate; they are
+useful as a smoke test, not as a measurement.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import edge_tts.communicate
+
+from app.edge_client import AUDIO_FORMATS, TICKS_PER_SECOND, EdgeTTSClient
+from benchmarks.fake_backends import BackendThread, FakeEdgeTTS
+
+SENTENCES = [
+    "Hello! I'm here whenever you want to talk.",
+    "The ocean covers about seventy one percent of the Earth's surface, and most of it is still unexplored.",
+    "That sounds like a lot to carry. Do you want to tell me what happened today?",
+    "Sure, here are three quick tips: drink some water, stretch for a minute, and take a short walk.",
+]
+
+
+async def measure(client: EdgeTTSClient, audio_format: str, voice: str, sentences: List[str]) -> Dict:
+    audio_bytes = 0
+    speech_ticks = 0
+    first_audio = []
+    for sentence in sentences:
+        started = time.perf_counter()
+        end = 0
+        first = None
+        async for chunk in client.stream(sentence, voice, audio_format):
+            if chunk["type"] == "audio":
+                if first is None:
+                    first = time.perf_counter() - started
+                    first_audio.append(first)
+                audio_bytes += len(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                end = max(end, chunk["offset"] + chunk["duration"])
+        speech_ticks += end
+    seconds = speech_ticks / TICKS_PER_SECOND
+    return {
+        "bytes": audio_bytes,
+        "speech_s": round(seconds, 2),
+        "bytes_per_s": round(audio_bytes / seconds) if seconds else 0,
+        "nominal_bytes_per_s": AUDIO_FORMATS[audio_format]["bitrate"] // 8,
+        "first_audio_ms": round(sum(first_audio) / len(first_audio) * 1000, 1) if first_audio else 0.0,
+    }
+
+
+async def measure_all(formats: List[str], voice: str, sentences: List[str]) -> Dict[str, Dict]:
+    client = EdgeTTSClient(logging.getLogger("bench_audio_formats"))
+    try:
+        return {audio_format: await measure(client, audio_format, voice, sentences) for audio_format in formats}
+    finally:
+        await client.pool.close()
+
+
+def run(args) -> Dict:
+    sentences = SENTENCES * args.repeat
+    with ExitStack() as stack:
+        if args.local:
+            edge = FakeEdgeTTS(latency=0.05)
+            backends = stack.enter_context(BackendThread(edge=edge.app()))
+            stack.enter_context(patch.object(
+                edge_tts.communicate, "WSS_URL",
+                backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=bench"
+            ))
+        results = asyncio.run(measure_all(args.formats, args.voice, sentences))
+
+    baseline = results.get("mp3", {}).get("bytes_per_s")
+    for result in results.values():
+        result["vs_mp3"] = round(result["bytes_per_s"] / baseline, 2) if baseline else None
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "formats": results,
+    }
+
+
+def print_report(report: Dict):
+    source = "local stand-in" if report["config"]["local"] else "edge-tts"
+    print(f"\n🔊 {len(SENTENCES) * report['config']['repeat']} sentences via {source}, "
+          f"voice={report['config']['voice']}")
+    print(f"{'format':>10} {'bytes':>9} {'speech s':>9} {'B/s':>7} {'nominal':>8} {'vs mp3':>7} {'first ms':>9}")
+    for name, result in report["formats"].items():
+        print(f"{name:>10} {result['bytes']:>9} {result['speech_s']:>9} {result['bytes_per_s']:>7} "
+              f"{result['nominal_bytes_per_s']:>8} {result['vs_mp3'] or '-':>7} {result['first_audio_ms']:>9}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--formats", nargs="+", default=list(AUDIO_FORMATS), choices=list(AUDIO_FORMATS))
+    parser.add_argument("--voice", default="en-IN-NeerjaExpressiveNeural")
+    parser.add_argument("--repeat", type=int, default=1, help="times to go through the sample sentences")
+    parser.add_argument("--local", action="store_true", help="use the local edge-tts stand-in")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
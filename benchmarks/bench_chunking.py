@@ -0,0 +1,168 @@
+"""Time to first audio of info-mode chunking: fixed two-sentence chunks vs adaptive chunks.
+
+Voices sample replies (English, Hindi with danda, Gujarati) chunk by chunk the way
+SocketHandler.handle_streaming_tts_for_info does: up to ``--prefetch`` chunks ahead are
+synthesized concurrently and played in order. The legacy splitter is the old
+``split_into_sentence_chunks`` (two sentences per chunk, split on ``.!?`` only); the
+adaptive one is app.streaming.adaptive_chunks. The local edge-tts stand-in produces
+audio at ``--synthesis-speed`` times real time after ``--tts-latency``. Reported per
+reply: chunk count, words in the first chunk, time to first audio and playback stalls
+(time the listener waits between chunks). Run from the repo root:
+
+    python -m benchmarks.bench_chunking
+    python -m benchmarks.bench_chunking --synthesis-speed 8 --tts-latency 0.25
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import edge_tts.communicate
+
+from app.edge_client import EdgeConnectionPool, EdgeTTSClient
+from app.streaming import adaptive_chunks
+from benchmarks.fake_backends import BackendThread, FakeEdgeTTS, make_reply
+
+VOICE = "en-IN-NeerjaExpressiveNeural"
+BYTES_PER_SECOND = 6000
+
+REPLIES = {
+    "english": make_reply(120),
+    "hindi": (
+        "भारत एक विशाल देश है जिसकी संस्कृति हज़ारों साल पुरानी है। यहाँ सैकड़ों भाषाएँ और बोलियाँ बोली जाती हैं। "
+        "उत्तर में हिमालय की ऊँची चोटियाँ हैं और दक्षिण में समुद्र के सुंदर तट हैं। गंगा नदी को बहुत पवित्र माना जाता है "
+        "और लाखों लोग इसके किनारे रहते हैं। दिल्ली देश की राजधानी है जबकि मुंबई को आर्थिक राजधानी कहा जाता है। "
+        "भारतीय भोजन अपने मसालों और विविधता के लिए पूरी दुनिया में प्रसिद्ध है। त्योहारों के समय पूरा देश रंगों और "
+        "रोशनी से भर जाता है।"
+    ),
+    "gujarati": (
+        "ગુજરાત ભારતના પશ્ચિમ કિનારે આવેલું એક સુંદર રાજ્ય છે। અહીંના લોકો વેપાર અને આતિથ્ય માટે જાણીતા છે। "
+        "નવરાત્રિમાં આખું રાજ્ય ગરબાના તાલે ઝૂમી ઉઠે છે। ગીરનું જંગલ એશિયાઈ સિંહોનું એકમાત્ર ઘર છે। "
+        "અમદાવાદ રાજ્યનું સૌથી મોટું શહેર છે અને ગાંધીનગર તેની રાજધાની છે। ગુજરાતી ભોજનમાં મીઠાશ અને "
+        "મસાલાનું અનોખું સંતુલન જોવા મળે છે।"
+    ),
+}
+
+
+def legacy_chunks(text: str, max_sentences_per_chunk: int = 2) -> List[str]:
+    """The splitter info mode used before adaptive chunking."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text.strip()) if s.strip()]
+    return [" ".join(sentences[i:i + max_sentences_per_chunk])
+            for i in range(0, len(sentences), max_sentences_per_chunk)]
+
+
+async def synthesize(client: EdgeTTSClient, text: str) -> bytes:
+    audio = bytearray()
+    async for chunk in client.stream(text, VOICE):
+        if chunk["type"] == "audio":
+            audio += chunk["data"]
+    return bytes(audio)
+
+
+async def voice_reply(client: EdgeTTSClient, chunks: List[str], prefetch: int) -> Dict:
+    """Prefetch like handle_streaming_tts_for_info and simulate gapless playback."""
+    started = time.perf_counter()
+    pending = {}
+    playing_until = None
+    first_audio = 0.0
+    stalls = 0.0
+    for i in range(len(chunks)):
+        for j in range(i, min(i + prefetch + 1, len(chunks))):
+            if j not in pending:
+                pending[j] = asyncio.create_task(synthesize(client, chunks[j]))
+        audio = await pending.pop(i)
+        ready = time.perf_counter() - started
+        if playing_until is None:
+            first_audio = playing_until = ready
+        elif ready > playing_until:
+            stalls += ready - playing_until
+            playing_until = ready
+        playing_until += len(audio) / BYTES_PER_SECOND
+    return {
+        "chunks": len(chunks),
+        "first_chunk_words": len(chunks[0].split()) if chunks else 0,
+        "ttfa_ms": round(first_audio * 1000, 1),
+        "stall_ms": round(stalls * 1000, 1),
+    }
+
+
+async def measure(args) -> Dict[str, Dict]:
+    logger = logging.getLogger("bench_chunking")
+    pool = EdgeConnectionPool(logger, max_idle=args.prefetch + 1)
+    client = EdgeTTSClient(logger, pool)
+    results = {}
+    try:
+        for name, text in REPLIES.items():
+            legacy = [await voice_reply(client, legacy_chunks(text), args.prefetch) for _ in range(args.repeat)]
+            adaptive = [await voice_reply(client, adaptive_chunks(text, args.first_chunk_words, args.max_chunk_words),
+                                          args.prefetch) for _ in range(args.repeat)]
+            results[name] = {"legacy": average(legacy), "adaptive": average(adaptive)}
+    finally:
+        await pool.close()
+    return results
+
+
+def average(runs: List[Dict]) -> Dict:
+    out = dict(runs[0])
+    for key in ("ttfa_ms", "stall_ms"):
+        out[key] = round(sum(run[key] for run in runs) / len(runs), 1)
+    return out
+
+
+def run(args) -> Dict:
+    edge = FakeEdgeTTS(latency=args.tts_latency, seconds_per_word=0.35, synthesis_speed=args.synthesis_speed)
+    with ExitStack() as stack:
+        backends = stack.enter_context(BackendThread(edge=edge.app()))
+        stack.enter_context(patch.object(
+            edge_tts.communicate, "WSS_URL",
+            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=bench"
+        ))
+        results = asyncio.run(measure(args))
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "replies": results,
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"\n✂️  tts latency {config['tts_latency'] * 1000:.0f} ms, synthesis {config['synthesis_speed']}x real time, "
+          f"prefetch {config['prefetch']}, first chunk {config['first_chunk_words']} words, "
+          f"max {config['max_chunk_words']} words")
+    print(f"{'reply':>10} {'splitter':>9} {'chunks':>7} {'1st words':>10} {'ttfa ms':>9} {'stall ms':>9}")
+    for name, result in report["replies"].items():
+        for splitter in ("legacy", "adaptive"):
+            row = result[splitter]
+            print(f"{name:>10} {splitter:>9} {row['chunks']:>7} {row['first_chunk_words']:>10} "
+                  f"{row['ttfa_ms']:>9} {row['stall_ms']:>9}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="stand-in time to first audio")
+    parser.add_argument("--synthesis-speed", type=float, default=10.0,
+                        help="seconds of speech the stand-in produces per second")
+    parser.add_argument("--prefetch", type=int, default=2, help="chunks synthesized ahead (TTS_PREFETCH_DEPTH)")
+    parser.add_argument("--first-chunk-words", type=int, default=8)
+    parser.add_argument("--max-chunk-words", type=int, default=48)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per reply and splitter")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Handshake savings of EdgeConnectionPool, against the local edge-tts stand-in.
+
+Synthesizes the same info-mode style chunks (16 words each) through EdgeTTSClient
+twice: once with a fresh websocket per chunk (``max_idle=0``, what edge_tts.Communicate
+does) and once with warm pooled connections. ``--handshake-latency`` makes every
+websocket upgrade on the stand-in that much slower, standing in for the TCP + TLS round
+trips to the real service. Run from the repo root:
+
+    python -m benchmarks.bench_edge_pool
+    python -m benchmarks.bench_edge_pool --chunks 200 --workers 8 --handshake-latency 0.15
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import edge_tts.communicate
+
+from app.edge_client import AUDIO_FORMATS, EdgeConnectionPool, EdgeTTSClient
+from benchmarks.fake_backends import BackendThread, FakeEdgeTTS, make_reply
+
+VOICE = "en-IN-NeerjaExpressiveNeural"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def synthesize_chunks(client: EdgeTTSClient, chunks: List[str], workers: int) -> Dict:
+    queue = asyncio.Queue()
+    for chunk in chunks:
+        queue.put_nowait(chunk)
+    first_audio: List[float] = []
+    chunk_times: List[float] = []
+
+    async def worker():
+        while not queue.empty():
+            text = queue.get_nowait()
+            started = time.perf_counter()
+            first = None
+            async for message in client.stream(text, VOICE):
+                if message["type"] == "audio" and first is None:
+                    first = time.perf_counter() - started
+            first_audio.append(first or 0.0)
+            chunk_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return {
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "first_audio_ms": {f"p{int(q * 100)}": round(percentile(first_audio, q) * 1000, 1) for q in (0.5, 0.95)},
+        "chunk_ms": round(sum(chunk_times) / len(chunk_times) * 1000, 1),
+    }
+
+
+async def measure(args, chunks: List[str], edge: FakeEdgeTTS, pooled: bool) -> Dict:
+    logger = logging.getLogger("bench_edge_pool")
+    pool = EdgeConnectionPool(logger, max_idle=args.workers if pooled else 0,
+                              min_idle=args.prewarm if pooled else 0)
+    client = EdgeTTSClient(logger, pool)
+    connections_before = edge.connections
+    try:
+        if pooled and args.prewarm:
+            pool.prewarm(VOICE, AUDIO_FORMATS["mp3"]["output_format"])
+            # Warm-up happens at startup, off the request path.
+            while len(next(iter(pool.idle.values()), ())) < pool.min_idle:
+                await asyncio.sleep(0.01)
+            connections_before = edge.connections
+        result = await synthesize_chunks(client, chunks, args.workers)
+    finally:
+        await pool.close()
+    result["connections"] = edge.connections - connections_before
+    return result
+
+
+def run(args) -> Dict:
+    chunks = [make_reply(args.words_per_chunk)] * args.chunks
+    edge = FakeEdgeTTS(latency=args.tts_latency, seconds_per_word=0.3, handshake_latency=args.handshake_latency)
+    with ExitStack() as stack:
+        backends = stack.enter_context(BackendThread(edge=edge.app()))
+        stack.enter_context(patch.object(
+            edge_tts.communicate, "WSS_URL",
+            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=bench"
+        ))
+        fresh = asyncio.run(measure(args, chunks, edge, pooled=False))
+        pooled = asyncio.run(measure(args, chunks, edge, pooled=True))
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "fresh": fresh,
+        "pooled": pooled,
+        "saved_ms_per_chunk": round(fresh["chunk_ms"] - pooled["chunk_ms"], 1),
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"\n🔌 {config['chunks']} chunks, {config['workers']} workers, "
+          f"handshake {config['handshake_latency'] * 1000:.0f} ms, tts latency {config['tts_latency'] * 1000:.0f} ms")
+    print(f"{'':>8} {'connections':>12} {'elapsed s':>10} {'chunk ms':>9} {'first p50':>10} {'first p95':>10}")
+    for name in ("fresh", "pooled"):
+        result = report[name]
+        print(f"{name:>8} {result['connections']:>12} {result['elapsed_s']:>10} {result['chunk_ms']:>9} "
+              f"{result['first_audio_ms']['p50']:>10} {result['first_audio_ms']['p95']:>10}")
+    print(f"⏱️  saved {report['saved_ms_per_chunk']} ms per chunk")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--chunks", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=4, help="chunks synthesized concurrently")
+    parser.add_argument("--words-per-chunk", type=int, default=16)
+    parser.add_argument("--handshake-latency", type=float, default=0.1,
+                        help="delay added to every websocket upgrade on the stand-in")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="stand-in time to first audio")
+    parser.add_argument("--prewarm", type=int, default=1, help="connections opened before the run")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Disconnect lookup cost vs. number of connected users.
+
+Compares the old linear scan over ``user_sessions`` with the ``sid_index``
+lookup in UserSessionManager. Run from the repo root:
+
+    python -m benchmarks.bench_session_disconnect
+"""
+import time
+from unittest.mock import MagicMock
+
+from app.session import UserSessionManager
+
+
+def linear_scan(manager, sid):
+    for user_id, session in manager.user_sessions.items():
+        if session['sid'] == sid:
+            return user_id
+    return None
+
+
+def time_lookup(lookup, manager, sids, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for sid in sids:
+            lookup(sid)
+        best = min(best, time.perf_counter() - start)
+    return best / len(sids)
+
+
+def main():
+    print(f"{'sessions':>9} {'scan (us)':>11} {'index (us)':>11}")
+    for count in (10, 100, 1_000, 10_000):
+        manager = UserSessionManager(MagicMock())
+        for i in range(count):
+            manager.create_user_session(f"user{i}", f"sid{i}")
+        # Worst case for the scan: the sids of the most recently connected users.
+        sids = [f"sid{i}" for i in range(max(0, count - 200), count)]
+        scan = time_lookup(lambda sid: linear_scan(manager, sid), manager, sids)
+        index = time_lookup(manager.get_user_by_sid, manager, sids)
+        print(f"{count:>9} {scan * 1e6:>11.2f} {index * 1e6:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
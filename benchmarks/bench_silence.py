@@ -0,0 +1,123 @@
+"""Loop vs vectorized app.lip_sync.detect_silence across reply lengths.
+
+``detect_silence_loop`` is the per-window Python loop detect_silence used before it
+was vectorized; it is kept here as the reference. Both run on the same synthetic
+speech-like audio (bursts of tone and noise separated by pauses over a faint noise
+floor) for every ``--seconds`` length, and the report has the best time of
+``--repeat`` runs for each, the speedup and whether the silent periods are identical.
+Run from the repo root:
+
+    python -m benchmarks.bench_silence
+    python -m benchmarks.bench_silence --seconds 1 5 20 60 --sample-rate 16000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.lip_sync import analyze_audio_segment, detect_silence
+
+
+def detect_silence_loop(audio: AudioSegment, threshold_db: float = -40.0,
+                        min_silence_duration: float = 0.1) -> List[Tuple[float, float]]:
+    samples, sr = analyze_audio_segment(audio)
+    if len(samples) == 0:
+        return []
+    samples = samples.astype(np.float32) / 32768.0
+    window_size = int(0.02 * sr)
+    hop_size = window_size // 2
+    rms = []
+    for i in range(0, len(samples), hop_size):
+        window = samples[i:i + window_size]
+        if len(window) == 0:
+            continue
+        rms_val = np.sqrt(np.mean(window ** 2))
+        rms.append(20 * np.log10(max(rms_val, 1e-10)))
+    silent_windows = [i for i, val in enumerate(rms) if val < threshold_db]
+    silent_periods = []
+    for window_idx in silent_windows:
+        start_time = window_idx * hop_size / sr
+        end_time = (window_idx * hop_size + window_size) / sr
+        if silent_periods and start_time <= silent_periods[-1][1]:
+            silent_periods[-1] = (silent_periods[-1][0], end_time)
+        else:
+            silent_periods.append((start_time, end_time))
+    return [(s, e) for s, e in silent_periods if (e - s) >= min_silence_duration]
+
+
+def speech_like(seconds: float, sample_rate: int = 24000, seed: int = 0) -> AudioSegment:
+    """Mono 16-bit audio alternating 0.1-0.6 s voiced bursts with 0.05-0.4 s pauses."""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    samples = rng.normal(0, 20, total)
+    position = 0
+    while position < total:
+        length = int(rng.uniform(0.1, 0.6) * sample_rate)
+        t = np.arange(min(length, total - position)) / sample_rate
+        burst = np.sin(2 * np.pi * rng.uniform(100, 300) * t) * rng.uniform(2000, 12000)
+        samples[position:position + len(t)] += burst + rng.normal(0, 800, len(t))
+        position += length + int(rng.uniform(0.05, 0.4) * sample_rate)
+    data = np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+    return AudioSegment(data=data, sample_width=2, frame_rate=sample_rate, channels=1)
+
+
+def best_time(func: Callable, audio: AudioSegment, repeat: int) -> Tuple[float, List]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(audio)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(args) -> Dict:
+    lengths = {}
+    for seconds in args.seconds:
+        audio = speech_like(seconds, args.sample_rate)
+        loop_s, expected = best_time(detect_silence_loop, audio, args.repeat)
+        vectorized_s, periods = best_time(detect_silence, audio, args.repeat)
+        lengths[str(seconds)] = {
+            "periods": len(periods),
+            "loop_ms": round(loop_s * 1000, 2),
+            "vectorized_ms": round(vectorized_s * 1000, 2),
+            "speedup": round(loop_s / vectorized_s, 1) if vectorized_s else None,
+            "identical": periods == expected,
+        }
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "lengths": lengths,
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"\n🔇 detect_silence at {config['sample_rate']} Hz, best of {config['repeat']}")
+    print(f"{'audio s':>8} {'periods':>8} {'loop ms':>9} {'vector ms':>10} {'speedup':>8} {'identical':>10}")
+    for seconds, row in report["lengths"].items():
+        print(f"{seconds:>8} {row['periods']:>8} {row['loop_ms']:>9} {row['vectorized_ms']:>10} "
+              f"{row['speedup']:>8} {str(row['identical']):>10}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 20, 60], help="audio lengths to time")
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per length; the best is reported")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""Socket.IO load test for SocketHandler against local Groq/edge-tts stand-ins.
+
+Starts the real SocketHandler, session manager, admission controller, ChatManager and
+TextToSpeech behind uvicorn, with Groq, edge-tts, speech recognition and chat history
+replaced by the fakes in ``benchmarks.fake_backends``. N simulated clients then go
+through ``register_user`` -> ``user_message``/``user_audio`` for a number of turns.
+
+Reports throughput, time to first audio and turn-time percentiles, per-stage latency
+(from app.metrics), server event-loop lag and memory growth. Run from the repo root:
+
+    python -m benchmarks.bench_socketio_load --clients 50 --turns 3
+    python -m benchmarks.bench_socketio_load --mode info --stream --json result.json
+
+Memory figures cover the whole benchmark process (server, stand-ins and clients).
+Lip sync from audio needs ffmpeg; without it (or with --no-lipsync) it is replaced by
+an empty cue list, computed in-process, so friend-mode turns still complete. Likewise token counting falls back to a
+word count when tiktoken cannot load its encoding (it downloads it on first use).
+"""
+import argparse
+import asyncio
+import base64
+import concurrent.futures
+import gc
+import glob
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import socket
+import threading
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+import edge_tts.communicate
+import socketio
+import tiktoken
+import uvicorn
+from openai import AsyncOpenAI, OpenAI
+
+import app.lipsync_pool
+import app.socket
+from app.admission import AdmissionController
+from app.audio_cache import AudioCache
+from app.chat import ChatManager
+from app.config import Config
+from app.edge_client import AUDIO_FORMATS
+from app.lipsync_pool import LipSyncPool
+from app.metrics import stage_latency
+from app.modes import ChatModes
+from app.session import UserSessionManager
+from app.socket import SocketHandler
+from app.tts import TextToSpeech
+from app.tts_scheduler import TTSScheduler
+from benchmarks.fake_backends import (
+    BackendThread, FakeEdgeTTS, FakeGroq, FakeHistory, FakeSpeechRecognition
+)
+
+QUERY = "Tell me something interesting about the ocean."
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def rss_mb() -> float:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def empty_cues(*args):
+    return []
+
+
+def count_words(text: str, model: str = "gpt-4") -> int:
+    return len(text.split())
+
+
+def tiktoken_available() -> bool:
+    try:
+        tiktoken.get_encoding("cl100k_base")
+        return True
+    except Exception:
+        return False
+
+
+def build_server(args, urls: Dict[str, str]) -> Tuple[socketio.ASGIApp, SocketHandler]:
+    logger = logging.getLogger("INAI.bench")
+    logger.setLevel(logging.WARNING)
+    config = Config()
+    config.lipsync_mode = args.lipsync_mode
+    modes = ChatModes()
+    if args.input == "audio":
+        # user_audio has no per-message stream flag; those turns follow STREAM_RESPONSES.
+        args.stream = config.stream_responses
+
+    chat_manager = ChatManager(config, modes, logger)
+    chat_manager.client = OpenAI(base_url=f"{urls['groq']}/openai/v1", api_key="bench")
+    chat_manager.async_client = AsyncOpenAI(base_url=f"{urls['groq']}/openai/v1", api_key="bench")
+
+    sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*")
+    handler = SocketHandler(
+        sio=sio,
+        session_manager=UserSessionManager(
+            logger,
+            max_queue_depth=config.user_queue_max_depth,
+            min_work_interval=config.user_min_work_interval
+        ),
+        config=config,
+        # Every fake reply is identical, so the TTS cache stays off unless asked for.
+        tts=TextToSpeech(config, logger, cache=None if args.tts_cache else AudioCache(
+            logger, max_memory_bytes=0, max_disk_bytes=0)),
+        chat_manager=chat_manager,
+        speech_recognition=FakeSpeechRecognition(args.stt_latency, QUERY),
+        history=FakeHistory(args.history_latency),
+        modes=modes,
+        logger=logger,
+        admission=AdmissionController(
+            logger,
+            max_sessions=config.max_sessions,
+            max_inflight_llm=config.max_inflight_llm,
+            max_inflight_tts=config.max_inflight_tts,
+            max_loop_lag=config.max_loop_lag,
+            max_queue=config.admission_queue_size
+        ),
+        tts_scheduler=TTSScheduler(
+            logger,
+            max_concurrency=config.tts_max_concurrency,
+            backend_limits={"edge": config.tts_edge_concurrency}
+        ),
+        lipsync_pool=LipSyncPool(logger, workers=args.lipsync_workers, max_queue=config.lipsync_queue_size)
+    )
+    handler.setup_socket_events()
+    return socketio.ASGIApp(sio, socketio_path="/socket.io"), handler
+
+
+class ServerThread:
+    """uvicorn on its own thread and event loop, sampling that loop's lag."""
+
+    def __init__(self, asgi_app, port: int, lag_interval: float = 0.05, on_shutdown=None):
+        self.on_shutdown = on_shutdown
+        self.server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="error"))
+        self.url = f"http://127.0.0.1:{port}"
+        self.lag_interval = lag_interval
+        self.lag_samples: List[float] = []
+        self._thread = threading.Thread(target=self._run, name="bench-server", daemon=True)
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self._serve())
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+    async def _serve(self):
+        sampler = asyncio.create_task(self._sample_lag())
+        try:
+            await self.server.serve()
+        finally:
+            sampler.cancel()
+            if self.on_shutdown is not None:
+                await self.on_shutdown()
+
+    async def _sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(max(0.0, loop.time() - start - self.lag_interval))
+
+    def start(self):
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+
+class Results:
+    def __init__(self):
+        self.ttfa: List[float] = []
+        self.turn_times: List[float] = []
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.connect_failures = 0
+
+
+async def run_client(index: int, url: str, args, results: Results):
+    user_id = f"bench_user_{index}"
+    expects_stream_end = args.stream or args.mode == "info"
+    client = socketio.AsyncClient(reconnection=False)
+    turn = {"started": None, "first_audio": None, "done": None}
+
+    @client.on("*")
+    async def on_event(event, data):
+        if turn["started"] is None or turn["done"].is_set() or not isinstance(data, dict):
+            return
+        if data.get("audio") and turn["first_audio"] is None:
+            turn["first_audio"] = time.perf_counter()
+        if event == "response":
+            if str(data.get("text", "")).startswith(("⚠", "🚫")):
+                turn["error"] = True
+                turn["done"].set()
+            elif not expects_stream_end and not data.get("audio_stream"):
+                turn["done"].set()
+        elif event == "audio_end":
+            turn["done"].set()
+        elif event == "streaming_status" and data.get("can_stop") is False:
+            turn["done"].set()
+
+    await asyncio.sleep(index * args.ramp / max(1, args.clients))
+    try:
+        await client.connect(url, transports=["websocket"], socketio_path="/socket.io")
+    except Exception:
+        results.connect_failures += 1
+        return
+
+    try:
+        ack = await client.call("register_user", {
+            "user_id": user_id,
+            "binary_audio": args.binary_audio,
+            "progressive_audio": args.progressive_audio,
+            "audio_format": args.audio_format,
+            "inline_visemes": args.inline_visemes
+        }, timeout=args.admission_timeout)
+        if ack is None:
+            results.rejected += 1
+            return
+
+        audio = os.urandom(args.audio_bytes)
+        for _ in range(args.turns):
+            turn.update(started=time.perf_counter(), first_audio=None, done=asyncio.Event(), error=False)
+            payload = {"user_id": user_id, "mode": args.mode}
+            if args.input == "audio":
+                payload["audio"] = audio if args.binary_audio else base64.b64encode(audio).decode()
+                await client.emit("user_audio", payload)
+            else:
+                payload.update(text=QUERY, stream=args.stream)
+                await client.emit("user_message", payload)
+            try:
+                await asyncio.wait_for(turn["done"].wait(), args.turn_timeout)
+            except asyncio.TimeoutError:
+                results.timeouts += 1
+                continue
+            if turn["error"]:
+                results.errors += 1
+                continue
+            results.completed += 1
+            results.turn_times.append(time.perf_counter() - turn["started"])
+            if turn["first_audio"] is not None:
+                results.ttfa.append(turn["first_audio"] - turn["started"])
+            await asyncio.sleep(args.think_time * random.uniform(0.5, 1.5))
+    except socketio.exceptions.TimeoutError:
+        results.rejected += 1
+    finally:
+        await client.disconnect()
+
+
+def stage_summary() -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for (stage, mode), series in stage_latency.series.items():
+        quantiles = stage_latency.quantiles(stage, mode)
+        summary[f"{stage}/{mode}"] = {
+            "count": series[2],
+            "p50_ms": round(quantiles[0.5] * 1000, 1),
+            "p95_ms": round(quantiles[0.95] * 1000, 1),
+        }
+    return summary
+
+
+async def drive(args, url: str) -> Results:
+    results = Results()
+    await asyncio.gather(*(run_client(i, url, args, results) for i in range(args.clients)))
+    return results
+
+
+def run(args) -> Dict:
+    lipsync_stub = args.no_lipsync or (args.lipsync_mode == "audio" and shutil.which("ffmpeg") is None)
+    token_stub = not tiktoken_available()
+    groq = FakeGroq(args.llm_latency, args.token_interval, args.reply_words)
+    edge = FakeEdgeTTS(args.tts_latency, args.seconds_per_word, handshake_latency=args.handshake_latency)
+    with ExitStack() as stack:
+        if lipsync_stub:
+            # Worker processes would not see the patch, so stubbed jobs run in-process.
+            args.lipsync_workers = 0
+            stack.enter_context(patch.dict(app.lipsync_pool.METHODS, audio=empty_cues, boundaries=empty_cues))
+        if token_stub:
+            stack.enter_context(patch.object(app.socket, "count_tokens", count_words))
+        backends = stack.enter_context(BackendThread(groq=groq.app(), edge=edge.app()))
+        stack.enter_context(patch.object(
+            edge_tts.communicate, "WSS_URL",
+            f"{backends.urls['edge'].replace('http', 'ws', 1)}/edge?TrustedClientToken=bench"
+        ))
+        asgi_app, handler = build_server(args, backends.urls)
+        server = ServerThread(asgi_app, free_port(), on_shutdown=handler.tts.close)
+        server.start()
+        try:
+            concurrent.futures.wait(handler.lipsync.prewarm())
+            gc.collect()
+            rss_before = rss_mb()
+            started = time.perf_counter()
+            results = asyncio.run(drive(args, server.url))
+            elapsed = time.perf_counter() - started
+            gc.collect()
+            rss_after = rss_mb()
+        finally:
+            server.stop()
+            handler.lipsync.close()
+            for path in glob.glob(os.path.join("Data", "bench_user_*")):
+                os.remove(path)
+
+    lag = server.lag_samples
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "lipsync": "stub" if lipsync_stub else "ffmpeg" if args.lipsync_mode == "audio" else args.lipsync_mode,
+        "token_count": "words" if token_stub else "tiktoken",
+        "elapsed_s": round(elapsed, 2),
+        "turns_completed": results.completed,
+        "throughput_turns_per_s": round(results.completed / elapsed, 2) if elapsed else 0.0,
+        "errors": results.errors,
+        "timeouts": results.timeouts,
+        "rejected": results.rejected,
+        "connect_failures": results.connect_failures,
+        "ttfa_ms": {f"p{int(q * 100)}": round(percentile(results.ttfa, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+        "turn_ms": {f"p{int(q * 100)}": round(percentile(results.turn_times, q) * 1000, 1) for q in (0.5, 0.95, 0.99)},
+        "loop_lag_ms": {
+            "p50": round(percentile(lag, 0.5) * 1000, 1),
+            "p99": round(percentile(lag, 0.99) * 1000, 1),
+            "max": round(max(lag, default=0.0) * 1000, 1),
+        },
+        "memory_mb": {
+            "before": round(rss_before, 1),
+            "after": round(rss_after, 1),
+            "growth": round(rss_after - rss_before, 1),
+            "peak": round(peak_rss_mb(), 1),
+        },
+        "stages": stage_summary(),
+        "backend_requests": {"groq": groq.requests, "edge_tts": edge.requests},
+        "edge_connections": edge.connections,
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n⚙️  {report['config']['clients']} clients x {report['config']['turns']} turns, "
+          f"mode={report['config']['mode']} input={report['config']['input']} "
+          f"stream={report['config']['stream']} lipsync={report['lipsync']} tokens={report['token_count']}")
+    print(f"✅ {report['turns_completed']} turns in {report['elapsed_s']}s "
+          f"({report['throughput_turns_per_s']} turns/s), errors={report['errors']} "
+          f"timeouts={report['timeouts']} rejected={report['rejected']} connect_failures={report['connect_failures']}")
+    print(f"{'':>20} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print(f"{'first audio (ms)':>20} {report['ttfa_ms']['p50']:>9} {report['ttfa_ms']['p95']:>9} {report['ttfa_ms']['p99']:>9}")
+    print(f"{'turn (ms)':>20} {report['turn_ms']['p50']:>9} {report['turn_ms']['p95']:>9} {report['turn_ms']['p99']:>9}")
+    lag = report["loop_lag_ms"]
+    print(f"{'loop lag (ms)':>20} {lag['p50']:>9} {'':>9} {lag['p99']:>9}  max {lag['max']}")
+    memory = report["memory_mb"]
+    print(f"🧠 RSS {memory['before']} -> {memory['after']} MB (growth {memory['growth']} MB, peak {memory['peak']} MB)")
+    print(f"🔌 edge-tts: {report['backend_requests']['edge_tts']} turns over {report['edge_connections']} connections")
+    print(f"\n{'stage':>24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, stage in sorted(report["stages"].items()):
+        print(f"{name:>24} {stage['count']:>7} {stage['p50_ms']:>9} {stage['p95_ms']:>9}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3, help="turns per client")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which clients connect")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between a client's turns")
+    parser.add_argument("--mode", default="friend", choices=["friend", "info", "elder", "love"])
+    parser.add_argument("--input", default="text", choices=["text", "audio"])
+    parser.add_argument("--stream", action="store_true", help="ask for streamed replies (text input only)")
+    parser.add_argument("--binary-audio", action="store_true", help="negotiate raw audio frames")
+    parser.add_argument("--progressive-audio", action="store_true", help="negotiate audio_frame streaming")
+    parser.add_argument("--inline-visemes", action="store_true", help="negotiate mouth cues inline in the reply")
+    parser.add_argument("--audio-format", default="mp3", choices=sorted(AUDIO_FORMATS),
+                        help="reply audio format to negotiate")
+    parser.add_argument("--no-lipsync", action="store_true")
+    parser.add_argument("--lipsync-workers", type=int, default=2, help="LIPSYNC_WORKERS: lip-sync processes")
+    parser.add_argument("--lipsync-mode", choices=["audio", "boundaries"], default="audio",
+                        help="LIPSYNC_MODE: decode reply audio or use edge-tts word timings")
+    parser.add_argument("--tts-cache", action="store_true", help="use the configured TTS audio cache")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Groq time to first token")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="Groq gap between streamed words")
+    parser.add_argument("--reply-words", type=int, default=40, help="Groq reply size")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="edge-tts time to first audio")
+    parser.add_argument("--handshake-latency", type=float, default=0.0,
+                        help="edge-tts websocket handshake delay (TCP + TLS round trips)")
+    parser.add_argument("--seconds-per-word", type=float, default=0.35, help="edge-tts audio per word")
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--history-latency", type=float, default=0.005)
+    parser.add_argument("--audio-bytes", type=int, default=32_000, help="size of each user_audio upload")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--admission-timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""Local stand-ins for Groq and edge-tts, for load tests that must not hit the real services.
+
+Both run as aiohttp apps on 127.0.0.1 and speak just enough of the real protocol for
+the unmodified clients to work:
+
+* ``FakeGroq`` serves ``POST /openai/v1/chat/completions`` (plain JSON and SSE streaming),
+  so ``OpenAI``/``AsyncOpenAI`` only need a different ``base_url``.
+* ``FakeEdgeTTS`` serves the edge-tts websocket protocol (``speech.config`` + ``ssml`` in,
+  ``turn.start``, WordBoundary metadata, binary audio frames and ``turn.end`` out), so
+  ``edge_tts.Communicate`` and ``EdgeTTSClient`` only need ``edge_tts.communicate.WSS_URL``
+  pointed at it.
+
+Latency and payload size are configurable. ``BackendThread`` runs the servers on their
+own event loop, so a blocking client (``ChatManager.chat_with_groq`` uses the sync
+``OpenAI`` client) cannot stall them.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from typing import Optional
+
+from aiohttp import web, WSMsgType
+
+# One silent MPEG-2 layer III frame: 24 kHz, 48 kbit/s, mono -> 144 bytes, 24 ms of audio.
+# That is the default edge-tts format, so TextToSpeech.estimate_duration() holds.
+SILENT_MP3_FRAME = bytes.fromhex("fff364c0") + bytes(140)
+MP3_FRAME_SECONDS = 0.024
+# (frame, seconds per frame, content type) per outputFormat in speech.config. Every frame
+# matches the format's nominal bitrate; the Opus one is filler, not a decodable stream.
+FAKE_AUDIO = {
+    "audio-24khz-48kbitrate-mono-mp3": (SILENT_MP3_FRAME, MP3_FRAME_SECONDS, "audio/mpeg"),
+    "audio-16khz-32kbitrate-mono-mp3": (bytes.fromhex("fff348c0") + bytes(140), 0.036, "audio/mpeg"),
+    "webm-24khz-16bit-24kbps-mono-opus": (bytes(60), 0.020, "audio/webm; codec=opus"),
+}
+DEFAULT_OUTPUT_FORMAT = "audio-24khz-48kbitrate-mono-mp3"
+# Offsets and durations in edge-tts metadata are in 100 ns ticks.
+TICKS_PER_SECOND = 10_000_000
+
+WORDS = (
+    "sure thing I can help with that and here is a little more detail about it "
+    "so you can see how the whole answer comes together nicely"
+).split()
+
+
+def make_reply(words: int) -> str:
+    """A reply of ``words`` words split into sentences of about eight words."""
+    out = []
+    for i in range(words):
+        word = WORDS[i % len(WORDS)]
+        out.append(word.capitalize() if i % 8 == 0 else word)
+        if i % 8 == 7 or i == words - 1:
+            out[-1] += "."
+    return " ".join(out)
+
+
+class FakeGroq:
+    """OpenAI-compatible chat completions with a fixed-size reply.
+
+    ``latency`` is the time to the first token (or to the whole reply when not
+    streaming), ``token_interval`` the gap between streamed words.
+    """
+
+    def __init__(self, latency: float = 0.3, token_interval: float = 0.02, reply_words: int = 40):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.reply_words = reply_words
+        self.requests = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/openai/v1/chat/completions", self.completions)
+        return app
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        reply = make_reply(self.reply_words)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        await asyncio.sleep(self.latency)
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": self.reply_words, "total_tokens": self.reply_words}
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else " " + word},
+                    "finish_reason": None
+                }]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+class FakeEdgeTTS:
+    """edge-tts websocket endpoint returning silent audio in the requested output format.
+
+    Each turn waits ``latency`` seconds, then sends ``seconds_per_word`` of audio per
+    word of the SSML text in ``chunk_frames``-frame binary messages, with one
+    WordBoundary event per word. The format comes from the connection's last
+    ``speech.config`` and falls back to 24 kHz/48 kbit/s MP3. ``handshake_latency``
+    delays every websocket upgrade, standing in for the TCP + TLS round trips to the
+    real service; ``connections`` counts upgrades. ``synthesis_speed`` paces the audio
+    at that many seconds of speech per wall-clock second (0 sends it all at once).
+    ``drop_after_messages`` closes the websocket cleanly after that many audio
+    messages of a turn, before ``turn.end``, like a server going away mid-reply;
+    ``turns_per_connection`` closes it after that many complete turns, like a server
+    dropping idle connections.
+    """
+
+    def __init__(self, latency: float = 0.2, seconds_per_word: float = 0.35, chunk_frames: int = 20,
+                 handshake_latency: float = 0.0, synthesis_speed: float = 0.0,
+                 drop_after_messages: Optional[int] = None, turns_per_connection: Optional[int] = None):
+        self.latency = latency
+        self.seconds_per_word = seconds_per_word
+        self.chunk_frames = chunk_frames
+        self.handshake_latency = handshake_latency
+        self.synthesis_speed = synthesis_speed
+        self.drop_after_messages = drop_after_messages
+        self.turns_per_connection = turns_per_connection
+        self.requests = 0
+        self.connections = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/edge", self.websocket)
+        return app
+
+    @staticmethod
+    def _text_message(request_id: str, path: str, body: str = "") -> str:
+        return (
+            f"X-RequestId:{request_id}\r\n"
+            "Content-Type:application/json; charset=utf-8\r\n"
+            f"Path:{path}\r\n\r\n{body}"
+        )
+
+    @staticmethod
+    def _audio_message(request_id: str, data: bytes, content_type: str = "audio/mpeg") -> bytes:
+        headers = f"X-RequestId:{request_id}\r\nContent-Type:{content_type}\r\nPath:audio\r\n".encode()
+        return len(headers).to_bytes(2, "big") + headers + data
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        self.connections += 1
+        await asyncio.sleep(self.handshake_latency)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        output_format = DEFAULT_OUTPUT_FORMAT
+        turns = 0
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            if "Path:speech.config" in message.data:
+                match = re.search(r'"outputFormat":"([\w-]+)"', message.data)
+                output_format = match.group(1) if match else DEFAULT_OUTPUT_FORMAT
+                continue
+            if "Path:ssml" not in message.data:
+                continue
+            self.requests += 1
+            request_id = re.search(r"X-RequestId:(\w+)", message.data).group(1)
+            text = re.sub(r"<[^>]+>", " ", message.data.split("\r\n\r\n", 1)[1])
+            turns += 1
+            if not await self._speak(ws, request_id, text.split(), output_format) \
+                    or turns == self.turns_per_connection:
+                await ws.close()
+                break
+        return ws
+
+    async def _speak(self, ws: web.WebSocketResponse, request_id: str, words,
+                     output_format: str = DEFAULT_OUTPUT_FORMAT) -> bool:
+        """Send one turn; False if it was cut off before ``turn.end``."""
+        await asyncio.sleep(self.latency)
+        await ws.send_str(self._text_message(request_id, "turn.start", "{}"))
+
+        word_ticks = int(self.seconds_per_word * TICKS_PER_SECOND)
+        for i, word in enumerate(words):
+            await ws.send_str(self._text_message(request_id, "audio.metadata", json.dumps({"Metadata": [{
+                "Type": "WordBoundary",
+                "Data": {"Offset": i * word_ticks, "Duration": word_ticks,
+                         "text": {"Text": word, "Length": len(word), "BoundaryType": "WordBoundary"}}
+            }]})))
+
+        frame, frame_seconds, content_type = FAKE_AUDIO[output_format]
+        frames = max(1, round(len(words) * self.seconds_per_word / frame_seconds))
+        sent = 0
+        while frames > 0:
+            if sent == self.drop_after_messages:
+                return False
+            count = min(frames, self.chunk_frames)
+            if self.synthesis_speed:
+                await asyncio.sleep(count * frame_seconds / self.synthesis_speed)
+            await ws.send_bytes(self._audio_message(request_id, frame * count, content_type))
+            frames -= count
+            sent += 1
+        await ws.send_str(self._text_message(request_id, "turn.end", "{}"))
+        return True
+
+
+class BackendThread:
+    """Runs aiohttp apps on 127.0.0.1 in a background thread with its own event loop."""
+
+    def __init__(self, **apps: web.Application):
+        self.apps = apps
+        self.urls = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runners = []
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-backends", daemon=True)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._start())
+        self._ready.set()
+        self.loop.run_forever()
+        for runner in self._runners:
+            self.loop.run_until_complete(runner.cleanup())
+        self.loop.close()
+
+    async def _start(self):
+        for name, app in self.apps.items():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.urls[name] = f"http://127.0.0.1:{port}"
+            self._runners.append(runner)
+
+    def start(self) -> "BackendThread":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeSpeechRecognition:
+    """SpeechRecognition stand-in: waits ``latency`` and returns a fixed transcript."""
+
+    def __init__(self, latency: float = 0.3, transcript: str = "Tell me something interesting about the ocean."):
+        self.latency = latency
+        self.transcript = transcript
+
+    async def process_audio(self, audio) -> str:
+        await asyncio.sleep(self.latency)
+        return self.transcript
+
+
+class FakeHistory:
+    """In-memory HistoryManager stand-in with a fixed per-call ``latency``."""
+
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.conversations = {}
+        self.messages = {}
+
+    async def get_or_create_conversation(self, user_id: str, mode: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self.conversations.setdefault((user_id, mode), str(uuid.uuid4()))
+
+    async def save_message(self, conversation_id: str, role: str, content: str, audio_url: str = None):
+        await asyncio.sleep(self.latency)
+        self.messages.setdefault(conversation_id, []).append((role, content))
@@ -7,17 +7,19 @@ from typing import List, Dict, Optional
 import logging
 import ssl
 import re
+from app.state import SharedDict
 
 logger = logging.getLogger("HistoryManager")
 logging.basicConfig(level=logging.INFO)
 
 class HistoryManager:
-    def __init__(self, db_url: str, bucket_name: str, aws_access_key: str, aws_secret_key: str, region: str, logger):
+    def __init__(self, db_url: str, bucket_name: str, aws_access_key: str, aws_secret_key: str, region: str, logger, state=None):
         self.db_url = db_url
         self.pool = None
         self.logger = logger
         self.bucket_name = bucket_name
-        self.active_conversations = {}
+        # user_id -> conversation_id, shared across workers when a state backend is given
+        self.active_conversations = SharedDict(state, "active_conversations") if state is not None else {}
         self.region = region
         try:
             self.s3 = boto3.client(
@@ -10,58 +10,84 @@ sys.path.append(os.path.join(base_dir, "inai_project"))
 
 load_dotenv
 
-from app.main import INAIApplication
-from inai_project.main import AuthApplication
-from inai_project.app.history.history_routes import router as history_router
-from inai_project.app.history.history_manager import HistoryManager
 from app.logger import Logger
 
 logger = Logger()
 
-history_manager = HistoryManager(
-    db_url=os.getenv("DATABASE_URL"),
-    bucket_name=os.getenv("AWS_BUCKET_NAME"),
-    aws_access_key=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region=os.getenv("AWS_REGION"),
-    logger=logger
-)
 
-app = FastAPI()
+def create_app():
+    """Build the ASGI app: the socket.io server wrapping the FastAPI routes.
 
-auth_app = AuthApplication().get_app()
-app.mount("/auth", auth_app)
+    Everything with side effects (config watcher, database tables, shared key state,
+    edge-tts pool) happens here rather than at import time, because lip-sync worker
+    processes are spawned and re-import this script as ``__mp_main__``.
+    """
+    import asyncio
+    import socketio
+    from app.main import INAIApplication
+    from inai_project.main import AuthApplication
+    from inai_project.app.history.history_routes import router as history_router
+    from inai_project.app.history.history_manager import HistoryManager
+    from app.state import get_state_backend
 
-app.include_router(history_router, prefix="/history")
+    history_manager = HistoryManager(
+        db_url=os.getenv("DATABASE_URL"),
+        bucket_name=os.getenv("AWS_BUCKET_NAME"),
+        aws_access_key=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region=os.getenv("AWS_REGION"),
+        logger=logger,
+        state=get_state_backend(os.getenv("STATE_BACKEND"))
+    )
 
-inai_app = INAIApplication(history_manager)
-app.mount("/", inai_app.app)
+    app = FastAPI()
 
-import socketio
-sio_app = socketio.ASGIApp(inai_app.sio, app, socketio_path="/socket.io")
+    auth_app = AuthApplication().get_app()
+    app.mount("/auth", auth_app)
 
-@app.get("/test-db")
-async def test_db():
-    async with history_manager.pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM conversations")
-        return [dict(r) for r in rows]
+    app.include_router(history_router, prefix="/history")
 
-@app.get("/health")
-def health_check():
-    return {"status": "INAI running at root :rocket:"}
+    inai_app = INAIApplication(history_manager)
+    app.mount("/", inai_app.app)
 
-@app.on_event("startup")
-async def startup():
-    await history_manager.init_db()
-    app.state.history_manager = history_manager
+    @app.get("/test-db")
+    async def test_db():
+        async with history_manager.pool.acquire() as conn:
+            rows = await conn.fetch("SELECT * FROM conversations")
+            return [dict(r) for r in rows]
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "INAI running at root :rocket:"}
+
+    @app.on_event("startup")
+    async def startup():
+        await history_manager.init_db()
+        app.state.history_manager = history_manager
+        inai_app.tts.prewarm()
+        inai_app.socket_handler.lipsync.prewarm()
+        app.state.keep_alive = asyncio.create_task(inai_app.keep_alive())
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        app.state.keep_alive.cancel()
+        inai_app.workers.leave()
+        await history_manager.close()
+        await inai_app.tts.close()
+        inai_app.socket_handler.lipsync.close()
+
+    return socketio.ASGIApp(inai_app.sio, app, socketio_path="/socket.io")
 
-@app.on_event("shutdown")
-async def shutdown():
-    await history_manager.close()
 
 if __name__ == "__main__":
     import uvicorn
     host="0.0.0.0"
     port=5000
-    logger.info(f"🚀 Starting INAI on http://{host}:{port}")
-    uvicorn.run(sio_app, host=host, port=port , reload=True)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    logger.info(f"🚀 Starting INAI on http://{host}:{port} with {workers} worker(s)")
+    # More than one worker needs a shared STATE_BACKEND and SOCKETIO_MESSAGE_QUEUE
+    # (redis:// in production, with the redis package installed; sqlite:/// is for
+    # development, as its calls block the event loop), plus sticky sessions in
+    # front of the workers if clients use the polling transport. For development,
+    # `uvicorn serve:create_app --factory --reload` restarts on code changes.
+    uvicorn.run("serve:create_app", factory=True, host=host, port=port, workers=workers)
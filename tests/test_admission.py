@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.admission import AdmissionController
+
+
+@pytest.mark.asyncio
+async def test_queues_when_full_and_admits_on_release():
+    controller = AdmissionController(MagicMock(), max_sessions=1, max_queue=1)
+    assert controller.request("user1", "sid1") == {"status": "admitted"}
+
+    queued = controller.request("user2", "sid2")
+    assert queued["status"] == "queued"
+    assert queued["position"] == 1
+    assert queued["estimated_wait"] > 0
+
+    assert controller.request("user3", "sid3")["status"] == "rejected"
+
+    turn = asyncio.ensure_future(controller.wait_for_turn("user2"))
+    controller.release("user1")
+    assert await turn is True
+    assert controller.usage()["sessions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_inflight_budget_blocks_admission_until_work_finishes():
+    controller = AdmissionController(MagicMock(), max_inflight_llm=1)
+    with controller.track("llm"):
+        assert controller.request("user1", "sid1")["status"] == "queued"
+        turn = asyncio.ensure_future(controller.wait_for_turn("user1"))
+        await asyncio.sleep(0)
+        assert not turn.done()
+    assert await turn is True
+    assert controller.snapshot()["resources"]["llm"] == {"in_use": 0, "budget": 1}
+
+
+@pytest.mark.asyncio
+async def test_withdrawn_user_is_not_admitted():
+    controller = AdmissionController(MagicMock(), max_sessions=0)
+    assert controller.request("user1", "sid1")["status"] == "queued"
+    turn = asyncio.ensure_future(controller.wait_for_turn("user1"))
+    controller.withdraw_sid("sid1")
+    assert await turn is False
+    assert controller.snapshot()["queued"] == 0
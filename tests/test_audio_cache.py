@@ -0,0 +1,199 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.audio_cache import AudioCache, RecentAudioStore
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("disk_dir", str(tmp_path / "tts_cache"))
+    return AudioCache(MagicMock(), **kwargs)
+
+
+def test_key_depends_on_text_voice_and_format():
+    key = AudioCache.key("Hello", "voice-a", "mp3")
+    assert key == AudioCache.key("Hello", "voice-a", "mp3")
+    assert key != AudioCache.key("Hello", "voice-b", "mp3")
+    assert key != AudioCache.key("Hello", "voice-a", "opus")
+    assert key != AudioCache.key("Hello!", "voice-a", "mp3")
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_memory_bytes=10, disk_dir=None)
+    await cache.put("a", b"aaaa")
+    await cache.put("b", b"bbbb")
+    assert await cache.get("a") == b"aaaa"
+    await cache.put("c", b"cccc")
+
+    assert list(cache.memory) == ["a", "c"]
+    assert cache.memory_bytes == 8
+    assert await cache.get("b") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_serves_entries_evicted_from_memory_and_survives_restart(tmp_path):
+    cache = make_cache(tmp_path, max_memory_bytes=4, max_disk_bytes=100)
+    await cache.put("a", b"aaaa")
+    await cache.put("b", b"bbbb")
+    assert "a" not in cache.memory
+    assert await cache.get("a") == b"aaaa"
+
+    restarted = make_cache(tmp_path, max_memory_bytes=4, max_disk_bytes=100)
+    assert await restarted.get("b") == b"bbbb"
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_evicts_by_size(tmp_path):
+    cache = make_cache(tmp_path, max_memory_bytes=0, max_disk_bytes=8)
+    for key in ("a", "b", "c"):
+        await cache.put(key, key.encode() * 4)
+
+    assert list(cache.disk) == ["b", "c"]
+    assert sorted(p.name for p in (tmp_path / "tts_cache").iterdir()) == ["b.mp3", "c.mp3"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = 0
+
+    async def synthesize():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return b"audio"
+
+    results = await asyncio.gather(*(cache.get_or_create("k", synthesize) for _ in range(5)))
+
+    assert results == [b"audio"] * 5
+    assert calls == 1
+    assert await cache.get_or_create("k", synthesize) == b"audio"
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_synthesis_is_cancelled_when_its_last_caller_is(tmp_path):
+    cache = make_cache(tmp_path)
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def create():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return b"audio"
+
+    first = asyncio.create_task(cache.get_or_create("k", create))
+    second = asyncio.create_task(cache.get_or_create("k", create))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set() and "k" in cache.inflight
+
+    second.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert cache.inflight == {} and cache.waiters == {}
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_caller_arriving_while_synthesis_is_cancelled_gets_a_fresh_one(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    async def create():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+        return b"audio"
+
+    first = asyncio.create_task(cache.get_or_create("k", create))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    # Joins before the cancelled synthesis has unwound.
+    second = asyncio.create_task(cache.get_or_create("k", create))
+
+    assert await second == b"audio"
+    assert first.cancelled() and calls == [0, 1]
+    assert cache.inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_empty_results_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def failed():
+        return b""
+
+    assert await cache.get_or_create("k", failed) == b""
+    assert await cache.get("k") is None
+    assert not cache.inflight
+
+
+@pytest.mark.asyncio
+async def test_waiters_retry_when_the_shared_synthesis_is_cancelled(tmp_path):
+    # The TTS scheduler cancels the task holding a slot, which is the shared synthesis.
+    cache = make_cache(tmp_path, disk_dir=None)
+    started = []
+
+    async def synthesize():
+        started.append(asyncio.current_task())
+        await asyncio.sleep(0.01)
+        return b"audio"
+
+    waiter = asyncio.create_task(cache.get_or_create("k", synthesize))
+    while not started:
+        await asyncio.sleep(0)
+    started[0].cancel()
+
+    assert await waiter == b"audio"
+    assert len(started) == 2 and not cache.inflight and not cache.waiters
+
+
+@pytest.mark.asyncio
+async def test_zero_sized_cache_is_disabled(tmp_path):
+    cache = make_cache(tmp_path, max_memory_bytes=0, max_disk_bytes=0)
+    calls = 0
+
+    async def synthesize():
+        nonlocal calls
+        calls += 1
+        return b"audio"
+
+    await asyncio.gather(cache.get_or_create("k", synthesize), cache.get_or_create("k", synthesize))
+    assert calls == 2
+    assert not (tmp_path / "tts_cache").exists()
+
+
+def test_recent_audio_store_enforces_byte_budget():
+    store = RecentAudioStore(max_bytes=10, ttl=60)
+    store["a"] = b"aaaa"
+    store["b"] = b"bbbb"
+    store["a"] = b"AAAA"
+    store["c"] = b"cccc"
+
+    assert "b" not in store
+    assert store["a"] == b"AAAA"
+    assert store.total_bytes == 8
+    store["huge"] = b"x" * 11
+    assert "huge" not in store
+    assert store.snapshot()["users"] == 2
+
+
+def test_recent_audio_store_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.audio_cache.time.monotonic", lambda: now[0])
+    store = RecentAudioStore(max_bytes=100, ttl=5)
+    store["a"] = b"aaaa"
+    now[0] += 3
+    store["b"] = b"bbbb"
+    now[0] += 3
+
+    assert store.get("a") is None
+    assert store["b"] == b"bbbb"
+    assert len(store) == 1
+    assert store.total_bytes == 4
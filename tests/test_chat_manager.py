@@ -60,4 +60,97 @@ async def test_chat_with_groq_error(monkeypatch):
 
     chat_manager = ChatManager(config, modes, logger)
     reply = await chat_manager.chat_with_groq("user1", "friend", "Hi!")
-    assert "trouble" in reply  # Loose check, matches error reply
\ No newline at end of file
+    assert "trouble" in reply  # Loose check, matches error reply
+
+@pytest.mark.asyncio
+async def test_stream_chat_with_groq_yields_deltas(monkeypatch):
+    config = MagicMock()
+    config.groq_api_key = "test_key"
+    modes = MagicMock()
+    modes.modes = {"friend": "system prompt"}
+    logger = MagicMock()
+
+    def chunk(content):
+        return MagicMock(choices=[MagicMock(delta=MagicMock(content=content))])
+
+    class MockStream:
+        def __init__(self):
+            self.chunks = [chunk("Hello "), chunk(None), chunk("*waves* there!")]
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.chunks:
+                raise StopAsyncIteration
+            return self.chunks.pop(0)
+
+    class MockCompletions:
+        @staticmethod
+        async def create(**kwargs):
+            assert kwargs["stream"] is True
+            return MockStream()
+
+    class MockChat:
+        completions = MockCompletions()
+
+    class MockClient:
+        chat = MockChat()
+
+    monkeypatch.setattr("app.chat.OpenAI", lambda **kwargs: MockClient())
+    monkeypatch.setattr("app.chat.AsyncOpenAI", lambda **kwargs: MockClient())
+
+    chat_manager = ChatManager(config, modes, logger)
+    deltas = [d async for d in chat_manager.stream_chat_with_groq("user1", "friend", "Hi!")]
+    assert deltas == ["Hello ", " there!"]
+    assert chat_manager.chat_histories["user1"]["friend"][-1] == {"role": "assistant", "content": "Hello  there!"}
+
+
+@pytest.mark.asyncio
+async def test_failed_stream_takes_back_the_user_turn(monkeypatch):
+    config = MagicMock()
+    config.groq_api_key = "test_key"
+    modes = MagicMock()
+    modes.modes = {"friend": "system prompt"}
+
+    class MockStream:
+        def __init__(self, deltas):
+            self.deltas = list(deltas)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.deltas:
+                raise ConnectionError("stream dropped")
+            return MagicMock(choices=[MagicMock(delta=MagicMock(content=self.deltas.pop(0)))])
+
+    streams = [MockStream([]), MockStream(["Hello "])]
+
+    class MockCompletions:
+        @staticmethod
+        async def create(**kwargs):
+            return streams.pop(0)
+
+    class MockClient:
+        chat = MagicMock(completions=MockCompletions())
+
+    monkeypatch.setattr("app.chat.OpenAI", lambda **kwargs: MockClient())
+    monkeypatch.setattr("app.chat.AsyncOpenAI", lambda **kwargs: MockClient())
+
+    chat_manager = ChatManager(config, modes, MagicMock())
+    chat_manager._append_history("user1", "friend", "user", "Earlier")
+    chat_manager._append_history("user1", "friend", "assistant", "Reply")
+    deltas = [d async for d in chat_manager.stream_chat_with_groq("user1", "friend", "Hi!")]
+
+    assert "trouble" in deltas[0]
+    assert chat_manager.chat_histories["user1"]["friend"] == [
+        {"role": "user", "content": "Earlier"}, {"role": "assistant", "content": "Reply"}]
+
+    # Once part of the reply is out, the failure is raised rather than papered over.
+    deltas = []
+    with pytest.raises(ConnectionError):
+        async for delta in chat_manager.stream_chat_with_groq("user1", "friend", "Hi!"):
+            deltas.append(delta)
+    assert deltas == ["Hello "]
+    assert len(chat_manager.chat_histories["user1"]["friend"]) == 2
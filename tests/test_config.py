@@ -0,0 +1,33 @@
+import os
+import time
+from app.config import Config
+
+
+def make_config(tmp_path, monkeypatch, toggle="off"):
+    # Config loads .env into os.environ; register the keys so monkeypatch restores them.
+    for key in ("OPENAI_API_KEY", "TOGGLE_KEY", "TOGGLE_PASSWORD"):
+        monkeypatch.setenv(key, os.environ.get(key, ""))
+    monkeypatch.chdir(tmp_path)
+    env_path = tmp_path / ".env"
+    env_path.write_text(f"OPENAI_API_KEY=key1,key2\nTOGGLE_KEY={toggle}\nTOGGLE_PASSWORD=secret\n")
+    return Config(str(env_path)), env_path
+
+
+def test_refresh_only_reloads_when_file_changes(tmp_path, monkeypatch):
+    config, env_path = make_config(tmp_path, monkeypatch)
+    assert config.refresh_if_changed() is False
+    assert config.is_socket_on()
+
+    env_path.write_text("OPENAI_API_KEY=key1,key2\nTOGGLE_KEY=on\nTOGGLE_PASSWORD=secret\n")
+    os.utime(env_path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    assert config.refresh_if_changed() is True
+    assert config.is_maintenance_on()
+
+
+def test_toggle_state_updates_cached_flag(tmp_path, monkeypatch):
+    config, env_path = make_config(tmp_path, monkeypatch)
+    assert config.toggle_state("wrong") is False
+    assert config.toggle_state("secret") is True
+    assert config.is_maintenance_on()
+    assert "TOGGLE_KEY=on" in env_path.read_text()
+    assert config.refresh_if_changed() is False
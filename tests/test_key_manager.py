@@ -1,14 +1,17 @@
 import pytest
 from app import key_manager
+from app.state import InMemoryStateBackend, SharedDict
 from unittest.mock import patch
 from datetime import datetime
 
 @pytest.fixture(autouse=True)
-def reset_state():
-    # Reset global state before each test
-    key_manager.user_sessions.clear()
-    key_manager.user_token_usage.clear()
-    key_manager.key_usage_count = {key: 0 for key in key_manager.api_keys}
+def reset_state(monkeypatch):
+    # Give each test its own backend, so nothing it assigns leaks into other tests
+    state = InMemoryStateBackend()
+    monkeypatch.setattr(key_manager, "state", state)
+    monkeypatch.setattr(key_manager, "user_sessions", SharedDict(state, "key_sessions"))
+    monkeypatch.setattr(key_manager, "user_token_usage", SharedDict(state, "token_usage"))
+    monkeypatch.setattr(key_manager, "key_usage_count", SharedDict(state, "key_usage"))
     yield
 
 def test_assign_key_to_user_creates_session():
@@ -64,4 +67,33 @@ def test_get_monitor_data_structure():
     assert "key_usage" in monitor_data
     assert "user_sessions" in monitor_data
     assert "token_usage_per_user" in monitor_data
-    assert "monitor_user" in monitor_data["user_sessions"]
\ No newline at end of file
+    assert "monitor_user" in monitor_data["user_sessions"]
+
+
+def test_reconcile_drops_stale_sessions_and_unknown_keys():
+    key = key_manager.api_keys[0]
+    key_manager.key_usage_count.update({key: 7, "removed-key": 3})
+    key_manager.assign_key_to_user("live_user")
+    # A worker of an earlier run: its pid may well be reused, its instance id never is.
+    key_manager.user_sessions["dead_user"] = {"api_key": key, "instance": "stopped-worker"}
+    key_manager.user_sessions["old_key_user"] = {"api_key": "removed-key", "instance": key_manager.INSTANCE_ID}
+    key_manager.user_token_usage["dead_user"] = 50
+
+    key_manager.reconcile_shared_state()
+
+    assert sorted(key_manager.user_sessions) == ["live_user"]
+    assert "dead_user" not in key_manager.user_token_usage
+    assert "removed-key" not in key_manager.key_usage_count
+    assert sum(key_manager.key_usage_count.values()) == 1
+    assert set(key_manager.key_usage_count) == set(key_manager.api_keys)
+
+
+def test_reconcile_keeps_sessions_of_other_live_workers():
+    key = key_manager.api_keys[0]
+    key_manager.user_sessions["other_worker_user"] = {"api_key": key, "instance": "other-worker"}
+    key_manager.user_sessions["gone_worker_user"] = {"api_key": key, "instance": "gone-worker"}
+
+    key_manager.reconcile_shared_state({key_manager.INSTANCE_ID, "other-worker"})
+
+    assert sorted(key_manager.user_sessions) == ["other_worker_user"]
+    assert key_manager.key_usage_count[key] == 1
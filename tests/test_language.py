@@ -0,0 +1,54 @@
+from unittest.mock import patch
+from app import language
+from app.language import LanguageDetector
+
+
+def test_script_classification_skips_langdetect():
+    detector = LanguageDetector()
+    with patch.object(language, "detect", side_effect=AssertionError("langdetect called")):
+        assert detector.detect("नमस्ते, आप कैसे हैं?") == "hi"
+        assert detector.detect("કેમ છો? મજામાં?") == "gu"
+        assert detector.detect("How are you doing today?") == "en"
+        assert detector.detect("") == "en"
+
+
+def test_script_language_uses_the_dominant_script():
+    assert LanguageDetector.script_language("ok नमस्ते") == "hi"
+    assert LanguageDetector.script_language("Hello there friend, नमस्ते") is None
+    assert LanguageDetector.script_language("வணக்கம்") == "other"
+
+
+def test_hinglish_falls_back_to_langdetect_once_then_sticks():
+    detector = LanguageDetector()
+    with patch.object(language, "detect", return_value="hi") as detect:
+        assert detector.detect("yaar kya kar raha hai", "user1") == "hi"
+        assert detector.detect("acha theek hai", "user1") == "hi"
+        assert detect.call_count == 1
+        # Other users still get their own detection.
+        assert detector.detect("kya hua", "user2") == "hi"
+        assert detect.call_count == 2
+
+
+def test_script_detection_seeds_the_users_language():
+    detector = LanguageDetector()
+    detector.detect("मुझे बताओ", "user1")
+    with patch.object(language, "detect", side_effect=AssertionError("langdetect called")):
+        assert detector.detect("bata na yaar", "user1") == "hi"
+
+
+def test_recent_languages_expire_and_are_bounded():
+    detector = LanguageDetector(sticky_ttl=-1, max_users=2)
+    detector.remember("user1", "hi")
+    assert detector.recent_language("user1") is None
+
+    detector = LanguageDetector(max_users=2)
+    for user in ("a", "b", "c"):
+        detector.remember(user, "gu")
+    assert list(detector.recent) == ["b", "c"]
+
+
+def test_langdetect_failure_falls_back_to_default():
+    detector = LanguageDetector()
+    with patch.object(language, "detect", side_effect=Exception("no features")):
+        assert detector.detect("hai", "user1") == "en"
+    assert detector.recent_language("user1") is None
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from pydub import AudioSegment
+
+from app.lip_sync import (
+    cues_from_word_boundaries, detect_silence, generate_mouth_cues, generate_value_mapping, phoneme_to_shape,
+    text_to_phonemes
+)
+from benchmarks.bench_silence import detect_silence_loop, speech_like
+
+
+def segment(samples, frame_rate=24000):
+    data = np.asarray(samples).astype("<i2").tobytes()
+    return AudioSegment(data=data, sample_width=2, frame_rate=frame_rate, channels=1)
+
+
+def test_detect_silence_finds_pause_between_bursts():
+    rng = np.random.default_rng(1)
+    burst = rng.normal(0, 5000, 12000)
+    audio = segment(np.concatenate([burst, np.zeros(12000), burst]))
+
+    periods = detect_silence(audio)
+
+    assert len(periods) == 1
+    start, end = periods[0]
+    assert 0.49 <= start <= 0.51 and 0.99 <= end <= 1.01
+
+
+@pytest.mark.parametrize("seconds,frame_rate,seed", [(0.013, 24000, 0), (1, 24000, 1), (7.3, 24000, 2),
+                                                     (3.7, 16000, 3), (2.5, 22050, 4)])
+@pytest.mark.parametrize("threshold_db,min_silence", [(-40.0, 0.1), (-25.5, 0.05), (-60.0, 0.0)])
+def test_detect_silence_matches_loop_implementation(seconds, frame_rate, seed, threshold_db, min_silence):
+    audio = speech_like(seconds, frame_rate, seed)
+
+    assert detect_silence(audio, threshold_db, min_silence) == detect_silence_loop(audio, threshold_db, min_silence)
+
+
+def test_detect_silence_handles_digital_silence_and_empty_audio():
+    silent = segment(np.zeros(24000 + 137))
+
+    assert detect_silence(silent) == detect_silence_loop(silent)
+    assert detect_silence(segment([])) == []
+
+
+def value_mapping_loop(phonemes, audio, silence_threshold=-40.0):
+    """generate_value_mapping as it was before the silence lookup was vectorized."""
+    duration = len(audio) / 1000
+    silent_periods = detect_silence(audio, threshold_db=silence_threshold)
+    base_duration = duration / len([p for p in phonemes if p != ' '])
+    mapping, current_time = [], 0.0
+    for phoneme in phonemes:
+        if phoneme == ' ':
+            space_duration = base_duration * 0.3
+            mapping.append({'value': 'X', 'start': round(current_time, 3),
+                            'end': round(current_time + space_duration, 3)})
+            current_time += space_duration
+            continue
+        phoneme_end = current_time + base_duration
+        is_silent = any(not (phoneme_end < s or current_time > e) for s, e in silent_periods)
+        value = 'X' if is_silent else phoneme_to_shape.get(phoneme, 'A')
+        mapping.append({'value': value, 'start': round(current_time, 3), 'end': round(phoneme_end, 3)})
+        current_time = phoneme_end
+    if mapping and current_time < duration:
+        mapping[-1]['end'] = round(duration, 3)
+    return mapping
+
+
+@pytest.mark.parametrize("seconds,count,seed", [(0.5, 3, 0), (4, 60, 1), (12, 400, 2), (2, 500, 3)])
+def test_value_mapping_matches_loop_implementation(seconds, count, seed):
+    rng = np.random.default_rng(seed)
+    phonemes = list(rng.choice(list(phoneme_to_shape) + ["q", "sil"], count))
+    audio = speech_like(seconds, seed=seed)
+
+    assert generate_value_mapping(phonemes, audio) == value_mapping_loop(phonemes, audio)
+
+
+def test_value_mapping_marks_phonemes_in_silence():
+    rng = np.random.default_rng(5)
+    audio = segment(np.concatenate([rng.normal(0, 5000, 24000), np.zeros(24000)]))
+
+    mapping = generate_value_mapping(["m", "aa", "m", "aa", "m"], audio)
+
+    assert [cue["value"] for cue in mapping] == ["A", "H", "X", "X", "X"]
+    assert mapping[-1]["end"] == 2.0
+    assert generate_value_mapping([" ", " "], audio) == []
+
+
+def test_mouth_cues_from_audio_bytes():
+    rng = np.random.default_rng(6)
+    audio = segment(np.concatenate([rng.normal(0, 5000, 24000), np.zeros(24000)]))
+    wav = audio.export(format="wav").read()
+
+    cues = generate_mouth_cues("mama mama", wav, "wav")
+
+    assert cues == generate_value_mapping(text_to_phonemes("mama mama", "en"), audio)
+    assert cues[-1]["value"] == "X"
+    assert generate_mouth_cues("  ", wav, "wav") == []
+    assert generate_mouth_cues("mama", b"", "wav") == []
+
+
+def test_cues_follow_word_boundaries():
+    boundaries = [
+        {"type": "WordBoundary", "offset": 1_000_000, "duration": 3_000_000, "text": "mama"},
+        {"type": "WordBoundary", "offset": 4_200_000, "duration": 4_000_000, "text": "papa"},
+        {"type": "WordBoundary", "offset": 9_000_000, "duration": 1_000_000, "text": "."},
+    ]
+
+    cues = cues_from_word_boundaries(boundaries, duration=1.2, lang="hi")
+
+    assert cues[0] == {"value": "X", "start": 0.0, "end": 0.1}
+    mama = cues[1:5]
+    assert [c["value"] for c in mama] == ["A", "H", "A", "H"]
+    assert mama[0]["start"] == 0.1 and mama[-1]["end"] == 0.42  # a 20 ms gap is absorbed
+    papa = cues[5:9]
+    assert papa[0]["start"] == 0.42 and papa[-1]["end"] == 0.82
+    assert cues[9:] == [{"value": "X", "start": 0.82, "end": 1.2}]
+    assert cues_from_word_boundaries([], duration=1.0) == []
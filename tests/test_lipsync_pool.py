@@ -0,0 +1,104 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from unittest.mock import MagicMock
+from app.lipsync_pool import METHODS, LipSyncPool
+
+
+def blocking_cues(started, release):
+    def cues(*args):
+        started.set()
+        release.wait(5)
+        return [{"value": "A", "start": 0.0, "end": 0.1}]
+    return cues
+
+
+@pytest.mark.asyncio
+async def test_jobs_beyond_the_queue_are_turned_away(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    monkeypatch.setitem(METHODS, "audio", blocking_cues(started, release))
+    pool = LipSyncPool(MagicMock(), workers=0, max_queue=1)
+
+    running = asyncio.create_task(pool.cues("user1", "audio", "hi", b"a", "mp3"))
+    await asyncio.to_thread(started.wait, 5)
+    waiting = asyncio.create_task(pool.cues("user2", "audio", "hi", b"a", "mp3"))
+    await asyncio.sleep(0)
+
+    assert pool.waiting == 1
+    assert await pool.cues("user3", "audio", "hi", b"a", "mp3") is None
+    release.set()
+    assert await running == [{"value": "A", "start": 0.0, "end": 0.1}]
+    assert await waiting == [{"value": "A", "start": 0.0, "end": 0.1}]
+    assert pool.waiting == 0 and pool.user_tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_cancel_user_drops_waiting_jobs(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    monkeypatch.setitem(METHODS, "audio", blocking_cues(started, release))
+    pool = LipSyncPool(MagicMock(), workers=0)
+
+    running = asyncio.create_task(pool.cues("user1", "audio", "hi", b"a", "mp3"))
+    await asyncio.to_thread(started.wait, 5)
+    waiting = asyncio.create_task(pool.cues("user2", "audio", "hi", b"a", "mp3"))
+    await asyncio.sleep(0)
+
+    assert pool.cancel_user("user2") == 1
+    # The caller is not cancelled, it just gets no cues.
+    assert await waiting is None
+    assert pool.waiting == 0
+    release.set()
+    assert await running
+    assert pool.cancel_user("user2") == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_running_job_keeps_its_slot_until_the_worker_finishes(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    monkeypatch.setitem(METHODS, "audio", blocking_cues(started, release))
+    pool = LipSyncPool(MagicMock(), workers=0)
+
+    running = asyncio.create_task(pool.cues("user1", "audio", "hi", b"a", "mp3"))
+    await asyncio.to_thread(started.wait, 5)
+    assert pool.cancel_user("user1") == 1
+    assert await running is None
+    assert pool.user_tasks == {}
+
+    started.clear()
+    next_job = asyncio.create_task(pool.cues("user2", "audio", "hi", b"a", "mp3"))
+    await asyncio.sleep(0.05)
+    assert pool.waiting == 1 and not started.is_set()
+
+    release.set()
+    assert await next_job == [{"value": "A", "start": 0.0, "end": 0.1}]
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cues_are_computed_in_a_worker_process():
+    pool = LipSyncPool(MagicMock(), workers=1)
+    try:
+        cues = await pool.cues("user1", "boundaries", [{"offset": 0, "duration": 2_000_000, "text": "ma"}], 0.5, "hi")
+    finally:
+        pool.close()
+
+    assert [cue["value"] for cue in cues] == ["A", "H", "X"]
+    assert pool.executor is None
+
+
+def test_spawned_workers_do_not_build_the_server_app():
+    # A spawned worker re-imports the launching script as __mp_main__ with runpy,
+    # as multiprocessing.spawn does; serve.py must not build the app on import.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import runpy, sys\n"
+        "runpy.run_path('serve.py', run_name='__mp_main__')\n"
+        "print(sorted(m for m in ('app.main', 'app.key_manager', 'inai_project.main') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
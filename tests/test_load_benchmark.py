@@ -0,0 +1,139 @@
+import edge_tts
+import edge_tts.communicate
+import pytest
+from edge_tts.exceptions import WebSocketError
+from unittest.mock import MagicMock
+from app.audio_cache import AudioCache
+from app.edge_client import EdgeConnectionPool, EdgeTTSClient
+from benchmarks import bench_edge_pool
+from benchmarks.fake_backends import BackendThread, FakeEdgeTTS, FAKE_AUDIO, SILENT_MP3_FRAME
+from benchmarks.bench_socketio_load import parse_args, run
+
+
+async def collect_audio(client, text, audio_format="mp3"):
+    audio = b""
+    async for chunk in client.stream(text, "en-US-AriaNeural", audio_format):
+        if chunk["type"] == "audio":
+            audio += chunk["data"]
+    return audio
+
+
+@pytest.mark.asyncio
+async def test_fake_edge_tts_speaks_the_edge_protocol(monkeypatch):
+    edge = FakeEdgeTTS(latency=0, seconds_per_word=0.24)
+    with BackendThread(edge=edge.app()) as backends:
+        monkeypatch.setattr(edge_tts.communicate, "WSS_URL",
+                            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=test")
+        audio, words = b"", []
+        async for chunk in edge_tts.Communicate("Hello there friend.").stream():
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+            else:
+                words.append(chunk["text"])
+
+    assert words == ["Hello", "there", "friend."]
+    assert audio == SILENT_MP3_FRAME * 30
+
+
+@pytest.mark.asyncio
+async def test_edge_client_requests_the_chosen_output_format(monkeypatch):
+    edge = FakeEdgeTTS(latency=0, seconds_per_word=0.2)
+    with BackendThread(edge=edge.app()) as backends:
+        monkeypatch.setattr(edge_tts.communicate, "WSS_URL",
+                            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=test")
+        audio, words = b"", []
+        client = EdgeTTSClient(MagicMock())
+        async for chunk in client.stream("Hello there friend.", "en-US-AriaNeural", "opus"):
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+            else:
+                words.append((chunk["text"], chunk["offset"]))
+        await client.pool.close()
+
+    assert words == [("Hello", 0), ("there", 2_000_000), ("friend.", 4_000_000)]
+    assert audio == FAKE_AUDIO["webm-24khz-16bit-24kbps-mono-opus"][0] * 30
+
+
+@pytest.mark.asyncio
+async def test_edge_pool_reuses_connections_and_replaces_dead_ones(monkeypatch):
+    edge = FakeEdgeTTS(latency=0, seconds_per_word=0.1)
+    with BackendThread(edge=edge.app()) as backends:
+        monkeypatch.setattr(edge_tts.communicate, "WSS_URL",
+                            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=test")
+        pool = EdgeConnectionPool(MagicMock(), max_idle=2)
+        client = EdgeTTSClient(MagicMock(), pool)
+
+        assert await collect_audio(client, "One two.") == SILENT_MP3_FRAME * 8
+        assert await collect_audio(client, "Three four.") == SILENT_MP3_FRAME * 8
+        assert (edge.connections, edge.requests) == (1, 2)
+
+        # A warm connection the server dropped is replaced before any audio is lost.
+        (ws, _), = pool.idle[next(iter(pool.idle))]
+
+        async def dead(*args, **kwargs):
+            raise ConnectionResetError("Cannot write to closing transport")
+        monkeypatch.setattr(ws, "send_str", dead)
+        assert await collect_audio(client, "Five six.") == SILENT_MP3_FRAME * 8
+        assert (edge.connections, edge.requests) == (2, 3)
+
+        # Other formats get their own connections.
+        await collect_audio(client, "Seven.", "opus")
+        assert edge.connections == 3
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_edge_pool_reconnects_when_the_server_closed_an_idle_connection(monkeypatch):
+    edge = FakeEdgeTTS(latency=0, seconds_per_word=0.1, turns_per_connection=1)
+    with BackendThread(edge=edge.app()) as backends:
+        monkeypatch.setattr(edge_tts.communicate, "WSS_URL",
+                            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=test")
+        pool = EdgeConnectionPool(MagicMock(), max_idle=2)
+        client = EdgeTTSClient(MagicMock(), pool)
+
+        assert await collect_audio(client, "One two.") == SILENT_MP3_FRAME * 8
+        # The pooled socket was closed by the server after its turn; the next turn
+        # finds out only when it reads, and is retried on a fresh connection.
+        assert await collect_audio(client, "Three four.") == SILENT_MP3_FRAME * 8
+        assert (edge.connections, edge.requests) == (2, 2)
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_turn_cut_off_before_turn_end_fails_and_is_not_cached(monkeypatch):
+    edge = FakeEdgeTTS(latency=0, seconds_per_word=0.1, chunk_frames=2, drop_after_messages=1)
+    with BackendThread(edge=edge.app()) as backends:
+        monkeypatch.setattr(edge_tts.communicate, "WSS_URL",
+                            backends.urls["edge"].replace("http", "ws", 1) + "/edge?TrustedClientToken=test")
+        pool = EdgeConnectionPool(MagicMock(), max_idle=2)
+        client = EdgeTTSClient(MagicMock(), pool)
+        cache = AudioCache(MagicMock(), max_memory_bytes=2**20, disk_dir=None)
+
+        with pytest.raises(WebSocketError):
+            await cache.get_or_create("k", lambda: collect_audio(client, "One two three four."))
+        await pool.close()
+
+    assert await cache.get("k") is None
+    assert all(not idle for idle in pool.idle.values())
+
+
+def test_edge_pool_benchmark_smoke():
+    report = bench_edge_pool.run(bench_edge_pool.parse_args([
+        "--chunks", "6", "--workers", "2", "--handshake-latency", "0", "--tts-latency", "0",
+    ]))
+
+    assert report["fresh"]["connections"] == 6
+    assert report["pooled"]["connections"] < 6
+
+
+def test_load_benchmark_smoke():
+    report = run(parse_args([
+        "--clients", "2", "--turns", "1", "--ramp", "0", "--think-time", "0",
+        "--llm-latency", "0", "--tts-latency", "0", "--stt-latency", "0", "--reply-words", "8",
+        "--no-lipsync",
+    ]))
+
+    assert report["turns_completed"] == 2
+    assert report["errors"] == report["timeouts"] == 0
+    assert report["ttfa_ms"]["p50"] > 0
+    assert report["backend_requests"] == {"groq": 2, "edge_tts": 2}
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from app.metrics import MetricsRegistry, time_stage, stage_total, stage_in_flight, metrics
+
+
+def test_histogram_buckets_and_quantiles():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_latency_seconds", "Test latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, "llm")
+
+    text = registry.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{stage="llm"} 4' in text
+    assert latency.quantiles("llm") == {0.5: 0.5, 0.95: 2.0, 0.99: 2.0}
+    assert 'test_latency_seconds_quantile{stage="llm",quantile="0.5"} 0.5' in text
+
+
+def test_counter_and_gauge_render():
+    registry = MetricsRegistry()
+    hits = registry.counter("test_hits_total", "Hits", ("kind",))
+    hits.inc("a")
+    hits.inc("a", amount=2)
+    depth = registry.gauge("test_depth", "Depth")
+    depth.set(3)
+    text = registry.render()
+    assert 'test_hits_total{kind="a"} 3' in text
+    assert "test_depth 3" in text
+
+
+@pytest.mark.asyncio
+async def test_time_stage_counts_outcomes():
+    with time_stage("unit_test", "friend"):
+        await asyncio.sleep(0)
+    with pytest.raises(ValueError):
+        with time_stage("unit_test", "friend"):
+            raise ValueError("boom")
+
+    assert stage_total.values[("unit_test", "friend", "ok")] == 1
+    assert stage_total.values[("unit_test", "friend", "error")] == 1
+    assert stage_in_flight.values[("unit_test", "friend")] == 0
+    assert 'inai_stage_latency_seconds_count{stage="unit_test",mode="friend"} 2' in metrics.render()
@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 from app.session import UserSessionManager
+from app.state import INSTANCE_ID, InMemoryStateBackend
 from unittest.mock import MagicMock
 
 
@@ -31,4 +33,91 @@ def test_clear_all_sessions():
     manager.create_user_session("user2", "sid2")
     manager.clear_all_sessions()
     assert manager.get_user_session("user1") is None
-    assert manager.get_user_session("user2") is None
\ No newline at end of file
+    assert manager.get_user_session("user2") is None
+
+
+def test_clear_all_sessions_keeps_other_workers_entries():
+    state = InMemoryStateBackend()
+    manager = UserSessionManager(MagicMock(), state=state)
+    manager.create_user_session("user1", "sid1")
+    # Another worker's connection, mirrored into the same backend.
+    manager.shared_sessions["user2"] = {"sid": "sid2", "endpoint": None, "instance": "other-worker"}
+
+    manager.clear_all_sessions()
+
+    assert "user1" not in manager.shared_sessions
+    assert manager.shared_sessions["user2"]["sid"] == "sid2"
+
+
+def test_reconcile_drops_sessions_of_stopped_workers():
+    manager = UserSessionManager(MagicMock(), state=InMemoryStateBackend())
+    manager.create_user_session("user1", "sid1")
+    manager.shared_sessions["user2"] = {"sid": "sid2", "instance": "other-worker"}
+    manager.shared_sessions["user3"] = {"sid": "sid3", "instance": "stopped-worker"}
+
+    assert manager.reconcile_shared_sessions({INSTANCE_ID, "other-worker"}) == 1
+    assert sorted(manager.get_all_sids()) == ["sid1", "sid2"]
+
+
+def test_sid_index_follows_session_lifecycle():
+    logger = MagicMock()
+    manager = UserSessionManager(logger)
+    manager.create_user_session("user1", "sid1")
+    assert manager.get_user_by_sid("sid1") == "user1"
+
+    # Reconnecting under a new sid drops the stale mapping.
+    manager.create_user_session("user1", "sid2")
+    assert manager.get_user_by_sid("sid1") is None
+    assert manager.get_user_by_sid("sid2") == "user1"
+
+    manager.cleanup_user_session("user1")
+    assert manager.get_user_by_sid("sid2") is None
+
+    manager.create_user_session("user2", "sid3")
+    manager.clear_all_sessions()
+    assert manager.get_user_by_sid("sid3") is None
+
+
+@pytest.mark.asyncio
+async def test_submit_work_coalesces_to_latest_job():
+    manager = UserSessionManager(MagicMock(), max_queue_depth=1)
+    manager.create_user_session("user1", "sid1")
+    started, finished = [], []
+
+    def job(name):
+        async def run():
+            started.append(name)
+            await asyncio.sleep(0.05)
+            finished.append(name)
+        return run
+
+    first = manager.submit_work("user1", job("first"))
+    await asyncio.sleep(0.01)
+    second = manager.submit_work("user1", job("second"))
+    third = manager.submit_work("user1", job("third"))
+    await manager.workers["user1"]
+
+    assert first == {"pending": 0, "dropped": 0, "max_depth": 1, "retry_after": 0.0}
+    assert second["pending"] == 1
+    assert third["dropped"] == 1
+    # "first" was preempted, "second" never reached the backends.
+    assert started == ["first", "third"]
+    assert finished == ["third"]
+    assert "user1" not in manager.workers
+
+
+@pytest.mark.asyncio
+async def test_submit_work_spaces_job_starts():
+    manager = UserSessionManager(MagicMock(), min_work_interval=0.2)
+    manager.create_user_session("user1", "sid1")
+
+    async def noop():
+        pass
+
+    manager.submit_work("user1", noop)
+    await manager.workers["user1"]
+    status = manager.submit_work("user1", noop)
+    assert status["pending"] == 1
+    assert 0 < status["retry_after"] <= 0.2
+    manager.cleanup_user_session("user1")
+    assert "user1" not in manager.workers
@@ -0,0 +1,201 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.lipsync_pool import METHODS, LipSyncPool
+from app.socket import SocketHandler
+from app.session import UserSessionManager
+
+
+class FakeSio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data, room=None):
+        self.emitted.append((event, data))
+
+
+def make_handler(tts, **config_values):
+    config = MagicMock()
+    config.tts_prefetch_depth = 2
+    config.tts_pacing_lead = 0.0
+    for key, value in config_values.items():
+        setattr(config, key, value)
+    logger = MagicMock()
+    session_manager = UserSessionManager(logger)
+    session_manager.create_user_session("user1", "sid1")
+    sio = FakeSio()
+    handler = SocketHandler(sio, session_manager, config, tts, MagicMock(), MagicMock(), MagicMock(), MagicMock(), logger,
+                            lipsync_pool=LipSyncPool(logger, workers=0))
+    return handler, sio
+
+
+@pytest.mark.asyncio
+async def test_info_streaming_prefetches_and_emits_in_order():
+    in_flight = 0
+    max_in_flight = 0
+
+    class FakeTTS:
+        def split_into_sentence_chunks(self, text):
+            return ["one", "two", "three", "four"]
+
+        def estimate_duration(self, audio, audio_format="mp3"):
+            return 0.0
+
+        async def generate_tts_chunk(self, text, chunk_id, user_id=None, audio_format="mp3", slot=None):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Later chunks finish first to prove emits stay ordered.
+            await asyncio.sleep(0.01 * (4 - chunk_id))
+            in_flight -= 1
+            return f"audio-{chunk_id}".encode()
+
+    handler, sio = make_handler(FakeTTS(), tts_prefetch_depth=2)
+    await handler.handle_streaming_tts_for_info("user1", "text", "sid1")
+
+    audio_events = [data for event, data in sio.emitted if event == "streaming_audio"]
+    assert [e["chunk_id"] for e in audio_events] == [0, 1, 2, 3]
+    assert audio_events[-1]["is_final"] is True
+    assert max_in_flight == 3
+
+
+def test_audio_payload_respects_negotiated_protocol():
+    handler, _ = make_handler(MagicMock())
+    assert handler.audio_payload("user1", b"\xff\xfb") == "//s="
+    assert handler.audio_payload("user1", b"") == ""
+
+    handler.session_manager.create_user_session("user2", "sid2", binary_audio=True)
+    assert handler.audio_payload("user2", b"\xff\xfb") == b"\xff\xfb"
+
+
+@pytest.mark.asyncio
+async def test_stream_audio_frames_emits_sequenced_frames():
+    class FakeTTS:
+        async def stream_tts(self, text, user_id, mode="friend", audio_format="mp3", slot=None):
+            for frame in (b"one", b"two", b"three"):
+                yield frame
+
+    handler, sio = make_handler(FakeTTS())
+    handler.session_manager.create_user_session("user1", "sid1", binary_audio=True, progressive_audio=True)
+
+    frames, audio = await handler.stream_audio_frames("user1", "Hi", "friend", "abc", "sid1")
+
+    assert (frames, audio) == (3, b"onetwothree")
+    assert sio.emitted == [
+        ("audio_frame", {"stream_id": "abc", "seq": 0, "audio": b"one"}),
+        ("audio_frame", {"stream_id": "abc", "seq": 1, "audio": b"two"}),
+        ("audio_frame", {"stream_id": "abc", "seq": 2, "audio": b"three"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_audio_frames_reports_a_cut_off_stream():
+    class FakeTTS:
+        async def stream_tts(self, text, user_id, mode="friend", audio_format="mp3", slot=None):
+            yield b"one"
+            raise ConnectionError("websocket closed")
+
+    handler, sio = make_handler(FakeTTS())
+    handler.session_manager.create_user_session("user1", "sid1", binary_audio=True, progressive_audio=True)
+
+    assert await handler.stream_audio_frames("user1", "Hi", "friend", "abc", "sid1") == (1, None)
+    assert sio.emitted == [("audio_frame", {"stream_id": "abc", "seq": 0, "audio": b"one"})]
+
+
+def test_audio_format_follows_the_register_user_hint():
+    handler, _ = make_handler(MagicMock())
+    assert handler.audio_format("user1") == "mp3"
+    assert handler.audio_format(None) == "mp3"
+
+    handler.session_manager.create_user_session("user2", "sid2", audio_format="opus")
+    assert handler.audio_format("user2") == "opus"
+
+
+def test_metric_labels_only_use_known_modes():
+    handler, _ = make_handler(MagicMock())
+    handler.modes.modes = {"friend": "prompt", "info": "prompt"}
+
+    assert handler.metric_mode("friend") == "friend"
+    assert handler.metric_mode("friend-" + "x" * 64) == "unknown"
+    assert handler.metric_mode(["friend"]) == "unknown"
+
+
+@pytest.mark.asyncio
+async def test_messages_from_unregistered_users_are_rejected():
+    handler, sio = make_handler(MagicMock())
+    handler.config.is_maintenance_on.return_value = False
+    handler.speech_recognition.process_audio = AsyncMock(return_value="hello")
+
+    await handler.handle_user_message("sid2", {"user_id": "intruder", "text": "hello"})
+    await handler.handle_user_audio("sid2", {"user_id": "intruder", "audio": "UklGRg=="})
+    # A registered user id on someone else's socket is not accepted either.
+    await handler.handle_user_message("sid2", {"user_id": "user1", "text": "hello"})
+
+    assert sio.emitted == [("response", {"text": "🚫 Please register before sending messages.", "audio": ""})] * 3
+    assert set(handler.session_manager.user_sessions) == {"user1"}
+    assert handler.admission.usage()["sessions"] == 0
+    handler.speech_recognition.process_audio.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_visemes_inline_when_negotiated(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_cues(text, audio, audio_format="mp3"):
+        calls.append((text, audio, audio_format))
+        return [{"value": "A", "start": 0.0, "end": 0.1}]
+
+    monkeypatch.setitem(METHODS, "audio", fake_cues)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "Data").mkdir()
+    handler, _ = make_handler(MagicMock())
+    handler.session_manager.create_user_session("user2", "sid2", audio_format="opus", inline_visemes=True)
+
+    assert await handler.generate_visemes("user2", "hi", b"audio") == {
+        "mouthCues": [{"value": "A", "start": 0.0, "end": 0.1}]
+    }
+    assert await handler.generate_visemes("user1", "hi", b"audio", name="user1_3") == "/viseme/user1_3.json"
+    assert (tmp_path / "Data" / "user1_3.json").read_text() == '{"mouthCues": [{"value": "A", "start": 0.0, "end": 0.1}]}'
+    assert sorted(p.name for p in (tmp_path / "Data").iterdir()) == ["user1_3.json"]
+    assert calls == [("hi", b"audio", "webm"), ("hi", b"audio", "mp3")]
+    assert await handler.generate_visemes("user2", "hi", b"") == ""
+
+
+@pytest.mark.asyncio
+async def test_visemes_from_word_boundaries(monkeypatch):
+    monkeypatch.setitem(METHODS, "audio", MagicMock(side_effect=AssertionError))
+    tts = MagicMock()
+    tts.word_boundaries_for.return_value = [{"offset": 0, "duration": 2_000_000, "text": "ma"}]
+    tts.estimate_duration.return_value = 0.5
+    handler, _ = make_handler(tts, lipsync_mode="boundaries")
+    handler.session_manager.create_user_session("user2", "sid2", inline_visemes=True)
+
+    visemes = await handler.generate_visemes("user2", "ma", b"audio")
+
+    tts.word_boundaries_for.assert_called_once_with("ma", "mp3")
+    assert visemes["mouthCues"][-1] == {"value": "X", "start": 0.2, "end": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_reply_stream_that_breaks_off_is_reported_and_not_saved():
+    class FakeChat:
+        @staticmethod
+        def clean_reply(text):
+            return text.strip()
+
+        async def stream_chat_with_groq(self, user_id, mode, query):
+            yield "Hello"
+            raise ConnectionError("stream dropped")
+
+    handler, sio = make_handler(MagicMock())
+    handler.chat_manager = FakeChat()
+    handler.history = MagicMock(save_message=AsyncMock())
+    handler.record_token_usage = MagicMock()
+
+    await handler.handle_streaming_response("user1", "friend", "Hi", "conversation1", "sid1")
+
+    events = [event for event, _ in sio.emitted]
+    assert events == ["streaming_status", "response_delta", "response_end", "streaming_status"]
+    assert sio.emitted[2][1]["error"] is True
+    handler.history.save_message.assert_not_called()
+    handler.record_token_usage.assert_not_called()
@@ -0,0 +1,58 @@
+from app.speech_text import SpeechTextFilter, extract_speech_text
+
+REPLY = """## Reversing a list
+
+Use slicing, see [the docs](https://docs.python.org/3/) or https://example.com/x.
+
+```python
+items = [1, 2, 3]
+print(items[::-1])
+```
+
+| Method | Speed |
+|--------|-------|
+| slicing | fast |
+
+- Use `reversed()` for iterators
+- Slicing makes a copy.
+> Quoted <b>bold</b> text
+---
+1.5 million people agree"""
+
+SPOKEN = """Reversing a list.
+
+Use slicing, see the docs or the link on screen.
+
+The code is on your screen.
+
+The table is on your screen.
+
+Use reversed() for iterators.
+Slicing makes a copy.
+Quoted bold text
+
+1.5 million people agree"""
+
+
+def test_extract_speech_text_replaces_code_tables_and_urls():
+    assert extract_speech_text(REPLY) == SPOKEN
+
+
+def test_unclosed_fence_is_dropped():
+    assert extract_speech_text("Try this:\n```bash\nrm -rf build") == "Try this:\nThe code is on your screen.\n"
+
+
+def test_streaming_matches_whole_text_for_any_split():
+    for size in (1, 2, 3, 5, 8, 13):
+        speech = SpeechTextFilter()
+        out = "".join(speech.feed(REPLY[i:i + size]) for i in range(0, len(REPLY), size))
+        assert out + speech.flush() == SPOKEN
+
+
+def test_streaming_passes_prose_through_before_the_line_ends():
+    speech = SpeechTextFilter()
+    assert speech.feed("- The first") == "The"
+    assert speech.feed(" point is") == " first point"
+    assert speech.feed("\n```") == " is.\n"
+    assert speech.feed("py\nx = 1\n```\nok") == "The code is on your screen.\n"
+    assert speech.flush() == "ok"
@@ -0,0 +1,151 @@
+import asyncio
+import pickle
+import threading
+import pytest
+from app.state import (
+    InMemoryStateBackend, RedisStateBackend, SQLiteStateBackend, SharedDict, SQLiteClientManager, WorkerRegistry,
+    create_client_manager, get_state_backend
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryStateBackend()
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        return RedisStateBackend("redis://fake", client=fakeredis.FakeRedis())
+    return SQLiteStateBackend(str(tmp_path / "state.db"))
+
+
+def test_shared_dict_behaves_like_dict(backend):
+    sessions = SharedDict(backend, "sessions")
+    sessions["user1"] = {"sid": "sid1"}
+    sessions["user2"] = {"sid": "sid2"}
+    assert "user1" in sessions
+    assert sessions["user1"] == {"sid": "sid1"}
+    assert sorted(sessions) == ["user1", "user2"]
+    assert len(sessions) == 2
+
+    del sessions["user1"]
+    assert sessions.get("user1") is None
+    with pytest.raises(KeyError):
+        del sessions["user1"]
+
+    other = SharedDict(backend, "other")
+    other["user2"] = 1
+    sessions.clear()
+    assert len(sessions) == 0
+    assert other["user2"] == 1
+
+
+def test_sqlite_state_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "state.db")
+    worker_a = SharedDict(SQLiteStateBackend(path), "key_usage")
+    worker_b = SharedDict(SQLiteStateBackend(path), "key_usage")
+    worker_a["key1"] = 3
+    assert worker_b["key1"] == 3
+
+
+@pytest.mark.asyncio
+async def test_sqlite_client_manager_relays_published_messages(tmp_path):
+    url = f"sqlite:///{tmp_path / 'sio.db'}"
+    listener = SQLiteClientManager(url, poll_interval=0.01)
+    publisher = create_client_manager(url)
+    messages = listener._listen()
+    # Start listening first: only messages published after that are delivered.
+    next_message = asyncio.ensure_future(messages.__anext__())
+    await asyncio.sleep(0.05)
+
+    await publisher._publish({"method": "emit", "event": "response", "data": {"text": "hi"}})
+    payload = await asyncio.wait_for(next_message, timeout=2)
+    assert pickle.loads(payload)["event"] == "response"
+    await messages.aclose()
+
+
+def test_client_manager_defaults_to_single_process():
+    assert create_client_manager(None) is None
+    assert create_client_manager("memory") is None
+    with pytest.raises(ValueError):
+        create_client_manager("kafka://localhost")
+
+
+def test_increments_from_two_workers_are_not_lost(tmp_path):
+    path = str(tmp_path / "state.db")
+    workers = [SharedDict(SQLiteStateBackend(path), "key_usage") for _ in range(2)]
+
+    def bump(shared):
+        for _ in range(200):
+            shared.increment("key1")
+
+    threads = [threading.Thread(target=bump, args=(shared,)) for shared in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert workers[0]["key1"] == 400
+
+
+def test_redis_increments_from_two_workers_are_not_lost():
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    workers = [SharedDict(RedisStateBackend("redis://fake", client=fakeredis.FakeRedis(server=server)), "key_usage")
+               for _ in range(2)]
+
+    def bump(shared):
+        for _ in range(100):
+            shared.increment("key1")
+
+    threads = [threading.Thread(target=bump, args=(shared,)) for shared in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert workers[0]["key1"] == 200
+
+
+def test_redis_url_selects_the_redis_backend():
+    pytest.importorskip("redis")
+    assert isinstance(get_state_backend("redis://localhost:6379/0"), RedisStateBackend)
+    with pytest.raises(ValueError):
+        get_state_backend("kafka://localhost")
+
+
+def test_atomic_block_rolls_back_on_error(tmp_path):
+    usage = SharedDict(SQLiteStateBackend(str(tmp_path / "state.db")), "key_usage")
+    usage["key1"] = 1
+    with pytest.raises(RuntimeError):
+        with usage.atomic():
+            usage["key1"] = 2
+            with usage.atomic():
+                usage["key2"] = 1
+            raise RuntimeError
+    assert dict(usage.items()) == {"key1": 1}
+
+
+def test_modify_and_increment(backend):
+    histories = SharedDict(backend, "chat_histories")
+    assert histories.modify("user1", lambda value: value + ["hi"], []) == ["hi"]
+    assert histories.modify("user1", lambda value: value + ["there"], []) == ["hi", "there"]
+    assert histories.increment("tokens", 5) == 5
+    assert histories.increment("tokens", 2) == 7
+
+
+def test_worker_registry_forgets_workers_that_stop_beating(tmp_path, monkeypatch):
+    path = str(tmp_path / "state.db")
+    worker_a = WorkerRegistry(SQLiteStateBackend(path), "worker-a", ttl=30)
+    worker_b = WorkerRegistry(SQLiteStateBackend(path), "worker-b", ttl=30)
+    now = 1000.0
+    monkeypatch.setattr("app.state.time.time", lambda: now)
+    worker_a.beat()
+    worker_b.beat()
+    assert worker_a.live() == {"worker-a", "worker-b"}
+
+    now += 20
+    worker_a.beat()
+    now += 20
+    assert worker_a.live() == {"worker-a"}
+    assert "worker-b" not in worker_a.workers
+
+    worker_a.leave()
+    assert worker_b.live() == set()
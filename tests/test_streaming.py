@@ -0,0 +1,70 @@
+import pytest
+from app.chat import ChatManager
+from app.streaming import ActionFilter, SentenceStream, adaptive_chunks, split_sentences
+
+
+def test_sentence_stream_emits_complete_sentences():
+    stream = SentenceStream()
+    assert stream.feed("Hello there") == []
+    assert stream.feed(". How are") == ["Hello there."]
+    assert stream.feed(" you? I'm fine") == ["How are you?"]
+    assert stream.flush() == ["I'm fine"]
+    assert stream.flush() == []
+
+
+def test_sentence_stream_waits_for_whitespace_after_terminator():
+    stream = SentenceStream()
+    assert stream.feed("Version 3.") == []
+    assert stream.feed("5 is out!\nNice") == ["Version 3.5 is out!"]
+    assert stream.flush() == ["Nice"]
+
+
+def test_sentence_stream_splits_on_danda():
+    stream = SentenceStream()
+    assert stream.feed("नमस्ते। आप कैसे") == ["नमस्ते।"]
+    assert stream.feed(" हैं?") == []
+    assert stream.flush() == ["आप कैसे हैं?"]
+
+
+def test_split_sentences_keeps_closing_quotes_and_decimals():
+    assert split_sentences('He said "hi." Version 3.5 is out! ठीक है।अब चलो॥ बस') == [
+        'He said "hi."', "Version 3.5 is out!", "ठीक है।", "अब चलो॥", "बस"
+    ]
+
+
+def test_adaptive_chunks_start_small_and_grow():
+    sentence = "Here is a little more detail about it so you can see how it works."
+    chunks = adaptive_chunks(" ".join([sentence] * 8), first_words=8, max_words=48)
+
+    assert chunks[0] == "Here is a little more detail about it"
+    sizes = [len(chunk.split()) for chunk in chunks]
+    assert sizes[:-1] == sorted(sizes[:-1])
+    assert max(sizes) <= 48
+    assert " ".join(chunks).split() == " ".join([sentence] * 8).split()
+
+
+def test_adaptive_chunks_prefer_a_short_first_clause():
+    assert adaptive_chunks("Well, sure thing, that depends on what you need most today. Okay.") == [
+        "Well, sure thing,", "that depends on what you need most today. Okay."
+    ]
+    assert adaptive_chunks("Hi.") == ["Hi."]
+    assert adaptive_chunks("  ") == []
+
+
+def test_adaptive_chunks_break_unpunctuated_text():
+    words = " ".join(f"w{i}" for i in range(100))
+    chunks = adaptive_chunks(words, first_words=8, max_words=20)
+    assert [len(chunk.split()) for chunk in chunks] == [8, 20, 20, 20, 20, 12]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+@pytest.mark.parametrize("text", [
+    "Hello *waves* there! **Bold** words *smiles warmly*",
+    "A lone * star\nand *an aside*, then **strong** and *another*.",
+    "*giggles*",
+])
+def test_action_filter_matches_clean_reply_for_any_split(text, size):
+    actions = ActionFilter()
+    out = "".join(actions.feed(text[i:i + size]) for i in range(0, len(text), size)) + actions.flush()
+
+    assert out.strip() == ChatManager.clean_reply(text)
@@ -0,0 +1,157 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.audio_cache import AudioCache
+from app.edge_client import negotiate_audio_format
+from app.tts import TextToSpeech
+from app.tts_scheduler import FIRST_CHUNK, LATER_CHUNK, TTSScheduler
+
+
+class FakeClient:
+    def __init__(self):
+        self.formats = []
+        self.texts = []
+
+    async def stream(self, text, voice, audio_format="mp3"):
+        self.formats.append(audio_format)
+        self.texts.append(text)
+        yield {"type": "audio", "data": b"ab"}
+        yield {"type": "WordBoundary", "offset": 0, "duration": 1, "text": text}
+        yield {"type": "audio", "data": b"cd"}
+
+
+def make_tts():
+    config = MagicMock()
+    config.assistant_voice = "en-IN-NeerjaExpressiveNeural"
+    config.mode = "friend"
+    config.audio_retention_mb = 1
+    config.audio_retention_ttl = 60
+    config.tts_first_chunk_words = 8
+    config.tts_max_chunk_words = 48
+    logger = MagicMock()
+    return TextToSpeech(config, logger, cache=AudioCache(logger, max_memory_bytes=0, max_disk_bytes=0),
+                        client=FakeClient())
+
+
+@pytest.mark.asyncio
+async def test_generate_tts_collects_audio_in_memory(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    tts = make_tts()
+
+    assert await tts.generate_tts("Hello there", "user1") == b"abcd"
+    assert await tts.generate_tts_chunk("Hello there", 0) == b"abcd"
+    assert tts.last_audio_data["user1"] == b"abcd"
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_stream_tts_yields_frames_and_caches_the_reply():
+    logger = MagicMock()
+    tts = make_tts()
+    tts.cache = AudioCache(logger, max_memory_bytes=1024, disk_dir=None)
+
+    assert [frame async for frame in tts.stream_tts("Hello there", "user1")] == [b"ab", b"cd"]
+    assert tts.last_audio_data["user1"] == b"abcd"
+    # A repeat is served from the cache in one piece.
+    assert [frame async for frame in tts.stream_tts("Hello there", "user1")] == [b"abcd"]
+
+
+@pytest.mark.asyncio
+async def test_stream_tts_raises_on_a_cut_off_stream_and_caches_nothing():
+    class FailingClient:
+        async def stream(self, text, voice, audio_format="mp3"):
+            yield {"type": "audio", "data": b"ab"}
+            raise ConnectionError("websocket closed")
+
+    tts = make_tts()
+    tts.cache = AudioCache(MagicMock(), max_memory_bytes=1024, disk_dir=None)
+    tts.client = FailingClient()
+    frames = []
+
+    with pytest.raises(ConnectionError):
+        async for frame in tts.stream_tts("Hello there", "user1"):
+            frames.append(frame)
+
+    assert frames == [b"ab"]
+    assert tts.cache.memory == {} and "user1" not in tts.last_audio_data
+
+
+@pytest.mark.asyncio
+async def test_audio_formats_are_requested_and_cached_separately():
+    tts = make_tts()
+    tts.cache = AudioCache(MagicMock(), max_memory_bytes=1024, disk_dir=None)
+
+    await tts.generate_tts("Hello there", "user1", audio_format="opus")
+    await tts.generate_tts("Hello there", "user1", audio_format="mp3")
+    await tts.generate_tts("Hello there", "user1", audio_format="opus")
+
+    assert tts.client.formats == ["opus", "mp3"]
+    assert tts.estimate_duration(bytes(6000)) == 1.0
+    assert tts.estimate_duration(bytes(6000), "opus") == 2.0
+
+
+@pytest.mark.asyncio
+async def test_only_edge_calls_wait_for_a_scheduler_slot():
+    tts = make_tts()
+    tts.cache = AudioCache(MagicMock(), max_memory_bytes=1024, disk_dir=None)
+    scheduler = TTSScheduler(MagicMock(), max_concurrency=1)
+    slot = lambda: scheduler.slot("user1", FIRST_CHUNK)  # noqa: E731
+    await tts.generate_tts("Hello there", "user1", slot=slot)
+    assert scheduler.running == 0
+
+    release = asyncio.Event()
+
+    async def busy():
+        async with scheduler.slot("other", LATER_CHUNK):
+            await release.wait()
+
+    holder = asyncio.create_task(busy())
+    await asyncio.sleep(0)
+    # Cache hits are served while every slot is taken...
+    assert await asyncio.wait_for(tts.generate_tts("Hello there", "user1", slot=slot), 1) == b"abcd"
+    assert [frame async for frame in tts.stream_tts("Hello there", "user1", slot=slot)] == [b"abcd"]
+    # ...while a miss queues for one.
+    miss = asyncio.create_task(tts.generate_tts("Something new", "user1", slot=slot))
+    await asyncio.sleep(0.01)
+    assert not miss.done() and scheduler.depth()["first_chunk"] == 1
+
+    release.set()
+    assert await miss == b"abcd"
+    await holder
+    assert tts.client.texts == ["Hello there", "Something new"]
+
+
+def test_negotiate_audio_format():
+    assert negotiate_audio_format(None) == "mp3"
+    assert negotiate_audio_format("opus") == "opus"
+    assert negotiate_audio_format("flac") == "mp3"
+    assert negotiate_audio_format(None, save_data=True) == "opus"
+    assert negotiate_audio_format("mp3-low", save_data=True) == "mp3-low"
+
+
+@pytest.mark.asyncio
+async def test_code_blocks_are_not_spoken():
+    tts = make_tts()
+    reply = "Here you go:\n```python\nprint('hi')\n```\nRun it with `python app.py`."
+
+    await tts.generate_tts(reply, "user1")
+
+    assert tts.client.texts == ["Here you go:\nThe code is on your screen.\nRun it with python app.py."]
+    assert tts.split_into_sentence_chunks(reply) == [
+        "Here you go:", "The code is on your screen. Run it with python app.py."
+    ]
+
+
+@pytest.mark.asyncio
+async def test_word_boundaries_are_kept_for_lip_sync():
+    tts = make_tts()
+    assert tts.word_boundaries_for("Hello there") is None
+
+    await tts.generate_tts("Hello there", "user1")
+    assert tts.word_boundaries_for("Hello there") == [
+        {"type": "WordBoundary", "offset": 0, "duration": 1, "text": "Hello there"}
+    ]
+    assert tts.word_boundaries_for("Hello there", "opus") is None
+
+    [frame async for frame in tts.stream_tts("Bye now", "user1", audio_format="opus")]
+    assert tts.word_boundaries_for("Bye now", "opus")[0]["text"] == "Bye now"
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.tts_scheduler import TTSScheduler, INTERRUPT, FIRST_CHUNK, LATER_CHUNK
+
+
+async def hold(scheduler, user_id, priority, started, release, backend="edge"):
+    async with scheduler.slot(user_id, priority, backend):
+        started.append(user_id)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_slots_go_to_the_most_urgent_jobs_first():
+    scheduler = TTSScheduler(MagicMock(), max_concurrency=1)
+    started, release = [], asyncio.Event()
+    first = asyncio.create_task(hold(scheduler, "busy", LATER_CHUNK, started, release))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(hold(scheduler, "later", LATER_CHUNK, started, release)),
+        asyncio.create_task(hold(scheduler, "first", FIRST_CHUNK, started, release)),
+        asyncio.create_task(hold(scheduler, "interrupt", INTERRUPT, started, release)),
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.depth() == {"interrupt": 1, "first_chunk": 1, "later_chunk": 1}
+
+    release.set()
+    await asyncio.gather(first, *tasks)
+    assert started == ["busy", "interrupt", "first", "later"]
+    assert scheduler.running == 0
+
+
+@pytest.mark.asyncio
+async def test_backend_limits_cap_concurrency_per_backend():
+    scheduler = TTSScheduler(MagicMock(), max_concurrency=4, backend_limits={"edge": 1})
+    started, release = [], asyncio.Event()
+    tasks = [asyncio.create_task(hold(scheduler, f"u{i}", LATER_CHUNK, started, release)) for i in range(2)]
+    tasks.append(asyncio.create_task(hold(scheduler, "other", LATER_CHUNK, started, release, backend="other")))
+    await asyncio.sleep(0)
+
+    assert started == ["u0", "other"]
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["u0", "other", "u1"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_user_cancels_queued_and_running_jobs():
+    scheduler = TTSScheduler(MagicMock(), max_concurrency=1)
+    started, release = [], asyncio.Event()
+    running = asyncio.create_task(hold(scheduler, "user1", FIRST_CHUNK, started, release))
+    queued = asyncio.create_task(hold(scheduler, "user1", LATER_CHUNK, started, release))
+    other = asyncio.create_task(hold(scheduler, "user2", LATER_CHUNK, started, release))
+    await asyncio.sleep(0)
+
+    assert scheduler.cancel_user("user1") == 2
+    with pytest.raises(asyncio.CancelledError):
+        await running
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+    await asyncio.sleep(0)
+    assert started == ["user1", "user2"]
+    release.set()
+    await other
+    assert scheduler.running == 0
+    assert scheduler.user_jobs == {}
+    assert scheduler.depth() == {"interrupt": 0, "first_chunk": 0, "later_chunk": 0}